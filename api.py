@@ -0,0 +1,206 @@
+"""Read-only JSON API: /api/v1/<resource>.
+
+Resources: tournaments, teams, players, matches and performances. Every
+endpoint selects plain columns, never ORM objects, and accepts:
+
+- ``fields=name,status``: sparse fieldset (``id`` is always returned);
+- filters, listed per resource in RESOURCES (e.g. ``?tournament=3``);
+- ``after`` / ``per_page``: keyset pagination on the id for the lists.
+
+``/api/v1/<resource>/export`` streams the whole filtered collection as
+NDJSON (default) or as a JSON array (``format=json``). Rows are fetched
+``EXPORT_BATCH_SIZE`` at a time with yield_per, a server-side cursor on
+Postgres, and encoded batch by batch, so a full-season export of the
+performances runs in constant memory.
+"""
+import json
+from dataclasses import dataclass, field
+from datetime import date, datetime
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context, url_for
+from sqlalchemy import select
+
+from extensions import db
+from models import Tournament, Team, Player, Match, PlayerMatchPerformance
+from pagination import DEFAULT_PER_PAGE, MAX_PER_PAGE, encode_cursor, decode_cursor
+
+api_bp = Blueprint('api_v1', __name__)
+
+EXPORT_BATCH_SIZE = 1000
+
+
+@dataclass
+class Resource:
+    model: type
+    fields: dict
+    filters: dict = field(default_factory=dict)
+    # Jointure nécessaire à un filtre : nom du filtre -> (modèle, condition)
+    joins: dict = field(default_factory=dict)
+
+
+def _columns(model, *names):
+    return {name: getattr(model, name) for name in names}
+
+
+RESOURCES = {
+    'tournaments': Resource(
+        Tournament,
+        _columns(Tournament, 'id', 'name', 'description', 'start_date', 'end_date', 'max_teams', 'status'),
+        filters={'status': (Tournament.status, str)}
+    ),
+    'teams': Resource(
+        Team,
+        _columns(Team, 'id', 'name', 'city', 'founded_year', 'tournament_id', 'coach_id'),
+        filters={'tournament': (Team.tournament_id, int)}
+    ),
+    'players': Resource(
+        Player,
+        _columns(Player, 'id', 'name', 'position', 'jersey_number', 'age', 'nationality', 'team_id',
+                 'is_available', 'is_suspended', 'suspended_until_match_id'),
+        filters={'team': (Player.team_id, int), 'tournament': (Team.tournament_id, int),
+                 'position': (Player.position, str)},
+        joins={'tournament': (Team, Team.id == Player.team_id)}
+    ),
+    'matches': Resource(
+        Match,
+        _columns(Match, 'id', 'tournament_id', 'home_team_id', 'away_team_id', 'match_date', 'venue',
+                 'home_score', 'away_score', 'status', 'round_number'),
+        filters={'tournament': (Match.tournament_id, int), 'status': (Match.status, str),
+                 'round': (Match.round_number, int)}
+    ),
+    'performances': Resource(
+        PlayerMatchPerformance,
+        _columns(PlayerMatchPerformance, 'id', 'player_id', 'match_id', 'goals', 'assists', 'yellow_cards',
+                 'red_cards', 'minutes_played', 'shots', 'shots_on_target', 'passes', 'passes_completed',
+                 'tackles', 'interceptions', 'saves', 'rating', 'is_selected'),
+        filters={'match': (PlayerMatchPerformance.match_id, int), 'player': (PlayerMatchPerformance.player_id, int),
+                 'tournament': (Match.tournament_id, int)},
+        joins={'tournament': (Match, Match.id == PlayerMatchPerformance.match_id)}
+    ),
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@api_bp.errorhandler(ApiError)
+def handle_api_error(error):
+    return jsonify({'error': error.message}), error.status
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _dumps(value):
+    return json.dumps(value, default=_json_default, ensure_ascii=False)
+
+
+def _json_response(payload, status=200):
+    return Response(_dumps(payload), status=status, mimetype='application/json')
+
+
+def _resource(name):
+    resource = RESOURCES.get(name)
+    if resource is None:
+        raise ApiError(f'Unknown resource {name!r}.', 404)
+    return resource
+
+
+def _selected_fields(resource):
+    """Requested columns, ``id`` first; all of them without ``fields=``"""
+    requested = request.args.get('fields')
+    if not requested:
+        return dict(resource.fields)
+    names = ['id'] + [name.strip() for name in requested.split(',') if name.strip() and name.strip() != 'id']
+    unknown = [name for name in names if name not in resource.fields]
+    if unknown:
+        raise ApiError(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(resource.fields)}.")
+    return {name: resource.fields[name] for name in names}
+
+
+def _query(resource, fields):
+    """SELECT of ``fields`` with the filters of the request applied"""
+    statement = select(*[column.label(name) for name, column in fields.items()]).select_from(resource.model)
+    for name, (column, convert) in resource.filters.items():
+        value = request.args.get(name)
+        if value is None:
+            continue
+        try:
+            value = convert(value)
+        except ValueError:
+            raise ApiError(f'Invalid value for {name}: {value!r}.')
+        if name in resource.joins:
+            target, onclause = resource.joins[name]
+            statement = statement.join(target, onclause)
+        statement = statement.where(column == value)
+    return statement
+
+
+@api_bp.route('/<resource_name>')
+def list_resource(resource_name):
+    resource = _resource(resource_name)
+    fields = _selected_fields(resource)
+    statement = _query(resource, fields)
+    id_column = resource.model.id
+
+    after = request.args.get('after')
+    if after:
+        statement = statement.where(id_column > decode_cursor(after, [id_column])[0])
+    per_page = max(1, min(request.args.get('per_page', DEFAULT_PER_PAGE, type=int), MAX_PER_PAGE))
+    rows = [dict(row) for row in db.session.execute(statement.order_by(id_column).limit(per_page + 1)).mappings()]
+
+    next_url = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        args = dict(request.args, after=encode_cursor([rows[-1]['id']]))
+        next_url = url_for('api_v1.list_resource', resource_name=resource_name, **args)
+    return _json_response({'data': rows, 'next': next_url})
+
+
+@api_bp.route('/<resource_name>/<int:id>')
+def get_resource(resource_name, id):
+    resource = _resource(resource_name)
+    fields = _selected_fields(resource)
+    row = db.session.execute(_query(resource, fields).where(resource.model.id == id)).mappings().first()
+    if row is None:
+        raise ApiError(f'{resource_name[:-1].capitalize()} {id} not found.', 404)
+    return _json_response({'data': dict(row)})
+
+
+@api_bp.route('/<resource_name>/export')
+def export_resource(resource_name):
+    resource = _resource(resource_name)
+    fields = _selected_fields(resource)
+    statement = _query(resource, fields).order_by(resource.model.id)
+    output = request.args.get('format', 'ndjson')
+    if output not in ('ndjson', 'json'):
+        raise ApiError("format must be 'ndjson' or 'json'.")
+
+    def generate():
+        result = db.session.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE)).mappings()
+        first = True
+        if output == 'json':
+            yield '['
+        for rows in result.partitions():
+            # Un morceau par lot : ni la liste complète ni un yield par ligne
+            if output == 'ndjson':
+                yield ''.join(_dumps(dict(row)) + '\n' for row in rows)
+            else:
+                chunk = ',\n'.join(_dumps(dict(row)) for row in rows)
+                yield chunk if first else ',\n' + chunk
+                first = False
+        if output == 'json':
+            yield ']\n'
+        result.close()
+
+    mimetype = 'application/x-ndjson' if output == 'ndjson' else 'application/json'
+    filename = f"{resource_name}.{'ndjson' if output == 'ndjson' else 'json'}"
+    return Response(stream_with_context(generate()), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
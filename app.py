@@ -1,12 +1,27 @@
 import os
+import importlib.util
 import logging
+import click
 
 from flask import Flask, flash, redirect, url_for, request, render_template
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from werkzeug.middleware.proxy_fix import ProxyFix
 from extensions import db
-from models import User, Admin, Coach, Match, Tournament
+from models import User, Admin, Coach, Match, Tournament, TeamStanding
 from decorators import admin_required, coach_required
+from standings import compute_standings, rebuild_standings
+from eligibility import refresh_eligibility
+from match_events import PROJECTIONS, replay
+from live_feed import broker as live_feed, snapshots as live_snapshots
+from live_stats import stats_buffer
+from migrations import upgrade_indexes, explain_hot_queries
+from jobs import job_queue
+from auth_cache import principals
+from passwords import hasher, LoginBusy
+from telemetry import telemetry
+from pagination import keyset_page, page_args, match_filters
+from data_transfer import DATASETS, DataTransferError, export_dataset, import_dataset
+import match_completion  # noqa: F401 (enregistre les tâches de fin de match)
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -23,6 +38,15 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_pre_ping": True,
 }
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+app.config["JOB_QUEUE_MODE"] = os.environ.get("JOB_QUEUE_MODE", "memory")  # memory, durable or eager
+app.config["AUTH_CACHE_TTL"] = float(os.environ.get("AUTH_CACHE_TTL", 60))
+app.config["PASSWORD_HASH_METHOD"] = os.environ.get("PASSWORD_HASH_METHOD", "scrypt")  # ex. scrypt:16384:8:1, pbkdf2:sha256:600000
+app.config["TELEMETRY_SAMPLE_RATE"] = float(os.environ.get("TELEMETRY_SAMPLE_RATE", 0.01))  # 1.0 pour tout mesurer
+app.config["TELEMETRY_METRICS_TOKEN"] = os.environ.get("TELEMETRY_METRICS_TOKEN")
+app.config["LIVE_STATS_BUFFER"] = os.environ.get("LIVE_STATS_BUFFER", "0") == "1"  # statistiques live écrites par lots
+app.config["LIVE_STATS_FLUSH_INTERVAL_MS"] = int(os.environ.get("LIVE_STATS_FLUSH_INTERVAL_MS", 500))
+app.config["LIVE_STATS_FLUSH_EVENTS"] = int(os.environ.get("LIVE_STATS_FLUSH_EVENTS", 20))
+app.config["PASSWORD_VERIFY_WORKERS"] = int(os.environ.get("PASSWORD_VERIFY_WORKERS", os.cpu_count() or 1))
 
 # initialize extensions
 db.init_app(app)
@@ -31,10 +55,18 @@ login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message = 'Veuillez vous connecter pour accéder à cette page.'
 login_manager.login_message_category = 'info'
+live_feed.init_app(app)
+live_snapshots.init_app(app)
+stats_buffer.init_app(app)
+job_queue.init_app(app)
+principals.init_app(app)
+hasher.init_app(app)
+telemetry.init_app(app)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Principal en cache (id, rôle, équipe) : pas de requête polymorphique à chaque requête
+    return principals.load(int(user_id))
 
 # Routes d'authentification
 @app.route('/login', methods=['GET', 'POST'])
@@ -44,7 +76,17 @@ def login():
         password = request.form.get('password')
         user = User.query.filter_by(username=username).first()
         
-        if user and user.check_password(password):
+        try:
+            valid = user is not None and user.check_password(password)
+        except LoginBusy:
+            flash('Trop de connexions en cours, veuillez réessayer dans quelques secondes.', 'error')
+            return render_template('auth/login.html'), 503, {'Retry-After': '2'}
+        
+        if valid:
+            # Paramètres de hachage modifiés depuis : on réécrit le hash avec les nouveaux
+            if user.password_needs_rehash():
+                user.set_password(password)
+                db.session.commit()
             login_user(user)
             next_page = request.args.get('next')
             if isinstance(user, Admin):
@@ -63,13 +105,18 @@ def logout():
     return redirect(url_for('index'))
 
 # Enregistrement des blueprints
-from routes.admin import admin_bp
-from routes.coach import coach_bp
-from routes.player import player_bp
+from api import api_bp
+
+app.register_blueprint(api_bp, url_prefix='/api/v1')
 
-app.register_blueprint(admin_bp, url_prefix='/admin')
-app.register_blueprint(coach_bp, url_prefix='/coach')
-app.register_blueprint(player_bp, url_prefix='/players')
+# Espaces admin, coach et joueur : paquet routes/ livré à part. Sans lui, routes
+# est le module routes.py (vérifié sans l'exécuter) et l'application démarre sans eux.
+routes_spec = importlib.util.find_spec('routes')
+if routes_spec is not None and routes_spec.submodule_search_locations is not None:
+    for name, url_prefix in (('admin', '/admin'), ('coach', '/coach'), ('player', '/players')):
+        app.register_blueprint(getattr(importlib.import_module(f'routes.{name}'), f'{name}_bp'), url_prefix=url_prefix)
+else:
+    logging.getLogger(__name__).warning('No routes/ package: the admin, coach and player blueprints are not registered')
 
 with app.app_context():
     # Import models here to ensure they are registered with SQLAlchemy
@@ -83,19 +130,121 @@ with app.app_context():
         db.session.add(admin)
         db.session.commit()
 
+    # Reprendre les tâches durables laissées en attente par un processus précédent
+    job_queue.recover()
+
+    # Remplir le classement matérialisé lors du premier démarrage sur une base existante
+    if not TeamStanding.query.first() and Match.query.filter_by(status='completed').first():
+        rebuild_standings()
+        db.session.commit()
+
+@app.cli.command('rebuild-standings')
+@click.option('--tournament', 'tournament_id', type=int, default=None, help='Only rebuild this tournament.')
+def rebuild_standings_command(tournament_id):
+    """Recompute the TeamStanding table from completed matches."""
+    rebuilt = rebuild_standings(tournament_id)
+    db.session.commit()
+    click.echo(f'Rebuilt standings for {len(rebuilt)} tournament(s).')
+
+@app.cli.command('rebuild-eligibility')
+@click.option('--tournament', 'tournament_id', type=int, default=None, help='Only rebuild this tournament.')
+def rebuild_eligibility_command(tournament_id):
+    """Recompute the PlayerEligibility table of the matches not completed yet."""
+    refresh_eligibility(tournament_id=tournament_id)
+    db.session.commit()
+    click.echo('Rebuilt player eligibility.')
+
+@app.cli.command('replay-events')
+@click.option('--projection', 'projections', multiple=True, type=click.Choice(PROJECTIONS),
+              help='Projection to rebuild, repeatable (default: all of them).')
+@click.option('--tournament', 'tournament_id', type=int, default=None, help='Only the matches of this tournament.')
+@click.option('--match', 'match_ids', type=int, multiple=True, help='Only this match, repeatable.')
+def replay_events_command(projections, tournament_id, match_ids):
+    """Rebuild score, match stats, performances and player stats from the match event log."""
+    projections = projections or PROJECTIONS
+    report = replay(projections, tournament_id, match_ids or None)
+    db.session.commit()
+    click.echo(f"Replayed {report['events']} event(s) of {report['matches']} match(es) into {', '.join(projections)}.")
+
+@app.cli.command('upgrade-indexes')
+@click.option('--dedupe', is_flag=True, help='Delete duplicated rows (keeping the oldest) so unique indexes can be created.')
+def upgrade_indexes_command(dedupe):
+    """Add the indexes declared on the models to an existing database."""
+    report = upgrade_indexes(dedupe=dedupe)
+    for name in report['columns']:
+        click.echo(f'added     {name}')
+    for name in report['widened']:
+        click.echo(f'widened   {name}')
+    for name in report['created']:
+        click.echo(f'created   {name}')
+    for name, count in report['deduplicated'].items():
+        click.echo(f'deduped   {name}: {count} row(s) deleted')
+    for name, count in report['skipped'].items():
+        click.echo(f'skipped   {name}: {count} duplicated key(s), rerun with --dedupe')
+    click.echo(f"{len(report['existing'])} index(es) already present.")
+
+@app.cli.command('explain-hot-queries')
+def explain_hot_queries_command():
+    """Check with EXPLAIN that the hot queries use an index."""
+    failures = 0
+    for name, plan, uses_index in explain_hot_queries():
+        click.echo(f"{'ok  ' if uses_index else 'SCAN'} {name}")
+        if not uses_index:
+            failures += 1
+            for line in plan:
+                click.echo(f'       {line}')
+    if failures:
+        raise SystemExit(1)
+
+@app.cli.command('export-data')
+@click.argument('dataset', type=click.Choice(sorted(DATASETS)))
+@click.argument('path')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'parquet']), default=None, help='Default: from the file extension.')
+@click.option('--tournament', 'tournament_id', type=int, default=None, help='Only this tournament.')
+@click.option('--batch-size', type=int, default=5000, show_default=True)
+def export_data_command(dataset, path, fmt, tournament_id, batch_size):
+    """Export matches, performances, player_stats or match_updates to CSV or Parquet."""
+    try:
+        count = export_dataset(dataset, path, fmt, tournament_id, batch_size)
+    except DataTransferError as exc:
+        raise click.ClickException(str(exc))
+    click.echo(f'Exported {count} {dataset} row(s) to {path}.')
+
+@app.cli.command('import-data')
+@click.argument('dataset', type=click.Choice(sorted(DATASETS)))
+@click.argument('path')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'parquet']), default=None, help='Default: from the file extension.')
+@click.option('--batch-size', type=int, default=5000, show_default=True)
+@click.option('--skip-invalid', is_flag=True, help='Import the valid rows and skip the invalid ones.')
+@click.option('--dry-run', is_flag=True, help='Validate and write, then roll back.')
+def import_data_command(dataset, path, fmt, batch_size, skip_invalid, dry_run):
+    """Import a CSV or Parquet file, then recompute standings and player stats once."""
+    try:
+        report = import_dataset(dataset, path, fmt, batch_size, skip_invalid, dry_run)
+    except DataTransferError as exc:
+        for line, message in exc.errors:
+            click.echo(f'line {line}: {message}', err=True)
+        raise click.ClickException(str(exc))
+    for line, message in report.errors:
+        click.echo(f'line {line}: skipped, {message}', err=True)
+    skipped = f'{report.skipped} already present, ' if report.skipped else ''
+    click.echo(f'{report.rows} row(s) read, {report.inserted} inserted, {report.updated} updated, {skipped}'
+               f'{len(report.errors)} invalid{" (dry run, rolled back)" if dry_run else ""}.')
+
 @app.route('/')
 def index():
     if current_user.is_authenticated:
-        if isinstance(current_user, Admin):
+        if current_user.role == 'admin':
             return redirect(url_for('admin.tournament_list'))
-        elif isinstance(current_user, Coach):
+        elif current_user.role == 'coach':
             return redirect(url_for('coach.team_dashboard'))
     return 'Bienvenue sur Flask Class Manager. <a href="/login">Se connecter</a>'
 
 @app.route('/matches')
 def list_matches():
-    matches = Match.query.order_by(Match.match_date).all()
-    return render_template('matches/list.html', matches=matches)
+    filters = match_filters()
+    page = keyset_page(Match.listing(**filters), [Match.match_date, Match.id], *page_args())
+    return render_template('matches/list.html', matches=page.items, page=page, filters=filters)
 
 @app.route('/matches/<int:match_id>')
 def match_detail(match_id):
@@ -105,17 +254,8 @@ def match_detail(match_id):
 @app.route('/tournaments/<int:tournament_id>/standings')
 def tournament_standings(tournament_id):
     tournament = Tournament.query.get_or_404(tournament_id)
-    # Calculate standings for each team in the tournament
-    standings_data = []
-    for team in tournament.teams:
-        stats = team.get_stats()
-        standings_data.append({
-            'team': team,
-            'stats': stats
-        })
-
-    # Sort standings: primary by points, secondary by goal difference
-    standings_data.sort(key=lambda x: (x['stats']['points'], x['stats']['goal_difference']), reverse=True)
+    # One aggregated query, sorted by points then goal difference
+    standings_data = compute_standings(tournament_id)
 
     return render_template('tournament/standings.html', tournament=tournament, standings=standings_data)
 
@@ -0,0 +1,142 @@
+"""Per-process cache of the logged-in users for Flask-Login.
+
+load_user() returns a Principal: the id, role, username and team of the
+user, enough for the auth decorators and the index redirects. It is served
+from a small LRU cache with a TTL, so most requests do not query the user
+tables. Any other attribute loads the full User on first access.
+
+Entries are dropped when the transaction that updates or deletes the user
+commits. Changes made by another process, or by bulk UPDATE statements,
+are seen at the latest after AUTH_CACHE_TTL seconds.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import User
+
+INVALIDATED_USERS = 'invalidated_users'
+
+
+class Principal(UserMixin):
+
+    def __init__(self, id, role, username, team_id=None):
+        self.id = id
+        self.role = role
+        self.username = username
+        self.team_id = team_id
+        self._user = None
+
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+
+    @property
+    def is_coach(self):
+        return self.role == 'coach'
+
+    @property
+    def user(self):
+        """The full (polymorphic) User, loaded on first access"""
+        if self._user is None:
+            self._user = db.session.get(User, self.id)
+        return self._user
+
+    def __getattr__(self, name):
+        # Seulement pour les attributs absents du principal (relations, email...)
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+    def __repr__(self):
+        return f'<Principal {self.username} ({self.role})>'
+
+
+class PrincipalCache:
+
+    def __init__(self, ttl=60.0, max_size=1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.ttl = app.config.get('AUTH_CACHE_TTL', self.ttl)
+        self.max_size = app.config.get('AUTH_CACHE_SIZE', self.max_size)
+        app.extensions['auth_cache'] = self
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return Principal(*entry[1])
+            self._entries.pop(user_id, None)
+            self.misses += 1
+        return None
+
+    def put(self, principal):
+        fields = (principal.id, principal.role, principal.username, principal.team_id)
+        with self._lock:
+            self._entries[principal.id] = (time.monotonic() + self.ttl, fields)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def load(self, user_id):
+        """Principal of ``user_id``, from the cache or one single-table query"""
+        principal = self.get(user_id)
+        if principal is not None:
+            return principal
+        # Admin et Coach partagent la table user (héritage à table unique)
+        columns = User.__table__.c
+        row = db.session.execute(
+            db.select(columns.id, columns.role, columns.username, columns.team_id).where(columns.id == user_id)
+        ).first()
+        if row is None:
+            return None
+        principal = Principal(*row)
+        self.put(principal)
+        return principal
+
+
+@event.listens_for(User, 'after_update', propagate=True)
+@event.listens_for(User, 'after_delete', propagate=True)
+def _queue_invalidation(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault(INVALIDATED_USERS, set()).add(target.id)
+    principals.invalidate(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    # Une requête concurrente a pu remettre l'ancienne version en cache avant le commit
+    for user_id in session.info.pop(INVALIDATED_USERS, ()):
+        principals.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_invalidations(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop(INVALIDATED_USERS, None)
+
+
+principals = PrincipalCache()
@@ -0,0 +1,113 @@
+import logging
+import math
+import os
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from flask import Flask
+from sqlalchemy import event
+
+from extensions import db
+from models import Tournament, Team, Match
+
+
+def make_app(database_uri='sqlite://'):
+    """Minimal app bound to a throwaway database, without the routes"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def load_app(database_url=None):
+    """The full application with the API routes, bound to ``database_url`` (default: a temporary SQLite file)"""
+    # La base doit être choisie avant l'import de l'application
+    os.environ['DATABASE_URL'] = database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ.setdefault('JOB_QUEUE_MODE', 'eager')
+    from main import app
+    # main.py n'importe que l'application : les routes de l'API sont enregistrées par routes.py
+    import routes  # noqa: F401
+    if 'api_update_score' not in app.view_functions:
+        raise RuntimeError('The API routes of routes.py are not registered, the benchmark would only get 404s')
+    # app.py configure la journalisation en DEBUG
+    logging.getLogger().setLevel(logging.WARNING)
+    return app
+
+
+class QueryCounter:
+    """Counts the statements sent to the engine while active"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+@contextmanager
+def timer(samples):
+    start = time.perf_counter()
+    yield
+    samples.append(time.perf_counter() - start)
+
+
+def percentile(ordered, q):
+    """Nearest-rank percentile of already sorted samples"""
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        'runs': len(ordered),
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p50_ms': percentile(ordered, 50) * 1000,
+        'p95_ms': percentile(ordered, 95) * 1000,
+        'p99_ms': percentile(ordered, 99) * 1000,
+        'max_ms': ordered[-1] * 1000
+    }
+
+
+def seed_league(n_teams, completed=True, seed=0):
+    """Tournament with a full single round-robin, optionally all played"""
+    import random
+    rng = random.Random(seed)
+    tournament = Tournament(name=f'Bench {n_teams}', start_date=date(2024, 9, 1), max_teams=n_teams)
+    db.session.add(tournament)
+    db.session.flush()
+
+    teams = [Team(name=f'Team {i:02d}', city=f'City {i % 8}', tournament_id=tournament.id) for i in range(n_teams)]
+    db.session.add_all(teams)
+    db.session.flush()
+
+    kickoff = datetime(2024, 9, 1, 18, 0)
+    day = 0
+    for i, home in enumerate(teams):
+        for away in teams[i + 1:]:
+            db.session.add(Match(
+                tournament_id=tournament.id,
+                home_team_id=home.id,
+                away_team_id=away.id,
+                match_date=kickoff + timedelta(days=day),
+                home_score=rng.randint(0, 4) if completed else 0,
+                away_score=rng.randint(0, 4) if completed else 0,
+                status='completed' if completed else 'scheduled'
+            ))
+            day += 1
+    db.session.commit()
+    return tournament
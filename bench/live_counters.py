@@ -0,0 +1,118 @@
+"""Concurrent live writes: no lost update on the score, cards and stats.
+
+Fires goals and yellow cards at one live match from parallel clients
+through a local threaded WSGI server, then checks the totals against the
+number of successful requests: score, shots on target and goal events per
+side, cards of the player, possession shares adding up to 100. Also
+reports the SQL statements per request.
+
+With --buffer the stats go through the write-behind buffer of live_stats.py
+(LIVE_STATS_BUFFER); the match is then ended, which flushes what is still
+pending, before the totals are checked.
+
+    python -m bench.live_counters [--goals 200] [--cards 100] [--concurrency 8] [--buffer] [--database URL]
+
+Exits with status 1 when a total does not match.
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.common import QueryCounter, load_app
+from bench.routes import WSGIDriver, prepare
+
+
+def _totals(match_id, player_id):
+    from models import Match, MatchStats, MatchUpdate, PlayerMatchPerformance
+
+    match = Match.query.get(match_id)
+    stats = MatchStats.query.filter_by(match_id=match_id).one()
+    performance = PlayerMatchPerformance.query.filter_by(match_id=match_id, player_id=player_id).one()
+    return {
+        'home_score': match.home_score or 0,
+        'away_score': match.away_score or 0,
+        'home_shots_on_target': stats.home_shots_on_target or 0,
+        'away_shots_on_target': stats.away_shots_on_target or 0,
+        'home_goal_events': MatchUpdate.query.filter_by(match_id=match_id, update_type='goal',
+                                                        team_id=match.home_team_id).count(),
+        'away_goal_events': MatchUpdate.query.filter_by(match_id=match_id, update_type='goal',
+                                                        team_id=match.away_team_id).count(),
+        'yellow_cards': performance.yellow_cards or 0,
+        'possession': (stats.home_possession or 0) + (stats.away_possession or 0),
+    }
+
+
+def run(app, goals=200, cards=100, concurrency=8, buffer=False):
+    from extensions import db
+    from live_stats import stats_buffer
+
+    app.config['LIVE_STATS_BUFFER'] = buffer
+    stats_buffer.init_app(app)
+
+    ids = prepare(app)
+    match_id, player_id = ids['match_id'], ids['player_id']
+    with app.app_context():
+        before = _totals(match_id, player_id)
+        engine = db.engine
+
+    requests = [('POST', f'/api/matches/{match_id}/score', {'team': 'home' if i % 2 else 'away'})
+                for i in range(goals)]
+    requests += [('POST', f'/api/matches/{match_id}/player/{player_id}/card/yellow', None)] * cards
+    # Buts et cartons mélangés, pour que les écritures se croisent
+    requests = [requests[i] for i in sorted(range(len(requests)), key=lambda i: (i * 7919) % len(requests))]
+
+    driver = WSGIDriver(app)
+    try:
+        with QueryCounter(engine) as counter, ThreadPoolExecutor(max_workers=concurrency) as pool:
+            start = time.perf_counter()
+            statuses = list(pool.map(lambda request: (request, driver.request(*request)), requests))
+            if buffer:
+                # Fin de match : les deltas encore en tampon sont écrits avant le coup de sifflet
+                driver.request('POST', f'/api/matches/{match_id}/end', None)
+            elapsed = time.perf_counter() - start
+    finally:
+        driver.close()
+
+    succeeded = [request for request, status in statuses if status < 400]
+    home_goals = sum(1 for _, path, body in succeeded if body == {'team': 'home'})
+    away_goals = sum(1 for _, path, body in succeeded if body == {'team': 'away'})
+    yellow_cards = sum(1 for _, path, body in succeeded if path.endswith('/yellow'))
+
+    with app.app_context():
+        after = _totals(match_id, player_id)
+    expected = {
+        'home_score': before['home_score'] + home_goals,
+        'away_score': before['away_score'] + away_goals,
+        'home_shots_on_target': before['home_shots_on_target'] + home_goals,
+        'away_shots_on_target': before['away_shots_on_target'] + away_goals,
+        'home_goal_events': before['home_goal_events'] + home_goals,
+        'away_goal_events': before['away_goal_events'] + away_goals,
+        'yellow_cards': before['yellow_cards'] + yellow_cards,
+        'possession': 100,
+    }
+    print(f'{len(requests)} requests, {concurrency} clients, {len(requests) - len(succeeded)} errors, '
+          f'{len(requests) / elapsed:.1f} req/s, {counter.count / len(requests):.1f} statements per request')
+    mismatches = []
+    for name, value in expected.items():
+        ok = after[name] == value
+        print(f"{'ok  ' if ok else 'LOST'} {name:<22} expected {value:>6} got {after[name]:>6}")
+        if not ok:
+            mismatches.append(name)
+    return mismatches, len(requests) - len(succeeded)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--goals', type=int, default=200)
+    parser.add_argument('--cards', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--buffer', action='store_true', help='Buffer the stats writes (LIVE_STATS_BUFFER).')
+    parser.add_argument('--database', help='Database URL (default: a temporary SQLite file).')
+    args = parser.parse_args()
+
+    app = load_app(args.database)
+
+    mismatches, errors = run(app, args.goals, args.cards, args.concurrency, args.buffer)
+    if mismatches or errors:
+        sys.exit(1)
@@ -0,0 +1,73 @@
+"""Password verification cost: logins/sec for each hash setting.
+
+``serial`` is one worker verifying logins back to back (a sync gunicorn
+worker); ``pool`` is a burst of concurrent logins through the bounded
+verification pool, with the number of logins refused as busy.
+
+    python -m bench.passwords [--methods scrypt pbkdf2:sha256:600000] [--workers 4] [--burst 64]
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask
+
+from passwords import PasswordHasher, LoginBusy
+
+DEFAULT_METHODS = ['scrypt:32768:8:1', 'scrypt:16384:8:1', 'pbkdf2:sha256:600000', 'pbkdf2:sha256:100000']
+
+
+def make_hasher(method, workers, queue):
+    app = Flask(__name__)
+    app.config.update(PASSWORD_HASH_METHOD=method, PASSWORD_VERIFY_WORKERS=workers, PASSWORD_VERIFY_QUEUE=queue)
+    hasher = PasswordHasher()
+    hasher.init_app(app)
+    return hasher
+
+
+def serial(method, seconds):
+    hasher = make_hasher(method, 0, 0)
+    stored = hasher.hash('correct horse')
+    logins = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        assert hasher.check(stored, 'correct horse')
+        logins += 1
+    return logins / (time.perf_counter() - start)
+
+
+def burst(method, workers, queue, size):
+    hasher = make_hasher(method, workers, queue)
+    stored = hasher.hash('correct horse')
+
+    def login(_):
+        try:
+            return hasher.check(stored, 'correct horse')
+        except LoginBusy:
+            return None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=size) as clients:
+        results = list(clients.map(login, range(size)))
+    elapsed = time.perf_counter() - start
+    accepted = sum(1 for result in results if result)
+    return accepted / elapsed, size - accepted
+
+
+def run(methods, workers, queue, size, seconds):
+    print(f"{'method':<24} {'serial/s':>9} {'pool/s':>9} {'busy':>6}")
+    for method in methods:
+        per_worker = serial(method, seconds)
+        pooled, refused = burst(method, workers, queue, size)
+        print(f'{method:<24} {per_worker:>9.1f} {pooled:>9.1f} {refused:>6}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--methods', nargs='+', default=DEFAULT_METHODS)
+    parser.add_argument('--workers', type=int, default=4, help='Verification threads of the pool.')
+    parser.add_argument('--queue', type=int, default=16, help='Verifications allowed to wait for a thread.')
+    parser.add_argument('--burst', type=int, default=64, help='Concurrent logins sent to the pool.')
+    parser.add_argument('--seconds', type=float, default=2.0, help='Duration of the serial measure.')
+    args = parser.parse_args()
+    run(args.methods, args.workers, args.queue, args.burst, args.seconds)
@@ -0,0 +1,218 @@
+"""Route benchmarks: latency percentiles, throughput and SQL queries per route.
+
+Seeds a synthetic dataset with seeds.seed_scale() into a throwaway SQLite
+file (or the database of --database), then drives the key pages and API
+routes through the Flask test client or a local threaded WSGI server.
+
+    python -m bench.routes [--driver client|wsgi] [--requests 200] [--concurrency 4]
+                           [--output results.json] [--baseline baseline.json] [--tolerance 0.2]
+
+Exits with status 1 when a route regresses against the baseline: p95 slower
+by more than --tolerance, more SQL queries per request, or new errors.
+"""
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.common import QueryCounter, load_app, summarize
+
+
+def prepare(app, tournaments=2, teams=20, players=25, seed=0):
+    """Seed the dataset once, and return the ids used by the scenarios"""
+    from extensions import db
+    from models import Tournament, Team, Player, Match, MatchStats, PlayerMatchPerformance
+    from bulk import insert_ignore
+    from seeds import seed_scale
+
+    with app.app_context():
+        tournament = Tournament.query.filter_by(name=f'Scale League {seed}-1').first()
+        if tournament is None:
+            seed_scale(tournaments, teams, players, seed=seed)
+            tournament = Tournament.query.filter_by(name=f'Scale League {seed}-1').first()
+        team = Team.query.filter_by(tournament_id=tournament.id).order_by(Team.id).first()
+
+        # Un match en cours, avec ses statistiques et les feuilles de match, pour les POST
+        match = Match.query.filter_by(tournament_id=tournament.id, status='in_progress').first() \
+            or Match.query.filter_by(tournament_id=tournament.id, status='scheduled').order_by(Match.match_date).first()
+        match.status = 'in_progress'
+        if MatchStats.query.filter_by(match_id=match.id).first() is None:
+            db.session.add(MatchStats(match_id=match.id))
+        lineup = Player.query.filter(Player.team_id.in_([match.home_team_id, match.away_team_id]))\
+                             .order_by(Player.id).all()
+        insert_ignore(PlayerMatchPerformance, ['match_id', 'player_id'], [
+            {'match_id': match.id, 'player_id': player.id, 'is_selected': True, 'is_playing': True}
+            for player in lineup
+        ])
+        db.session.commit()
+        return {
+            'tournament_id': tournament.id,
+            'team_id': team.id,
+            'match_id': match.id,
+            'player_id': lineup[0].id,
+            'matches': Match.query.count(),
+            'performances': PlayerMatchPerformance.query.count()
+        }
+
+
+def scenarios(ids):
+    """(name, method, path, JSON body) of the benchmarked requests"""
+    match_id = ids['match_id']
+    return [
+        ('tournament_detail', 'GET', f"/tournaments/{ids['tournament_id']}", None),
+        ('standings', 'GET', f"/tournaments/{ids['tournament_id']}/standings", None),
+        ('team_detail', 'GET', f"/teams/{ids['team_id']}", None),
+        ('matches', 'GET', '/matches', None),
+        ('live_api', 'GET', f'/api/matches/{match_id}/live', None),
+        ('score_post', 'POST', f'/api/matches/{match_id}/score', {'team': 'home'}),
+        ('card_post', 'POST', f"/api/matches/{match_id}/player/{ids['player_id']}/card/yellow", None),
+    ]
+
+
+class ClientDriver:
+    """In-process requests through app.test_client(), one at a time"""
+
+    concurrent = False
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body):
+        response = self.client.open(path, method=method, json=body)
+        response.close()
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+class WSGIDriver:
+    """Real HTTP requests to a threaded werkzeug server on a free local port"""
+
+    concurrent = True
+
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.port = self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def request(self, method, path, body):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+        try:
+            headers = {'Content-Type': 'application/json'} if body is not None else {}
+            connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        finally:
+            connection.close()
+
+    def close(self):
+        self.server.shutdown()
+
+
+def measure(app, driver, method, path, body, requests, concurrency, warmup):
+    from extensions import db
+
+    for _ in range(warmup):
+        driver.request(method, path, body)
+
+    def worker(count):
+        samples, errors = [], 0
+        for _ in range(count):
+            start = time.perf_counter()
+            status = driver.request(method, path, body)
+            samples.append(time.perf_counter() - start)
+            errors += status >= 400
+        return samples, errors
+
+    workers = concurrency if driver.concurrent else 1
+    shares = [requests // workers + (i < requests % workers) for i in range(workers)]
+    with app.app_context():
+        engine = db.engine
+    with QueryCounter(engine) as counter:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(worker, shares))
+        elapsed = time.perf_counter() - start
+
+    samples = [sample for worker_samples, _ in results for sample in worker_samples]
+    return dict(
+        summarize(samples),
+        rps=requests / elapsed,
+        queries_per_request=counter.count / requests,
+        errors=sum(errors for _, errors in results)
+    )
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of ``results`` against ``baseline``, as printable lines"""
+    regressions = []
+    for name, current in results['routes'].items():
+        previous = baseline.get('routes', {}).get(name)
+        if previous is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']:.1f} -> {current['p95_ms']:.1f} ms")
+        if current['queries_per_request'] > previous['queries_per_request'] + 0.01:
+            regressions.append(f"{name}: queries {previous['queries_per_request']:.1f} -> "
+                               f"{current['queries_per_request']:.1f} per request")
+        if current['errors'] > previous['errors']:
+            regressions.append(f"{name}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+
+def run(app, driver_name='client', requests=200, concurrency=4, warmup=10, dataset=None):
+    ids = prepare(app, **(dataset or {}))
+    driver = (WSGIDriver if driver_name == 'wsgi' else ClientDriver)(app)
+    results = {'driver': driver_name, 'concurrency': concurrency if driver.concurrent else 1,
+               'requests': requests, 'dataset': ids, 'routes': {}}
+    print(f"{'route':<18} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>8} {'queries':>8} {'errors':>7}")
+    try:
+        for name, method, path, body in scenarios(ids):
+            result = measure(app, driver, method, path, body, requests, concurrency, warmup)
+            results['routes'][name] = result
+            print(f"{name:<18} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f}"
+                  f" {result['rps']:>8.1f} {result['queries_per_request']:>8.1f} {result['errors']:>7}")
+    finally:
+        driver.close()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--driver', choices=('client', 'wsgi'), default='client')
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests per route.')
+    parser.add_argument('--concurrency', type=int, default=4, help='Client threads (wsgi driver only).')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--tournaments', type=int, default=2)
+    parser.add_argument('--teams', type=int, default=20)
+    parser.add_argument('--players', type=int, default=25)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--database', help='Database URL (default: a temporary SQLite file).')
+    parser.add_argument('--output', help='Write the results to this JSON file.')
+    parser.add_argument('--baseline', help='JSON results of a previous run to compare with.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 slowdown, 0.2 = 20%%.')
+    args = parser.parse_args()
+
+    app = load_app(args.database)
+
+    results = run(app, args.driver, args.requests, args.concurrency, args.warmup,
+                  dataset={'tournaments': args.tournaments, 'teams': args.teams,
+                           'players': args.players, 'seed': args.seed})
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        if regressions:
+            sys.exit(1)
+        print('No regression against the baseline.')
@@ -0,0 +1,78 @@
+"""Fixture generation: combinations + one ORM add per match (legacy) vs
+circle method + one bulk INSERT.
+
+    python -m bench.scheduler [--teams 32 64 128] [--double]
+"""
+import argparse
+import itertools
+import time
+from datetime import date, datetime, timedelta
+
+from extensions import db
+from models import Tournament, Team, Match
+from scheduler import fixture_rows, insert_fixtures
+from bench.common import make_app, QueryCounter
+
+
+def legacy_fixtures(tournament, teams):
+    for i, (home_team, away_team) in enumerate(itertools.combinations(teams, 2)):
+        db.session.add(Match(
+            tournament_id=tournament.id,
+            home_team_id=home_team.id,
+            away_team_id=away_team.id,
+            match_date=datetime.combine(tournament.start_date, datetime.min.time()) + timedelta(days=i * 3),
+            round_number=1
+        ))
+
+
+def circle_fixtures(tournament, teams, double):
+    rows = fixture_rows(tournament.id, [team.id for team in teams], tournament.start_date, double=double)
+    insert_fixtures(rows)
+
+
+def measure(n_teams, build):
+    app = make_app()
+    with app.app_context():
+        tournament = Tournament(name='Bench', start_date=date(2024, 9, 1), max_teams=n_teams)
+        db.session.add(tournament)
+        db.session.flush()
+        teams = [Team(name=f'Team {i}', tournament_id=tournament.id) for i in range(n_teams)]
+        db.session.add_all(teams)
+        db.session.commit()
+
+        with QueryCounter(db.engine) as counter:
+            start = time.perf_counter()
+            build(tournament, teams)
+            db.session.commit()
+            elapsed = time.perf_counter() - start
+
+        matches = Match.query.count()
+        last = db.session.query(db.func.max(Match.match_date)).scalar()
+        rounds = db.session.query(db.func.count(db.distinct(Match.round_number))).scalar()
+        return {
+            'ms': elapsed * 1000,
+            'statements': counter.count,
+            'matches': matches,
+            'rounds': rounds,
+            'season_days': (last.date() - tournament.start_date).days
+        }
+
+
+def run(sizes, double):
+    print(f"{'teams':>5} {'path':<8} {'matches':>8} {'rounds':>7} {'days':>6} {'stmts':>7} {'ms':>9}")
+    for n_teams in sizes:
+        results = (
+            ('legacy', measure(n_teams, legacy_fixtures)),
+            ('circle', measure(n_teams, lambda tournament, teams: circle_fixtures(tournament, teams, double)))
+        )
+        for name, result in results:
+            print(f"{n_teams:>5} {name:<8} {result['matches']:>8} {result['rounds']:>7} {result['season_days']:>6}"
+                  f" {result['statements']:>7} {result['ms']:>9.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--teams', type=int, nargs='+', default=[32, 64, 128])
+    parser.add_argument('--double', action='store_true', help='Double round-robin for the circle method.')
+    args = parser.parse_args()
+    run(args.teams, args.double)
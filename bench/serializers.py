@@ -0,0 +1,71 @@
+"""Queries issued to serialize lists of MatchUpdate / PlayerMatchPerformance.
+
+    python -m bench.serializers [--sizes 10 100 1000]
+
+Exits with an error if the eager-loading helpers stop running in a constant
+number of queries.
+"""
+import argparse
+
+from extensions import db
+from models import Team, Player, Match, MatchUpdate, PlayerMatchPerformance
+from bench.common import make_app, QueryCounter, seed_league
+
+
+def seed_rows(tournament_id, count):
+    teams = Team.query.filter_by(tournament_id=tournament_id).all()
+    matches = Match.query.filter_by(tournament_id=tournament_id).all()
+    players = []
+    for team in teams:
+        for number in range(1, 12):
+            players.append(Player(name=f'{team.name} #{number}', jersey_number=number, team_id=team.id))
+    db.session.add_all(players)
+    db.session.flush()
+
+    # Une performance par joueur et par match (index unique) : chaque couple une seule fois
+    if count > len(matches) * len(players):
+        raise ValueError(f'At most {len(matches) * len(players)} rows for this league')
+    for i in range(count):
+        match = matches[i % len(matches)]
+        player = players[i // len(matches) % len(players)]
+        db.session.add(MatchUpdate(match_id=match.id, minute=i % 90, update_type='goal',
+                                   team_id=player.team_id, player_id=player.id, description='But'))
+        db.session.add(PlayerMatchPerformance(player_id=player.id, match_id=match.id, goals=1))
+    db.session.commit()
+
+
+def count_queries(query, limit):
+    db.session.expire_all()
+    db.session.expunge_all()
+    with QueryCounter(db.engine) as counter:
+        rows = query.limit(limit).all()
+        [row.to_dict() for row in rows]
+    return counter.count
+
+
+def run(sizes):
+    app = make_app()
+    with app.app_context():
+        tournament_id = seed_league(12, completed=False).id
+        seed_rows(tournament_id, max(sizes))
+        failures = []
+        print(f"{'rows':>6} {'updates lazy':>13} {'updates eager':>14} {'perfs lazy':>11} {'perfs eager':>12}")
+        for size in sizes:
+            counts = (
+                count_queries(MatchUpdate.query.order_by(MatchUpdate.id), size),
+                count_queries(MatchUpdate.with_related().order_by(MatchUpdate.id), size),
+                count_queries(PlayerMatchPerformance.query.order_by(PlayerMatchPerformance.id), size),
+                count_queries(PlayerMatchPerformance.with_related().order_by(PlayerMatchPerformance.id), size)
+            )
+            print(f'{size:>6} {counts[0]:>13} {counts[1]:>14} {counts[2]:>11} {counts[3]:>12}')
+            if counts[1] != 1 or counts[3] != 1:
+                failures.append(size)
+        if failures:
+            raise SystemExit(f'Eager serializers issued more than one query for sizes {failures}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    args = parser.parse_args()
+    run(args.sizes)
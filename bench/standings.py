@@ -0,0 +1,77 @@
+"""Standings: per-team loop (legacy) vs aggregated query vs TeamStanding lookup.
+
+    python -m bench.standings [--teams 32] [--runs 20]
+"""
+import argparse
+
+from extensions import db
+from models import Team, Match
+from standings import aggregate_standings, compute_standings, rebuild_standings
+from bench.common import make_app, QueryCounter, timer, summarize, seed_league
+
+
+def legacy_standings(tournament_id):
+    """The former Team.get_stats() loop, one query per team"""
+    standings = []
+    for team in Team.query.filter_by(tournament_id=tournament_id).all():
+        stats = {'played': 0, 'won': 0, 'drawn': 0, 'lost': 0, 'goals_for': 0, 'goals_against': 0, 'points': 0}
+        matches = Match.query.filter(
+            db.or_(Match.home_team_id == team.id, Match.away_team_id == team.id),
+            Match.status == 'completed'
+        ).all()
+        for match in matches:
+            if match.home_team_id == team.id:
+                goals_for, goals_against = match.home_score, match.away_score
+            else:
+                goals_for, goals_against = match.away_score, match.home_score
+            stats['played'] += 1
+            stats['goals_for'] += goals_for
+            stats['goals_against'] += goals_against
+            if goals_for > goals_against:
+                stats['won'] += 1
+                stats['points'] += 3
+            elif goals_for == goals_against:
+                stats['drawn'] += 1
+                stats['points'] += 1
+            else:
+                stats['lost'] += 1
+        stats['goal_difference'] = stats['goals_for'] - stats['goals_against']
+        standings.append({'team': team, 'stats': stats})
+    standings.sort(key=lambda x: (x['stats']['points'], x['stats']['goal_difference'], x['stats']['goals_for']), reverse=True)
+    return standings
+
+
+def run(n_teams, runs):
+    app = make_app()
+    with app.app_context():
+        tournament_id = seed_league(n_teams).id
+        rebuild_standings(tournament_id)
+        db.session.commit()
+        results = {}
+        paths = (('legacy', legacy_standings), ('aggregated', aggregate_standings), ('materialized', compute_standings))
+        for name, build in paths:
+            samples = []
+            with QueryCounter(db.engine) as counter:
+                for _ in range(runs):
+                    db.session.expire_all()
+                    with timer(samples):
+                        table = build(tournament_id)
+            results[name] = dict(summarize(samples), queries_per_view=counter.count / runs)
+            results[name]['table'] = [(row['team'].id, row['stats']['points'], row['stats']['goal_difference']) for row in table]
+
+        for name in ('aggregated', 'materialized'):
+            if results[name]['table'] != results['legacy']['table']:
+                raise SystemExit(f'{name} standings differ from the legacy computation')
+
+    print(f'{n_teams} teams, {n_teams * (n_teams - 1) // 2} completed matches, {runs} runs')
+    for name, result in results.items():
+        print(f"  {name:<12} {result['queries_per_view']:6.1f} queries/view"
+              f"  mean {result['mean_ms']:8.2f} ms  p50 {result['p50_ms']:8.2f} ms  max {result['max_ms']:8.2f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--teams', type=int, default=32)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+    run(args.teams, args.runs)
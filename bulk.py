@@ -0,0 +1,219 @@
+"""Set-based write helpers shared by the bulk code paths.
+
+INSERT ... ON CONFLICT is spelled the same way by the Postgres and SQLite
+dialects of SQLAlchemy, these helpers pick the right one for the session.
+
+update_returning() and upsert_returning() write counters atomically
+(``SET col = col + n``) and return the values written by the same
+statement. Where RETURNING is not available (SQLite before 3.35) the row is
+read back right after, in the same transaction: the write lock taken by
+the UPDATE keeps other writers out until the commit.
+
+Other dialects have no ON CONFLICT: the helpers then UPDATE each row by
+its key and INSERT it when no row was updated, one or two statements per
+row instead of one for all of them.
+"""
+import csv
+import io
+import logging
+
+from sqlalchemy import func, insert, inspect, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+# (base, table, colonnes) dont l'index unique a été trouvé : ON CONFLICT possible
+_unique_keys = set()
+
+
+def dialect_name():
+    return db.session.get_bind().dialect.name
+
+
+class UnsupportedDialect(Exception):
+    pass
+
+
+def on_conflict_supported():
+    return dialect_name() in ('postgresql', 'sqlite')
+
+
+def dialect_insert(model):
+    """INSERT construct supporting on_conflict_do_update / do_nothing.
+
+    Raises UnsupportedDialect on other databases, check on_conflict_supported() first.
+    """
+    name = dialect_name()
+    if name == 'postgresql':
+        return postgresql.insert(model)
+    if name == 'sqlite':
+        return sqlite.insert(model)
+    raise UnsupportedDialect(f'INSERT ... ON CONFLICT is not supported on {name}')
+
+
+def _update_or_insert(model, key_columns, rows, set_for):
+    """Without ON CONFLICT: UPDATE SET ``set_for(row)`` the row with the same key, or INSERT it.
+
+    With an empty SET the existing row is left as it is.
+    """
+    table = model.__table__
+    for row in rows:
+        where = [table.c[column] == row[column] for column in key_columns]
+        set_ = set_for(row)
+        if set_:
+            found = db.session.execute(update(table).where(*where).values(set_)).rowcount
+        else:
+            found = db.session.execute(select(func.count()).select_from(table).where(*where)).scalar()
+        if not found:
+            db.session.execute(insert(table).values(row))
+
+
+def reset_sequences(models):
+    """After explicit ids, move the Postgres sequences past the inserted rows"""
+    if dialect_name() != 'postgresql':
+        return
+    for model in models:
+        table = db.session.connection().dialect.identifier_preparer.format_table(model.__table__)
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))"
+        ))
+
+
+def unique_key_exists(model, key_columns):
+    """Whether the database has a unique index or constraint on exactly ``key_columns`` of ``model``.
+
+    ON CONFLICT needs one. Databases created before the index was declared
+    only get it from ``flask upgrade-indexes``, which skips it over
+    duplicated keys. Found keys are cached; missing ones are checked again
+    on the next call, so the index is picked up once created.
+    """
+    table = model.__table__.name
+    key = (str(db.session.get_bind().url), table, frozenset(key_columns))
+    if key in _unique_keys:
+        return True
+    inspector = inspect(db.session.connection())
+    candidates = [index['column_names'] for index in inspector.get_indexes(table) if index['unique']]
+    candidates += [constraint['column_names'] for constraint in inspector.get_unique_constraints(table)]
+    candidates.append(inspector.get_pk_constraint(table)['constrained_columns'])
+    if any(set(columns) == set(key_columns) for columns in candidates):
+        _unique_keys.add(key)
+        return True
+    logger.warning('No unique index on %s(%s): run flask upgrade-indexes', table, ', '.join(key_columns))
+    return False
+
+
+def returning_supported():
+    dialect = db.session.get_bind().dialect
+    return dialect.update_returning and dialect.insert_returning
+
+
+def update_returning(model, where, values, returning):
+    """UPDATE ``model`` SET ``values`` WHERE ``where``; first updated row of ``returning``, or None.
+
+    The ORM objects in the session are not synchronized, callers use the
+    returned values.
+    """
+    statement = update(model).where(*where).values(values).execution_options(synchronize_session=False)
+    if returning_supported():
+        return db.session.execute(statement.returning(*returning)).mappings().first()
+    db.session.execute(statement)
+    return db.session.execute(select(*returning).where(*where)).mappings().first()
+
+
+def upsert_returning(model, key_columns, row, set_, returning):
+    """Insert ``row``, or UPDATE SET ``set_`` the row with the same key; ``returning`` of the row written"""
+    table = model.__table__
+    if not on_conflict_supported():
+        _update_or_insert(model, key_columns, [row], lambda row: set_)
+        return db.session.execute(
+            select(*returning).where(*[table.c[column] == row[column] for column in key_columns])
+        ).mappings().one()
+    statement = dialect_insert(model).values(row).on_conflict_do_update(
+        index_elements=[table.c[column] for column in key_columns], set_=set_
+    )
+    if returning_supported():
+        return db.session.execute(statement.returning(*returning)).mappings().one()
+    db.session.execute(statement)
+    return db.session.execute(
+        select(*returning).where(*[table.c[column] == row[column] for column in key_columns])
+    ).mappings().one()
+
+
+def upsert_increment(model, key_columns, rows, counters, returning=None):
+    """Insert rows, or add their counters to the existing row with the same key.
+
+    One statement whatever the number of rows. ``key_columns`` must be
+    covered by a unique index of ``model``. With ``returning``, ``rows``
+    holds a single row and the columns ``returning`` of the row written
+    are returned.
+    """
+    if not rows:
+        return
+    if returning:
+        table = model.__table__
+        set_ = {counter: func.coalesce(table.c[counter], 0) + rows[0][counter] for counter in counters}
+        return upsert_returning(model, key_columns, rows[0], set_, returning)
+    table = model.__table__
+    if not on_conflict_supported():
+        _update_or_insert(model, key_columns, rows, lambda row: {
+            counter: func.coalesce(table.c[counter], 0) + row[counter] for counter in counters if counter in row
+        })
+        return
+    statement = dialect_insert(model).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c[column] for column in key_columns],
+        set_={counter: func.coalesce(table.c[counter], 0) + statement.excluded[counter] for counter in counters}
+    )
+    db.session.execute(statement)
+
+
+def upsert(model, key_columns, rows, update_columns):
+    """Insert rows, or overwrite ``update_columns`` of the existing row with the same key"""
+    if not rows:
+        return
+    if not on_conflict_supported():
+        _update_or_insert(model, key_columns, rows, lambda row: {column: row[column] for column in update_columns})
+        return
+    statement = dialect_insert(model).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[model.__table__.c[column] for column in key_columns],
+        set_={column: statement.excluded[column] for column in update_columns}
+    )
+    db.session.execute(statement)
+
+
+def insert_ignore(model, key_columns, rows):
+    """Insert rows, skipping the ones whose key already exists"""
+    if not rows:
+        return
+    if not on_conflict_supported():
+        _update_or_insert(model, key_columns, rows, lambda row: {})
+        return
+    statement = dialect_insert(model).values(rows).on_conflict_do_nothing(
+        index_elements=[model.__table__.c[column] for column in key_columns]
+    )
+    db.session.execute(statement)
+
+
+def copy_rows(table, rows, columns=None):
+    """COPY ... FROM STDIN of dict rows into ``table`` (Postgres only).
+
+    Much faster than INSERT for large batches; goes through the session's
+    connection so it shares its transaction.
+    """
+    if not rows:
+        return
+    columns = columns or list(rows[0].keys())
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row.get(column) for column in columns])
+    buffer.seek(0)
+    connection = db.session.connection()
+    preparer = connection.dialect.identifier_preparer
+    statement = (f'COPY {preparer.format_table(table)} ({", ".join(preparer.quote(c) for c in columns)}) '
+                 f'FROM STDIN WITH (FORMAT csv)')
+    # En CSV, un champ vide non quoté vaut NULL
+    connection.connection.cursor().copy_expert(statement, buffer)
@@ -0,0 +1,517 @@
+"""Bulk export and import of match data as CSV or Parquet.
+
+Datasets: matches, performances (PlayerMatchPerformance), player_stats and
+match_updates. Exports read the table ``batch_size`` rows at a time with
+yield_per and write each batch as it comes. Parquet needs pyarrow, which is
+optional: ``pip install pyarrow``.
+
+Imports read the file by batches too. Each batch is converted to the column
+types and validated at once (required columns, value ranges, and one query
+per foreign key to check that the referenced rows exist), then written with
+a single statement: COPY into a staging table followed by INSERT ... SELECT
+or UPDATE ... FROM on Postgres, executemany elsewhere. Rows whose key exists
+are updated, the others inserted. COPY skips the Python defaults of the
+models, so they are filled in for the columns the file lacks, and the id
+sequences are moved past explicit ids afterwards. A file may hold only some columns, e.g.
+``id,home_score,away_score,status`` to enter results: its rows must then
+match existing ones, which are updated. Match events are append-only:
+events whose id exists are left as they are, and partial files are refused.
+
+Standings and player stats are recomputed once, at the end, for the
+tournaments touched; an imported event log is replayed into its projections
+(see match_events.py). The import is one transaction: it is rolled back when
+a row is invalid, unless invalid rows are skipped.
+"""
+import csv
+import os
+from dataclasses import dataclass, field
+from datetime import date, datetime
+
+from sqlalchemy import Column, MetaData, Table, bindparam, insert, select, update
+from sqlalchemy.dialects import postgresql
+
+from extensions import db
+from models import Match, PlayerMatchPerformance, PlayerStats, MatchUpdate, Player, Team
+from bulk import dialect_name, dialect_insert, on_conflict_supported, copy_rows, reset_sequences
+from standings import rebuild_standings
+from match_completion import rebuild_player_stats
+from eligibility import refresh_eligibility
+from match_events import replay, check_event, EventError
+
+MATCH_STATUSES = ('scheduled', 'in_progress', 'completed')
+
+
+class DataTransferError(Exception):
+    def __init__(self, message, errors=()):
+        super().__init__(message)
+        # (numéro de ligne, message) des lignes refusées
+        self.errors = list(errors)
+
+
+@dataclass
+class Dataset:
+    model: type
+    key: list
+    # Filtre par tournoi d'une requête sur la table
+    by_tournament: object
+    non_negative: tuple = ()
+    # Lignes existantes jamais réécrites (journal d'événements)
+    append_only: bool = False
+
+
+DATASETS = {
+    'matches': Dataset(
+        Match, ['id'],
+        lambda statement, tournament_id: statement.where(Match.tournament_id == tournament_id),
+        non_negative=('home_score', 'away_score', 'round_number')
+    ),
+    'performances': Dataset(
+        PlayerMatchPerformance, ['match_id', 'player_id'],
+        lambda statement, tournament_id: statement.join(Match, Match.id == PlayerMatchPerformance.match_id)
+                                                  .where(Match.tournament_id == tournament_id),
+        non_negative=('goals', 'assists', 'yellow_cards', 'red_cards', 'minutes_played', 'shots',
+                      'shots_on_target', 'passes', 'passes_completed', 'tackles', 'interceptions', 'saves')
+    ),
+    'player_stats': Dataset(
+        PlayerStats, ['player_id'],
+        lambda statement, tournament_id: statement.join(Player, Player.id == PlayerStats.player_id)
+                                                  .join(Team, Team.id == Player.team_id)
+                                                  .where(Team.tournament_id == tournament_id),
+        non_negative=PlayerStats.COUNTERS
+    ),
+    'match_updates': Dataset(
+        MatchUpdate, ['id'],
+        lambda statement, tournament_id: statement.join(Match, Match.id == MatchUpdate.match_id)
+                                                  .where(Match.tournament_id == tournament_id),
+        non_negative=('minute',),
+        append_only=True
+    ),
+}
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    # Lignes déjà présentes d'un jeu append-only, laissées telles quelles
+    skipped: int = 0
+    errors: list = field(default_factory=list)
+    tournaments: set = field(default_factory=set)
+
+    @property
+    def written(self):
+        return self.inserted + self.updated
+
+
+def _dataset(name):
+    if name not in DATASETS:
+        raise DataTransferError(f"Unknown dataset {name!r}, expected one of: {', '.join(DATASETS)}")
+    return DATASETS[name]
+
+
+def _format(path, fmt):
+    fmt = fmt or ('parquet' if os.path.splitext(path)[1].lower() in ('.parquet', '.pq') else 'csv')
+    if fmt not in ('csv', 'parquet'):
+        raise DataTransferError(f'Unknown format {fmt!r}')
+    return fmt
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise DataTransferError('Parquet files need pyarrow: pip install pyarrow')
+    return pyarrow
+
+
+# Export
+
+def _arrow_schema(pa, columns):
+    types = {int: pa.int64(), float: pa.float64(), bool: pa.bool_(), datetime: pa.timestamp('us'),
+             date: pa.date32(), str: pa.string()}
+    return pa.schema([(column.name, types.get(column.type.python_type, pa.string())) for column in columns])
+
+
+def _csv_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def export_dataset(name, path, fmt=None, tournament_id=None, batch_size=5000):
+    """Write a dataset to ``path``; returns the number of rows written"""
+    dataset = _dataset(name)
+    fmt = _format(path, fmt)
+    columns = list(dataset.model.__table__.columns)
+    statement = select(*columns).order_by(dataset.model.id)
+    if tournament_id is not None:
+        statement = dataset.by_tournament(statement, tournament_id)
+    result = db.session.execute(statement.execution_options(yield_per=batch_size))
+
+    count = 0
+    if fmt == 'csv':
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow([column.name for column in columns])
+            for rows in result.partitions():
+                writer.writerows([_csv_value(value) for value in row] for row in rows)
+                count += len(rows)
+    else:
+        pa = _pyarrow()
+        schema = _arrow_schema(pa, columns)
+        with pa.parquet.ParquetWriter(path, schema) as writer:
+            for rows in result.partitions():
+                writer.write_table(pa.Table.from_pylist([row._asdict() for row in rows], schema=schema))
+                count += len(rows)
+    result.close()
+    return count
+
+
+# Import
+
+def _read_batches(path, fmt, batch_size):
+    """Yield (first line number, list of dicts) batches of the file"""
+    if fmt == 'csv':
+        with open(path, newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            batch, first_line = [], 2
+            for row in reader:
+                batch.append(row)
+                if len(batch) == batch_size:
+                    yield first_line, batch
+                    first_line += len(batch)
+                    batch = []
+            if batch:
+                yield first_line, batch
+    else:
+        pa = _pyarrow()
+        first_line = 1
+        for record_batch in pa.parquet.ParquetFile(path).iter_batches(batch_size=batch_size):
+            rows = record_batch.to_pylist()
+            yield first_line, rows
+            first_line += len(rows)
+
+
+def _header(path, fmt):
+    if fmt == 'csv':
+        with open(path, newline='', encoding='utf-8') as f:
+            return next(csv.reader(f), [])
+    return _pyarrow().parquet.ParquetFile(path).schema_arrow.names
+
+
+def _convert(value, python_type):
+    if value is None or value == '':
+        return None
+    if isinstance(value, python_type) and not (python_type is int and isinstance(value, bool)):
+        return value
+    if python_type is bool:
+        lowered = str(value).strip().lower()
+        if lowered in ('1', 'true', 't', 'yes'):
+            return True
+        if lowered in ('0', 'false', 'f', 'no'):
+            return False
+        raise ValueError(value)
+    if python_type is datetime:
+        return datetime.fromisoformat(str(value))
+    if python_type is date:
+        return date.fromisoformat(str(value)[:10])
+    if python_type is int:
+        number = float(value)
+        if not number.is_integer():
+            raise ValueError(value)
+        return int(number)
+    return python_type(value)
+
+
+def _required_columns(table):
+    return {column.name for column in table.columns
+            if not column.nullable and not column.primary_key and column.default is None
+            and column.server_default is None}
+
+
+def _existing(column, values):
+    """Values among ``values`` present in ``column``, queried by chunks"""
+    values = list(values)
+    found = set()
+    for i in range(0, len(values), 500):
+        found.update(db.session.execute(select(column).where(column.in_(values[i:i + 500]))).scalars())
+    return found
+
+
+def _existing_keys(table, key, rows):
+    if key == ['id']:
+        return {(value,) for value in _existing(table.c.id, {row['id'] for row in rows if row.get('id') is not None})}
+    # Clé composée : on filtre sur la première colonne puis on compare les tuples
+    first = table.c[key[0]]
+    candidates = list({row[key[0]] for row in rows})
+    found = set()
+    for i in range(0, len(candidates), 500):
+        found.update(tuple(row) for row in db.session.execute(
+            select(*[table.c[name] for name in key]).where(first.in_(candidates[i:i + 500]))))
+    return found
+
+
+def _event_error(row):
+    """Why ``row`` is not a valid match event, or None; the log is replayed as it is imported"""
+    try:
+        check_event(row.get('update_type'), row.get('team_id'), row.get('player_id'), row.get('related_player_id'),
+                    row.get('detail'), row.get('home_score'), row.get('away_score'))
+    except EventError as error:
+        return str(error)
+    return None
+
+
+def _validate_batch(dataset, raw_rows, first_line, columns, upsert):
+    """Typed rows of the batch and the errors as (line, message)"""
+    table = dataset.model.__table__
+    types = {name: table.c[name].type.python_type for name in columns}
+    rows, errors = [], []
+    for offset, raw in enumerate(raw_rows):
+        line = first_line + offset
+        row, bad = {}, []
+        for name in columns:
+            try:
+                row[name] = _convert(raw.get(name), types[name])
+            except (ValueError, TypeError):
+                bad.append(f'{name}={raw.get(name)!r}')
+        if bad:
+            errors.append((line, f"invalid {', '.join(bad)}"))
+            continue
+        missing = [name for name in dataset.key if row.get(name) is None and not (name == 'id' and upsert)]
+        if upsert:
+            missing += [name for name in _required_columns(table) if row.get(name) is None]
+        negative = [name for name in dataset.non_negative if name in row and row[name] is not None and row[name] < 0]
+        event_error = _event_error(row) if dataset.model is MatchUpdate else None
+        if missing:
+            errors.append((line, f"missing {', '.join(sorted(set(missing)))}"))
+        elif negative:
+            errors.append((line, f"negative {', '.join(negative)}"))
+        elif dataset.model is Match and row.get('status') is not None and row['status'] not in MATCH_STATUSES:
+            errors.append((line, f"status must be one of {', '.join(MATCH_STATUSES)}"))
+        elif dataset.model is Match and row.get('home_team_id') is not None \
+                and row.get('home_team_id') == row.get('away_team_id'):
+            errors.append((line, 'a team cannot play itself'))
+        elif event_error:
+            errors.append((line, event_error))
+        else:
+            rows.append((line, row))
+
+    # Clés étrangères : une requête par colonne pour tout le lot
+    for name in columns:
+        for foreign_key in table.c[name].foreign_keys:
+            values = {row[name] for _, row in rows if row[name] is not None}
+            if not values:
+                continue
+            found = _existing(foreign_key.column, values)
+            for line, row in rows:
+                if row[name] is not None and row[name] not in found:
+                    errors.append((line, f'{name} {row[name]} does not exist'))
+    invalid = {line for line, _ in errors}
+    rows = [(line, row) for line, row in rows if line not in invalid]
+
+    if not upsert:
+        # Fichier partiel : il ne peut que mettre à jour des lignes existantes
+        existing = _existing_keys(table, dataset.key, [row for _, row in rows])
+        for line, row in rows:
+            if tuple(row[name] for name in dataset.key) not in existing:
+                errors.append((line, f"no existing row with {', '.join(f'{n}={row[n]}' for n in dataset.key)}"))
+        invalid = {line for line, _ in errors}
+        rows = [(line, row) for line, row in rows if line not in invalid]
+    return [row for _, row in rows], sorted(errors)
+
+
+def _staging_table(table, columns):
+    return Table('import_staging', MetaData(), *[Column(name, table.c[name].type) for name in columns],
+                 prefixes=['TEMPORARY'])
+
+
+def _with_defaults(table, columns, rows):
+    """Columns and rows completed with the Python defaults of the columns missing from the file.
+
+    COPY and INSERT ... SELECT do not go through SQLAlchemy, which would
+    otherwise fill them (status 'scheduled', created_at...).
+    """
+    defaults = [column for column in table.columns
+                if column.name not in columns and not column.primary_key and column.default is not None
+                and (column.default.is_scalar or column.default.is_callable)]
+    if not defaults:
+        return columns, rows
+    values = {}
+    for column in defaults:
+        # Les fonctions sont enveloppées par SQLAlchemy et prennent le contexte d'exécution
+        values[column.name] = column.default.arg(None) if column.default.is_callable else column.default.arg
+    return columns + list(values), [dict(row, **values) for row in rows]
+
+
+def _write_postgres(table, key, columns, rows, upsert, ignore=False):
+    """COPY into a staging table, then one INSERT ... SELECT or UPDATE ... FROM"""
+    values = [name for name in columns if name not in key]
+    if upsert:
+        # Valeurs par défaut pour les lignes insérées seulement : absentes du SET
+        columns, rows = _with_defaults(table, columns, rows)
+    staging = _staging_table(table, columns)
+    connection = db.session.connection()
+    staging.create(connection)
+    try:
+        copy_rows(staging, rows, columns)
+        if upsert:
+            statement = postgresql.insert(table).from_select(columns, select(*staging.columns))
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c[name] for name in key],
+                set_={name: statement.excluded[name] for name in values}
+            ) if values and not ignore else statement.on_conflict_do_nothing(
+                index_elements=[table.c[name] for name in key])
+        else:
+            statement = update(table).values({name: staging.c[name] for name in values})\
+                .where(*[table.c[name] == staging.c[name] for name in key])
+        db.session.execute(statement)
+    finally:
+        staging.drop(connection)
+
+
+def _update_by_key(table, key, columns, rows):
+    """UPDATE the rows with the same key, one executemany"""
+    values = [name for name in columns if name not in key]
+    if not rows or not values:
+        return
+    # Les colonnes présentes dans les paramètres forment le SET
+    statement = update(table).where(*[table.c[name] == bindparam(f'key_{name}') for name in key])
+    db.session.execute(statement, [
+        {**{name: row[name] for name in values}, **{f'key_{name}': row[name] for name in key}}
+        for row in rows
+    ])
+
+
+def _write(dataset, columns, rows, upsert):
+    """Write a validated batch; returns (inserted, updated, skipped)"""
+    table = dataset.model.__table__
+    key = dataset.key
+    if not rows:
+        return 0, 0, 0
+
+    new_rows = [row for row in rows if row.get('id') is None] if key == ['id'] else []
+    keyed_rows = [row for row in rows if row.get('id') is not None] if key == ['id'] else rows
+    existing = _existing_keys(table, key, keyed_rows) if keyed_rows else set()
+    skipped = 0
+    if dataset.append_only:
+        # Les lignes déjà présentes ne sont pas réécrites (UPDATE en SQL Core, sans garde ORM)
+        kept = [row for row in keyed_rows if tuple(row[name] for name in key) not in existing]
+        skipped, keyed_rows, existing = len(keyed_rows) - len(kept), kept, set()
+    updated = len(existing)
+
+    if new_rows:
+        new_columns = [name for name in columns if name != 'id']
+        if dialect_name() == 'postgresql':
+            copy_columns, copy_values = _with_defaults(table, new_columns, new_rows)
+            copy_rows(table, copy_values, copy_columns)
+        else:
+            db.session.execute(insert(table), [{name: row[name] for name in new_columns} for row in new_rows])
+
+    if keyed_rows:
+        if dialect_name() == 'postgresql':
+            _write_postgres(table, key, columns, keyed_rows, upsert, ignore=dataset.append_only)
+        elif upsert and not on_conflict_supported():
+            # Sans ON CONFLICT : les clés existantes sont déjà connues, INSERT des autres puis UPDATE
+            inserted = [row for row in keyed_rows if tuple(row[name] for name in key) not in existing]
+            if inserted:
+                db.session.execute(insert(table), inserted)
+            _update_by_key(table, key, columns,
+                           [row for row in keyed_rows if tuple(row[name] for name in key) in existing])
+        elif upsert:
+            statement = dialect_insert(dataset.model)
+            values = [name for name in columns if name not in key]
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c[name] for name in key],
+                set_={name: statement.excluded[name] for name in values}
+            ) if values and not dataset.append_only else statement.on_conflict_do_nothing(
+                index_elements=[table.c[name] for name in key])
+            db.session.execute(statement, keyed_rows)
+        else:
+            _update_by_key(table, key, columns, keyed_rows)
+    if 'id' in columns:
+        reset_sequences([dataset.model])
+    return len(new_rows) + len(keyed_rows) - updated, updated, skipped
+
+
+def _tournaments_of_matches(match_ids):
+    match_ids = list(match_ids)
+    tournaments = set()
+    for i in range(0, len(match_ids), 500):
+        tournaments.update(db.session.execute(
+            select(Match.tournament_id).where(Match.id.in_(match_ids[i:i + 500])).distinct()).scalars())
+    return tournaments
+
+
+def _touched_tournaments(dataset, rows):
+    """Tournaments whose derived data depends on the written rows"""
+    if dataset.model is Match:
+        return {row['tournament_id'] for row in rows if row.get('tournament_id') is not None} \
+            | _tournaments_of_matches(row['id'] for row in rows if row.get('tournament_id') is None)
+    if dataset.model in (PlayerMatchPerformance, MatchUpdate):
+        return _tournaments_of_matches({row['match_id'] for row in rows})
+    return set()
+
+
+def import_dataset(name, path, fmt=None, batch_size=5000, skip_invalid=False, dry_run=False, max_errors=100):
+    """Import a file into a dataset, in one transaction; returns an ImportReport.
+
+    Raises DataTransferError if the file has invalid rows, unless
+    ``skip_invalid`` is set. Nothing is committed with ``dry_run``.
+    """
+    dataset = _dataset(name)
+    fmt = _format(path, fmt)
+    table = dataset.model.__table__
+    columns = [name for name in _header(path, fmt) if name]
+    unknown = [name for name in columns if name not in table.c]
+    if unknown:
+        raise DataTransferError(f"Unknown column(s) for {name}: {', '.join(unknown)}")
+    # Toutes les colonnes obligatoires présentes : insertion ou mise à jour, sinon mise à jour seule
+    upsert = _required_columns(table) <= set(columns)
+    missing_key = [name for name in dataset.key if name not in columns and not (name == 'id' and upsert)]
+    if missing_key:
+        raise DataTransferError(f"The file must have the key column(s): {', '.join(missing_key)}")
+    if dataset.append_only and not upsert:
+        raise DataTransferError(f"{name} is append-only: the file must hold whole rows with "
+                                f"{', '.join(sorted(_required_columns(table)))}, existing ones are never updated")
+
+    report = ImportReport()
+    try:
+        for first_line, raw_rows in _read_batches(path, fmt, batch_size):
+            report.rows += len(raw_rows)
+            rows, errors = _validate_batch(dataset, raw_rows, first_line, columns, upsert)
+            if len(report.errors) < max_errors:
+                report.errors.extend(errors[:max_errors - len(report.errors)])
+            if errors and not skip_invalid:
+                continue
+            inserted, updated, skipped = _write(dataset, columns, rows, upsert)
+            report.inserted += inserted
+            report.updated += updated
+            report.skipped += skipped
+            report.tournaments |= _touched_tournaments(dataset, rows)
+
+        if report.errors and not skip_invalid:
+            raise DataTransferError(f'{len(report.errors)} invalid row(s), nothing imported', report.errors)
+
+        # Données dérivées recalculées une seule fois
+        for tournament_id in sorted(report.tournaments):
+            if dataset.model is Match:
+                rebuild_standings(tournament_id)
+                refresh_eligibility(tournament_id=tournament_id)
+            elif dataset.model is MatchUpdate:
+                # Journal importé : projections reconstruites (voir match_events.py)
+                replay(tournament_id=tournament_id)
+                continue
+            rebuild_player_stats(
+                select(PlayerMatchPerformance.player_id).join(Match, Match.id == PlayerMatchPerformance.match_id)
+                .where(Match.tournament_id == tournament_id).distinct()
+            )
+        if dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return report
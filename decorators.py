@@ -1,12 +1,11 @@
 from functools import wraps
 from flask import flash, redirect, url_for
 from flask_login import current_user
-from models import Admin, Coach
 
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not current_user.is_authenticated or not isinstance(current_user, Admin):
+        if not current_user.is_authenticated or current_user.role != 'admin':
             flash('Accès refusé. Droits administrateur requis.', 'error')
             return redirect(url_for('login'))
         return f(*args, **kwargs)
@@ -15,7 +14,7 @@ def admin_required(f):
 def coach_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not current_user.is_authenticated or not isinstance(current_user, Coach):
+        if not current_user.is_authenticated or current_user.role != 'coach':
             flash('Accès refusé. Droits entraîneur requis.', 'error')
             return redirect(url_for('login'))
         return f(*args, **kwargs)
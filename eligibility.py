@@ -0,0 +1,65 @@
+"""Eligibility of the players for the matches still to be played.
+
+PlayerEligibility holds one row per player of both squads for every match
+that is not completed: eligible or not, and why. It is derived from the
+availability and suspension columns of Player, and recomputed with one
+DELETE and one INSERT ... SELECT when they or the fixtures change
+(fixtures generated, match completed, availability toggled, player
+added). Lineup validation, the coach pages and the live page read it with
+one query on the (match_id, team_id, eligible) index.
+
+A suspended player misses every match of their team up to and including
+``suspended_until_match_id``, or all the remaining ones when it is empty
+(no fixture left when the suspension was given).
+"""
+from sqlalchemy import and_, case, insert, or_, select, union_all
+from sqlalchemy.orm import aliased
+
+from extensions import db
+from models import Match, Player, PlayerEligibility
+
+
+def _scope(tournament_id=None, team_ids=None):
+    """Ids of the matches of a tournament and/or of some teams; all without filter"""
+    scope = select(Match.id)
+    if tournament_id is not None:
+        scope = scope.where(Match.tournament_id == tournament_id)
+    if team_ids is not None:
+        team_ids = list(team_ids)
+        scope = scope.where(or_(Match.home_team_id.in_(team_ids), Match.away_team_id.in_(team_ids)))
+    return scope
+
+
+def clear_eligibility(tournament_id=None, team_ids=None):
+    """Delete the rows of the matches in scope, e.g. before deleting the matches"""
+    PlayerEligibility.query.filter(PlayerEligibility.match_id.in_(_scope(tournament_id, team_ids)))\
+        .delete(synchronize_session=False)
+
+
+def _side(team_column, scope):
+    """(match_id, player_id, team_id, eligible, reason) of one side of the matches in scope"""
+    until = aliased(Match)
+    unavailable = Player.is_available.is_(False)
+    suspended = and_(Player.is_suspended.is_(True),
+                     or_(until.id.is_(None), Match.match_date <= until.match_date))
+    return select(
+        Match.id, Player.id, Player.team_id,
+        ~or_(unavailable, suspended),
+        case((unavailable, 'unavailable'), (suspended, 'suspended'), else_=None)
+    ).join(Player, Player.team_id == team_column)\
+     .outerjoin(until, until.id == Player.suspended_until_match_id)\
+     .where(Match.id.in_(scope), Match.status != 'completed')
+
+
+def refresh_eligibility(tournament_id=None, team_ids=None):
+    """Recompute the eligibility of the matches of a tournament and/or of some teams.
+
+    Completed matches lose their rows. Two statements whatever the number
+    of matches; does not commit.
+    """
+    scope = _scope(tournament_id, team_ids)
+    clear_eligibility(tournament_id, team_ids)
+    rows = union_all(_side(Match.home_team_id, scope), _side(Match.away_team_id, scope))
+    db.session.execute(insert(PlayerEligibility).from_select(
+        ['match_id', 'player_id', 'team_id', 'eligible', 'reason'], rows
+    ))
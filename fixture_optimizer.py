@@ -0,0 +1,274 @@
+"""Optional optimization pass over a round-robin schedule.
+
+Starting from the rows of scheduler.fixture_rows(), a simulated annealing
+search moves matches within their matchday window, reorders rounds inside
+each half of the season and, for a double round-robin, swaps which leg of a
+pairing is played at home. It tries to satisfy:
+
+- shared venues: clubs with the same venue key (by default Team.city, e.g.
+  the two Casablanca clubs) never both play at home on the same day;
+- minimum rest: at least ``min_rest_days`` full days between two matches of
+  the same team;
+- blackout dates: no match on those days.
+
+The cost is updated incrementally for each move, so a 20-team double
+round-robin (380 matches) takes a few seconds at most. The search is
+deterministic for a given seed as long as it stops on ``max_iterations`` or
+on a zero cost rather than on ``time_budget``.
+"""
+import math
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+WEIGHTS = {'venue': 2, 'rest': 1, 'blackout': 3}
+
+
+@dataclass
+class OptimizationResult:
+    rows: list
+    violations: list
+    cost_before: int
+    cost_after: int
+    iterations: int
+    elapsed: float
+    stopped_by: str = field(default='iterations')
+
+
+def find_violations(rows, venue_of, min_rest_days=2, blackout_dates=()):
+    """Constraint violations of a list of match rows, as dicts"""
+    blackout_dates = set(blackout_dates)
+    violations = []
+
+    home_venues = {}
+    for row in rows:
+        day = row['match_date'].date()
+        if day in blackout_dates:
+            violations.append({'type': 'blackout', 'date': day,
+                               'teams': (row['home_team_id'], row['away_team_id'])})
+        venue = venue_of.get(row['home_team_id'])
+        if venue is not None:
+            home_venues.setdefault((day, venue), []).append(row['home_team_id'])
+    for (day, venue), teams in sorted(home_venues.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+        if len(teams) > 1:
+            violations.append({'type': 'venue', 'date': day, 'venue': venue, 'teams': tuple(teams)})
+
+    team_days = {}
+    for row in rows:
+        for team_id in (row['home_team_id'], row['away_team_id']):
+            team_days.setdefault(team_id, []).append(row['match_date'].date())
+    for team_id, days in sorted(team_days.items()):
+        days.sort()
+        for previous, current in zip(days, days[1:]):
+            rest = (current - previous).days - 1
+            if rest < min_rest_days:
+                violations.append({'type': 'rest', 'team': team_id, 'date': current, 'rest_days': rest})
+    return violations
+
+
+class _Annealer:
+
+    def __init__(self, rows, venue_of, double, min_rest_days, blackout_dates, matchday_window, seed):
+        self.rows = rows
+        self.rng = random.Random(seed)
+        self.min_rest_days = min_rest_days
+        self.window = max(1, matchday_window)
+        self.blackout = {day.toordinal() for day in blackout_dates}
+
+        self.home = [row['home_team_id'] for row in rows]
+        self.away = [row['away_team_id'] for row in rows]
+        self.venue_of = venue_of
+
+        round_numbers = sorted({row['round_number'] for row in rows})
+        round_index = {number: index for index, number in enumerate(round_numbers)}
+        self.round_of = [round_index[row['round_number']] for row in rows]
+        self.rounds = [[] for _ in round_numbers]
+        for m, r in enumerate(self.round_of):
+            self.rounds[r].append(m)
+
+        # Date de base de chaque journée ; slot_of_round permute les journées entre elles
+        self.slot_day = [min(rows[m]['match_date'] for m in matches).date().toordinal() for matches in self.rounds]
+        self.slot_of_round = list(range(len(self.rounds)))
+        self.offset = [rows[m]['match_date'].date().toordinal() - self.slot_day[r] for m, r in enumerate(self.round_of)]
+
+        half = len(self.rounds) // 2 if double else len(self.rounds)
+        self.halves = [list(range(0, half)), list(range(half, len(self.rounds)))] if double else [list(range(half))]
+        self.halves = [h for h in self.halves if len(h) > 1]
+
+        self.mirror = [None] * len(rows)
+        if double:
+            by_pair = {(h, a): m for m, (h, a) in enumerate(zip(self.home, self.away))}
+            for m, (h, a) in enumerate(zip(self.home, self.away)):
+                self.mirror[m] = by_pair.get((a, h))
+
+        self.team_matches = {}
+        for m in range(len(rows)):
+            self.team_matches.setdefault(self.home[m], []).append(m)
+            self.team_matches.setdefault(self.away[m], []).append(m)
+
+        self.usage = {}
+        self.venue_penalty = 0
+        self.blackout_penalty = 0
+        for m in range(len(rows)):
+            self._add(m)
+        self.rest = {team: self._team_rest(team) for team in self.team_matches}
+        self.rest_penalty = sum(self.rest.values())
+
+    # Coût
+
+    def _day(self, m):
+        return self.slot_day[self.slot_of_round[self.round_of[m]]] + self.offset[m]
+
+    def _venue(self, m):
+        venue = self.venue_of.get(self.home[m])
+        return ('team', self.home[m]) if venue is None else venue
+
+    def _add(self, m):
+        day = self._day(m)
+        key = (day, self._venue(m))
+        count = self.usage.get(key, 0)
+        if count >= 1:
+            self.venue_penalty += 1
+        self.usage[key] = count + 1
+        if day in self.blackout:
+            self.blackout_penalty += 1
+
+    def _remove(self, m):
+        day = self._day(m)
+        key = (day, self._venue(m))
+        count = self.usage[key]
+        if count >= 2:
+            self.venue_penalty -= 1
+        if count == 1:
+            del self.usage[key]
+        else:
+            self.usage[key] = count - 1
+        if day in self.blackout:
+            self.blackout_penalty -= 1
+
+    def _team_rest(self, team):
+        days = sorted(self._day(m) for m in self.team_matches[team])
+        return sum(1 for previous, current in zip(days, days[1:]) if current - previous - 1 < self.min_rest_days)
+
+    @property
+    def cost(self):
+        return (WEIGHTS['venue'] * self.venue_penalty + WEIGHTS['rest'] * self.rest_penalty
+                + WEIGHTS['blackout'] * self.blackout_penalty)
+
+    # Mouvements
+
+    def _try(self, matches, teams, mutate, undo, temperature):
+        before = self.cost
+        for m in matches:
+            self._remove(m)
+        mutate()
+        for m in matches:
+            self._add(m)
+        new_rest = {team: self._team_rest(team) for team in teams}
+        rest_delta = sum(new_rest[team] - self.rest[team] for team in teams)
+        self.rest_penalty += rest_delta
+
+        delta = self.cost - before
+        if delta <= 0 or self.rng.random() < math.exp(-delta / temperature):
+            self.rest.update(new_rest)
+            return True
+
+        for m in matches:
+            self._remove(m)
+        undo()
+        for m in matches:
+            self._add(m)
+        self.rest_penalty -= rest_delta
+        return False
+
+    def _move(self, temperature):
+        choice = self.rng.random()
+        if choice < 0.1 and self.halves:
+            half = self.rng.choice(self.halves)
+            r1, r2 = self.rng.sample(half, 2)
+            matches = self.rounds[r1] + self.rounds[r2]
+            teams = {self.home[m] for m in matches} | {self.away[m] for m in matches}
+
+            def swap():
+                self.slot_of_round[r1], self.slot_of_round[r2] = self.slot_of_round[r2], self.slot_of_round[r1]
+            return self._try(matches, teams, swap, swap, temperature)
+
+        m = self.rng.randrange(len(self.rows))
+        if choice < 0.3 and self.mirror[m] is not None:
+            pair = [m, self.mirror[m]]
+
+            def flip():
+                for k in pair:
+                    self.home[k], self.away[k] = self.away[k], self.home[k]
+            # Les dates ne changent pas : le repos des équipes est inchangé
+            return self._try(pair, (), flip, flip, temperature)
+
+        if self.window == 1:
+            return False
+        old = self.offset[m]
+        new = self.rng.choice([offset for offset in range(self.window) if offset != old])
+
+        def set_new():
+            self.offset[m] = new
+
+        def set_old():
+            self.offset[m] = old
+        return self._try([m], (self.home[m], self.away[m]), set_new, set_old, temperature)
+
+    def run(self, max_iterations, time_budget, start_temperature=2.0, end_temperature=0.02):
+        started = time.perf_counter()
+        best_cost = self.cost
+        best = self._snapshot()
+        stopped_by = 'iterations'
+        iteration = 0
+        for iteration in range(1, max_iterations + 1):
+            if best_cost == 0:
+                stopped_by = 'optimal'
+                break
+            if time.perf_counter() - started > time_budget:
+                stopped_by = 'time_budget'
+                break
+            temperature = start_temperature * (end_temperature / start_temperature) ** (iteration / max_iterations)
+            self._move(temperature)
+            if self.cost < best_cost:
+                best_cost = self.cost
+                best = self._snapshot()
+        return best, iteration, time.perf_counter() - started, stopped_by
+
+    def _snapshot(self):
+        return list(self.home), list(self.away), list(self.slot_of_round), list(self.offset)
+
+    def rows_for(self, snapshot):
+        home, away, slot_of_round, offset = snapshot
+        result = []
+        for m, row in enumerate(self.rows):
+            slot = slot_of_round[self.round_of[m]]
+            day = self.slot_day[slot] + offset[m]
+            match_date = row['match_date']
+            moved = match_date + timedelta(days=day - match_date.date().toordinal())
+            # Les journées sont renumérotées dans l'ordre chronologique
+            result.append(dict(row, home_team_id=home[m], away_team_id=away[m],
+                               match_date=moved, round_number=slot + 1))
+        return result
+
+
+def optimize_fixtures(rows, venue_of, double=False, min_rest_days=2, blackout_dates=(), matchday_window=3,
+                      seed=0, max_iterations=20000, time_budget=5.0):
+    """Search a schedule satisfying the venue, rest and blackout constraints.
+
+    ``rows`` come from scheduler.fixture_rows(); ``venue_of`` maps a team id
+    to its venue key (teams mapped to the same key share a stadium). A match
+    may be moved up to ``matchday_window - 1`` days after its matchday. The
+    best schedule found is returned, with its remaining violations.
+    """
+    if not rows:
+        return OptimizationResult([], [], 0, 0, 0, 0.0, 'optimal')
+    cost_before = sum(WEIGHTS[violation['type']]
+                      for violation in find_violations(rows, venue_of, min_rest_days, blackout_dates))
+    annealer = _Annealer(rows, venue_of, double, min_rest_days, blackout_dates, matchday_window, seed)
+    best, iterations, elapsed, stopped_by = annealer.run(max_iterations, time_budget)
+    optimized = annealer.rows_for(best)
+    violations = find_violations(optimized, venue_of, min_rest_days, blackout_dates)
+    cost_after = sum(WEIGHTS[violation['type']] for violation in violations)
+    return OptimizationResult(optimized, violations, cost_before, cost_after, iterations, elapsed, stopped_by)
@@ -0,0 +1,218 @@
+"""Small in-process job queue for work that can run after the response.
+
+Jobs are submitted to a thread pool once the transaction that enqueued them
+commits, so a worker never sees a job whose triggering change was rolled
+back. Every job has an idempotency key: enqueueing a key that is already
+pending, running or done is a no-op.
+
+JOB_QUEUE_MODE selects how job state is kept:
+
+- ``memory``: in a dict of this process (lost on restart). Each worker only
+  knows its own jobs: with more than one worker (WEB_CONCURRENCY), use
+  ``durable``;
+- ``durable``: in the BackgroundJob table, in the same transaction as the
+  change that triggered it. The job is marked done in the transaction of its
+  side effects, so they are applied once even if a worker dies; jobs left
+  pending are picked up again by recover() at startup;
+- ``eager``: run synchronously right after the commit (scripts, benchmarks).
+"""
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+PENDING_JOBS = 'pending_jobs'
+
+
+class JobQueue:
+
+    def __init__(self):
+        self.handlers = {}
+        self.app = None
+        self.mode = 'memory'
+        self.max_attempts = 3
+        self.retry_delay = 1.0
+        self.stale_after = timedelta(minutes=5)
+        self._executor = None
+        self._statuses = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.mode = app.config.get('JOB_QUEUE_MODE', 'memory')
+        self.max_attempts = app.config.get('JOB_QUEUE_MAX_ATTEMPTS', self.max_attempts)
+        self.retry_delay = app.config.get('JOB_QUEUE_RETRY_DELAY', self.retry_delay)
+        if self.mode == 'memory' and int(os.environ.get('WEB_CONCURRENCY', 1)) > 1:
+            logger.warning('JOB_QUEUE_MODE=memory with several workers: job statuses are per worker '
+                           'and lost on restart, use JOB_QUEUE_MODE=durable')
+        if self.mode != 'eager':
+            self._executor = ThreadPoolExecutor(
+                max_workers=app.config.get('JOB_QUEUE_WORKERS', 2),
+                thread_name_prefix='jobs'
+            )
+        app.extensions['job_queue'] = self
+
+    def task(self, name):
+        """Register the function run for jobs called ``name``"""
+        def decorator(f):
+            self.handlers[name] = f
+            return f
+        return decorator
+
+    # Enqueueing
+
+    def enqueue(self, name, key, **payload):
+        """Schedule a job, started once the current transaction commits.
+
+        Returns False when a job with this key is already pending, running
+        or done.
+        """
+        if name not in self.handlers:
+            raise KeyError(f'No handler registered for job {name!r}')
+
+        if self.mode == 'durable':
+            job = BackgroundJob.query.filter_by(key=key).first()
+            if job is not None and job.status != 'failed':
+                return False
+            if job is None:
+                job = BackgroundJob(key=key, name=name)
+                db.session.add(job)
+            job.payload = json.dumps(payload)
+            job.status = 'pending'
+            job.attempts = 0
+            job.last_error = None
+        else:
+            with self._lock:
+                current = self._statuses.get(key)
+                if current is not None and current['status'] != 'failed':
+                    return False
+                self._statuses[key] = {'key': key, 'name': name, 'status': 'pending', 'attempts': 0,
+                                       'error': None, 'result': None, 'updated_at': _now()}
+
+        db.session.info.setdefault(PENDING_JOBS, []).append((name, key, payload))
+        return True
+
+    def _submit(self, name, key, payload):
+        if self.mode == 'eager':
+            self._run(name, key, payload)
+        else:
+            self._executor.submit(self._run, name, key, payload)
+
+    # Running
+
+    def _claim(self, key):
+        """Move a durable job to running; False if another worker has it"""
+        claimed = BackgroundJob.query.filter(BackgroundJob.key == key, BackgroundJob.status == 'pending')\
+            .update({BackgroundJob.status: 'running',
+                     BackgroundJob.attempts: BackgroundJob.attempts + 1,
+                     BackgroundJob.updated_at: datetime.utcnow()},
+                    synchronize_session=False)
+        db.session.commit()
+        return claimed == 1
+
+    def _set_status(self, key, status, error=None, result=None):
+        if self.mode == 'durable':
+            BackgroundJob.query.filter_by(key=key).update({
+                BackgroundJob.status: status,
+                BackgroundJob.last_error: error,
+                BackgroundJob.result: json.dumps(result) if result is not None else None
+            }, synchronize_session=False)
+            return
+        with self._lock:
+            entry = self._statuses.setdefault(key, {'key': key, 'attempts': 0})
+            if status == 'running':
+                entry['attempts'] = entry.get('attempts', 0) + 1
+            entry.update(status=status, error=error, result=result, updated_at=_now())
+
+    def _run(self, name, key, payload):
+        handler = self.handlers[name]
+        with self.app.app_context():
+            for attempt in range(1, self.max_attempts + 1):
+                if self.mode == 'durable':
+                    if not self._claim(key):
+                        return
+                else:
+                    self._set_status(key, 'running')
+                try:
+                    result = handler(**payload)
+                    # Terminé dans la même transaction que les effets du job
+                    self._set_status(key, 'done', result=result)
+                    db.session.commit()
+                    return
+                except Exception as exc:
+                    db.session.rollback()
+                    logger.exception('Job %s failed (attempt %d/%d)', key, attempt, self.max_attempts)
+                    final = attempt == self.max_attempts
+                    self._set_status(key, 'failed' if final else 'pending', error=str(exc))
+                    db.session.commit()
+                    if final:
+                        return
+                    time.sleep(self.retry_delay * 2 ** (attempt - 1))
+                finally:
+                    db.session.remove()
+
+    # Status
+
+    def status(self, key):
+        """State of the job with this key, or None if it was never enqueued"""
+        if self.mode == 'durable':
+            job = BackgroundJob.query.filter_by(key=key).first()
+            return job.to_dict() if job else None
+        with self._lock:
+            status = self._statuses.get(key)
+            return dict(status) if status else None
+
+    def recover(self):
+        """Resubmit durable jobs left pending, or stuck running, by a previous process"""
+        if self.mode != 'durable':
+            return 0
+        stale = datetime.utcnow() - self.stale_after
+        BackgroundJob.query.filter(BackgroundJob.status == 'running', BackgroundJob.updated_at < stale)\
+            .update({BackgroundJob.status: 'pending'}, synchronize_session=False)
+        jobs = [(job.name, job.key, json.loads(job.payload or '{}'))
+                for job in BackgroundJob.query.filter_by(status='pending')]
+        db.session.commit()
+        for name, key, payload in jobs:
+            if name in self.handlers:
+                self._submit(name, key, payload)
+        return len(jobs)
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+
+def _now():
+    return datetime.utcnow().isoformat()
+
+
+@event.listens_for(Session, 'after_commit')
+def _submit_pending_jobs(session):
+    pending = session.info.pop(PENDING_JOBS, None)
+    for name, key, payload in pending or ():
+        job_queue._submit(name, key, payload)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _drop_pending_jobs(session, previous_transaction):
+    if previous_transaction.parent is not None:
+        return
+    pending = session.info.pop(PENDING_JOBS, None)
+    if pending and job_queue.mode != 'durable':
+        with job_queue._lock:
+            for _, key, _ in pending:
+                job_queue._statuses.pop(key, None)
+
+
+job_queue = JobQueue()
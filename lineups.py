@@ -0,0 +1,131 @@
+"""Squad selection for matches, as set-based statements.
+
+A lineup is the list of players a team selects for one match. Submitting
+any number of lineups (one team, or both teams of a whole matchday) takes
+three statements, whatever the size of the squads:
+
+- one SELECT validating the matches, the teams and the players;
+- one DELETE of the rows of players no longer selected;
+- one INSERT ... ON CONFLICT marking the selected players, which keeps the
+  existing rows (and anything already recorded on them) of players who
+  stay in the lineup.
+
+Players who are not in the team, or are not eligible for the match (see
+eligibility.py), are left out of the lineup and reported; an unknown match, a team that does not play it or a
+completed match rejects the whole submission.
+"""
+from dataclasses import dataclass, field
+
+from sqlalchemy import and_, or_, select
+
+from extensions import db
+from models import Match, Player, PlayerEligibility, PlayerMatchPerformance
+from bulk import upsert
+
+
+class LineupError(ValueError):
+    pass
+
+
+@dataclass
+class Lineup:
+    match_id: int
+    team_id: int
+    players: list = field(default_factory=list)
+    # Ids gardés à part : les joueurs sont expirés par le commit
+    player_ids: list = field(default_factory=list)
+    # id du joueur écarté -> raison
+    rejected: dict = field(default_factory=dict)
+
+    def to_dict(self):
+        return {
+            'match_id': self.match_id,
+            'team_id': self.team_id,
+            'selected': self.player_ids,
+            'rejected': [{'player_id': player_id, 'reason': reason} for player_id, reason in self.rejected.items()]
+        }
+
+
+def _validate(requested, tournament_id=None, round_number=None):
+    """Lineups of ``requested`` {(match_id, team_id): player ids}, one query"""
+    match_ids = {match_id for match_id, _ in requested}
+    player_ids = {player_id for ids in requested.values() for player_id in ids}
+    statement = select(Match.id, Match.home_team_id, Match.away_team_id, Match.status, Player,
+                       PlayerEligibility.eligible, PlayerEligibility.reason)\
+        .outerjoin(Player, and_(Player.id.in_(player_ids),
+                                or_(Player.team_id == Match.home_team_id, Player.team_id == Match.away_team_id)))\
+        .outerjoin(PlayerEligibility, and_(PlayerEligibility.match_id == Match.id,
+                                           PlayerEligibility.player_id == Player.id))\
+        .where(Match.id.in_(match_ids))
+    if tournament_id is not None:
+        statement = statement.where(Match.tournament_id == tournament_id)
+    if round_number is not None:
+        statement = statement.where(Match.round_number == round_number)
+
+    matches, candidates = {}, {}
+    for match_id, home_team_id, away_team_id, status, player, eligible, reason in db.session.execute(statement):
+        matches[match_id] = (home_team_id, away_team_id, status)
+        if player is not None:
+            if eligible is None:
+                # Éligibilité pas encore calculée pour ce match : colonnes du joueur
+                reason = 'unavailable' if player.is_available is False else 'suspended' if player.is_suspended else None
+            elif eligible:
+                reason = None
+            candidates[(match_id, player.id)] = (player, reason)
+
+    lineups = []
+    for (match_id, team_id), ids in requested.items():
+        if match_id not in matches:
+            raise LineupError(f'Match {match_id} not found' + (' in this matchday.' if round_number else '.'))
+        home_team_id, away_team_id, status = matches[match_id]
+        if team_id not in (home_team_id, away_team_id):
+            raise LineupError(f'Team {team_id} does not play match {match_id}.')
+        if status == 'completed':
+            raise LineupError(f'Match {match_id} is completed, its lineups can no longer change.')
+        lineup = Lineup(match_id, team_id)
+        for player_id in ids:
+            player, reason = candidates.get((match_id, player_id), (None, None))
+            if player is None or player.team_id != team_id:
+                lineup.rejected[player_id] = 'not in the team'
+            elif reason:
+                lineup.rejected[player_id] = reason
+            else:
+                lineup.players.append(player)
+                lineup.player_ids.append(player.id)
+        lineups.append(lineup)
+    return lineups
+
+
+def select_lineups(submitted, tournament_id=None, round_number=None, commit=True):
+    """Write the lineups of ``submitted``, an iterable of (match_id, team_id, player_ids).
+
+    ``tournament_id`` and ``round_number`` restrict the submission to one
+    matchday. All the lineups are written in the same transaction, committed
+    unless ``commit`` is False. Returns the list of Lineup.
+    """
+    requested = {}
+    for match_id, team_id, player_ids in submitted:
+        if (match_id, team_id) in requested:
+            raise LineupError(f'Two lineups submitted for team {team_id} in match {match_id}.')
+        # Ordre conservé, doublons retirés
+        requested[(match_id, team_id)] = list(dict.fromkeys(player_ids))
+    if not requested:
+        return []
+
+    lineups = _validate(requested, tournament_id, round_number)
+
+    PlayerMatchPerformance.query.filter(or_(*[
+        and_(PlayerMatchPerformance.match_id == lineup.match_id,
+             PlayerMatchPerformance.player_id.in_(select(Player.id).where(Player.team_id == lineup.team_id)),
+             PlayerMatchPerformance.player_id.not_in(lineup.player_ids))
+        for lineup in lineups
+    ])).delete(synchronize_session=False)
+
+    upsert(PlayerMatchPerformance, ['match_id', 'player_id'], [
+        {'match_id': lineup.match_id, 'player_id': player.id, 'is_selected': True}
+        for lineup in lineups for player in lineup.players
+    ], ['is_selected'])
+
+    if commit:
+        db.session.commit()
+    return lineups
@@ -0,0 +1,199 @@
+"""Server-push feed for live matches.
+
+Write endpoints publish once per change; every subscriber of the match gets
+the message through its own queue, so streaming clients cost no database
+query after they connect. Delivery goes through a backend: MemoryBackend
+fans out inside the current process, and a backend built on a shared bus
+(Redis pub/sub, Postgres LISTEN/NOTIFY...) can be plugged in through the
+LIVE_FEED_BACKEND config key to reach subscribers held by other workers.
+"""
+import json
+import logging
+import queue
+import threading
+from collections import OrderedDict, defaultdict
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend:
+    """Delivers messages to the subscribers of this process only"""
+
+    def __init__(self):
+        self._deliver = None
+
+    def start(self, deliver):
+        """Register the broker callback, called as deliver(channel, message)"""
+        self._deliver = deliver
+
+    def publish(self, channel, message):
+        if self._deliver is not None:
+            self._deliver(channel, message)
+
+
+class Subscription:
+    def __init__(self, channel, maxsize):
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = False
+
+
+class LiveFeedBroker:
+    """Fan-out of live match events to Server-Sent Events subscribers"""
+
+    def __init__(self, backend=None, queue_size=256, heartbeat=15):
+        self.backend = backend or MemoryBackend()
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self._subscriptions = defaultdict(set)
+        self._listeners = []
+        self._lock = threading.Lock()
+        self.backend.start(self._deliver)
+
+    def init_app(self, app):
+        backend = app.config.get('LIVE_FEED_BACKEND')
+        if backend is not None and backend is not self.backend:
+            self.backend = backend
+            self.backend.start(self._deliver)
+        self.queue_size = app.config.get('LIVE_FEED_QUEUE_SIZE', self.queue_size)
+        self.heartbeat = app.config.get('LIVE_FEED_HEARTBEAT', self.heartbeat)
+        app.extensions['live_feed'] = self
+
+    @staticmethod
+    def channel(match_id):
+        return f'match:{match_id}'
+
+    # Publishing
+
+    def publish(self, match_id, event, data, event_id=None):
+        message = json.dumps({'event': event, 'id': event_id, 'data': data}, default=str)
+        self.backend.publish(self.channel(match_id), message)
+
+    def publish_stats(self, match_id, stats):
+        """Publish the full stats of a match.
+
+        Not a diff: the last stats seen by this process say nothing of what
+        the subscribers of other workers, or a client that just connected,
+        already have.
+        """
+        self.publish(match_id, 'stats', stats)
+
+    def add_listener(self, listener):
+        """Call listener(match_id) for every message delivered to this process"""
+        self._listeners.append(listener)
+
+    def _deliver(self, channel, message):
+        match_id = int(channel.split(':', 1)[1])
+        for listener in self._listeners:
+            listener(match_id)
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        if not subscriptions:
+            return
+        # Encodé une seule fois pour tous les abonnés
+        payload = json.loads(message)
+        frame = format_sse(payload['event'], payload['data'], payload.get('id'))
+        for subscription in subscriptions:
+            try:
+                subscription.queue.put_nowait(frame)
+            except queue.Full:
+                # Client trop lent : on le déconnecte plutôt que de bloquer les écritures
+                logger.info('Dropping slow live feed subscriber on %s', channel)
+                subscription.dropped = True
+                self.unsubscribe(subscription)
+
+    # Subscribing
+
+    def subscribe(self, match_id):
+        subscription = Subscription(self.channel(match_id), self.queue_size)
+        with self._lock:
+            self._subscriptions[subscription.channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscriptions.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[subscription.channel]
+
+    def subscriber_count(self, match_id):
+        with self._lock:
+            return len(self._subscriptions.get(self.channel(match_id), ()))
+
+    def stream(self, match_id, initial=None, subscription=None):
+        """Generator of SSE frames for one client, ``initial`` is sent first.
+
+        Pass a ``subscription`` taken before ``initial`` was read, so that
+        nothing committed in between is lost (it may be sent twice instead).
+        It never touches the database, so it can outlive the request context.
+        """
+        subscription = subscription or self.subscribe(match_id)
+        try:
+            if initial is not None:
+                yield format_sse('snapshot', initial)
+            while not subscription.dropped:
+                try:
+                    yield subscription.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+        finally:
+            self.unsubscribe(subscription)
+
+
+class LiveSnapshotCache:
+    """Serialized live snapshots, one per match, for the version they were built from.
+
+    Versions are given by the caller and derived from the database (see
+    Match.live_version), so ETags are stable across workers and a snapshot
+    built by this process is served only while the match is unchanged.
+    Messages going through the broker evict the body of their match early.
+    """
+
+    def __init__(self, max_matches=512):
+        self.max_matches = max_matches
+        self._snapshots = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_matches = app.config.get('LIVE_SNAPSHOT_MAX_MATCHES', self.max_matches)
+        app.extensions['live_snapshots'] = self
+
+    def bump(self, match_id):
+        with self._lock:
+            self._snapshots.pop(match_id, None)
+
+    @staticmethod
+    def etag(match_id, version):
+        return f'{match_id}-{version}'
+
+    def get(self, match_id, version):
+        """Serialized snapshot if it was built for this version, else None"""
+        with self._lock:
+            cached = self._snapshots.get(match_id)
+            if cached is None or cached[0] != version:
+                return None
+            self._snapshots.move_to_end(match_id)
+            return cached[1]
+
+    def store(self, match_id, version, body):
+        with self._lock:
+            self._snapshots[match_id] = (version, body)
+            self._snapshots.move_to_end(match_id)
+            while len(self._snapshots) > self.max_matches:
+                self._snapshots.popitem(last=False)
+
+
+def format_sse(event, data, event_id=None):
+    frame = ''
+    if event_id is not None:
+        frame += f'id: {event_id}\n'
+    frame += f'event: {event}\n'
+    frame += f'data: {json.dumps(data, default=str)}\n\n'
+    return frame
+
+
+broker = LiveFeedBroker()
+snapshots = LiveSnapshotCache()
+broker.add_listener(snapshots.bump)
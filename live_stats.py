@@ -0,0 +1,208 @@
+"""Live counters of MatchStats, written atomically.
+
+Shots, corners and fouls move by deltas: ``col = col + n`` in a single
+INSERT ... ON CONFLICT DO UPDATE ... RETURNING, which creates the row of
+the match if needed and returns the stats as written. Nothing is read
+before the write, so two scorers updating the same match at once both
+count. Possession moves by a delta of the home share, clamped to 0-100,
+the away share being its complement.
+
+Cards per side are projections of the event log (see match_events.py).
+
+With LIVE_STATS_BUFFER, the deltas are not written by the request but
+collected per match in memory by StatsBuffer (write-behind): a background
+thread merges them and writes every match with pending deltas in one
+commit, every LIVE_STATS_FLUSH_INTERVAL_MS milliseconds or as soon as a
+match gathers LIVE_STATS_FLUSH_EVENTS updates, then publishes the merged
+stats to the live feed once per match. The pending deltas of a match are
+flushed before its final whistle, and all of them at shutdown. Possession
+is clamped once per flush, on the sum of its deltas.
+
+The buffer lives in one process: the flush of /end only reaches the deltas
+of the worker that handles it, those of other workers would land after the
+final whistle. It is therefore turned off, with a warning, when
+WEB_CONCURRENCY says there is more than one worker. Only deltas of a match
+in progress are buffered, and after shutdown they are written directly.
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import case, func
+
+from extensions import db
+from models import MatchStats
+from bulk import upsert_returning
+from live_feed import broker as live_feed
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ('home_shots', 'away_shots', 'home_shots_on_target', 'away_shots_on_target',
+            'home_corners', 'away_corners', 'home_fouls', 'away_fouls')
+
+
+def _clamp(value):
+    return case((value < 0, 0), (value > 100, 100), else_=value)
+
+
+def _check_counters(deltas):
+    unknown = set(deltas) - set(COUNTERS)
+    if unknown:
+        raise ValueError(f"Unknown stats counter(s): {', '.join(sorted(unknown))}")
+
+
+def add_stat_deltas(match_id, deltas, possession=0):
+    """Add ``deltas`` {counter: n} to the stats of a match and move the home possession by ``possession``.
+
+    Returns the stats as written, shaped like MatchStats.to_dict(). Does not
+    commit.
+    """
+    _check_counters(deltas)
+    table = MatchStats.__table__
+    now = datetime.utcnow()
+    home_possession = min(100, max(0, 50 + possession))
+    row = dict({'match_id': match_id, 'home_possession': home_possession,
+                'away_possession': 100 - home_possession, 'updated_at': now}, **deltas)
+    set_ = {counter: func.coalesce(table.c[counter], 0) + delta for counter, delta in deltas.items()}
+    if possession:
+        home = _clamp(func.coalesce(table.c.home_possession, 50) + possession)
+        set_.update(home_possession=home, away_possession=100 - home)
+    set_['updated_at'] = now
+    written = upsert_returning(MatchStats, ['match_id'], row, set_, list(table.c))
+    # Objet transitoire, jamais ajouté à la session : seulement pour la forme de to_dict()
+    return MatchStats(**written).to_dict()
+
+
+class _Pending:
+    """Deltas of one match not written yet"""
+
+    def __init__(self):
+        self.deltas = Counter()
+        self.possession = 0
+        self.events = 0
+
+    def merge(self, other):
+        self.deltas.update(other.deltas)
+        self.possession += other.possession
+        self.events += other.events
+
+
+class StatsBuffer:
+    """Write-behind buffer of the live stats deltas, flushed in batched commits"""
+
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.flush_interval = 0.5
+        self.flush_events = 20
+        self._pending = {}
+        self._lock = threading.Lock()
+        # Un seul flush à la fois : celui de fin de match attend le lot en cours
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('LIVE_STATS_BUFFER', self.enabled)
+        if self.enabled and int(os.environ.get('WEB_CONCURRENCY', 1)) > 1:
+            logger.warning('LIVE_STATS_BUFFER is per process and needs a single worker: stats written directly')
+            self.enabled = False
+        self.flush_interval = app.config.get('LIVE_STATS_FLUSH_INTERVAL_MS', self.flush_interval * 1000) / 1000
+        self.flush_events = app.config.get('LIVE_STATS_FLUSH_EVENTS', self.flush_events)
+        if self.enabled:
+            atexit.register(self.shutdown)
+        app.extensions['stats_buffer'] = self
+
+    def add(self, match_id, deltas, possession=0):
+        """Queue ``deltas`` for a match; they reach MatchStats and the live feed at the next flush"""
+        _check_counters(deltas)
+        with self._lock:
+            pending = self._pending.setdefault(match_id, _Pending())
+            pending.deltas.update(deltas)
+            pending.possession += possession
+            pending.events += 1
+            full = pending.events >= self.flush_events
+            if self._thread is None and not self._stopping:
+                # Démarré au premier usage : pas de thread dans les commandes CLI ni avant un fork
+                self._thread = threading.Thread(target=self._loop, name='live-stats', daemon=True)
+                self._thread.start()
+        if self._stopping:
+            # Plus de thread pour écrire : tout de suite
+            self.flush(match_id)
+        elif full:
+            self._wake.set()
+
+    def pending(self, match_id):
+        """Number of updates of a match waiting for the next flush"""
+        with self._lock:
+            pending = self._pending.get(match_id)
+            return pending.events if pending else 0
+
+    def flush(self, match_id=None):
+        """Write the pending deltas of one match, or of all, in one commit and publish them.
+
+        Runs in its own application context and session, so it can be called
+        from a request without touching its transaction. On failure the
+        deltas go back to the buffer for the next flush. Returns the stats
+        written, {match_id: stats dict}.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if match_id is None:
+                    batch, self._pending = self._pending, {}
+                else:
+                    batch = {match_id: self._pending.pop(match_id)} if match_id in self._pending else {}
+            if not batch:
+                return {}
+            with self.app.app_context():
+                try:
+                    written = {
+                        batch_match_id: add_stat_deltas(batch_match_id, dict(pending.deltas), pending.possession)
+                        for batch_match_id, pending in batch.items()
+                    }
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    self._restore(batch)
+                    raise
+                finally:
+                    db.session.remove()
+        for written_match_id, stats in written.items():
+            live_feed.publish_stats(written_match_id, stats)
+        return written
+
+    def _restore(self, batch):
+        with self._lock:
+            for match_id, pending in batch.items():
+                # Les deltas arrivés pendant le flush s'ajoutent à ceux du lot
+                pending.merge(self._pending.get(match_id, _Pending()))
+                self._pending[match_id] = pending
+
+    def _loop(self):
+        while not self._stopping:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self._stopping:
+                return
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Live stats flush failed, deltas kept for the next one')
+
+    def shutdown(self):
+        """Stop the flush thread and write everything still pending"""
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.app is not None:
+            self.flush()
+
+
+stats_buffer = StatsBuffer()
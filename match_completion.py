@@ -0,0 +1,165 @@
+"""Side effects of a match being completed, as set-based statements.
+
+The number of statements does not depend on the size of the squads:
+lifting suspensions, loading the performances, rolling them up into
+PlayerStats and suspending players each take one or two statements.
+"""
+from datetime import datetime
+
+from sqlalchemy import and_, func, insert, join, select, update, Select
+from sqlalchemy.orm import contains_eager, joinedload
+
+from extensions import db
+from models import Match, Player, PlayerStats, PlayerMatchPerformance
+from bulk import unique_key_exists, upsert_increment
+from jobs import job_queue
+from standings import record_result_change
+from eligibility import refresh_eligibility
+
+# Colonnes de PlayerMatchPerformance ajoutées aux statistiques cumulées
+ROLLED_UP = ('yellow_cards', 'red_cards', 'minutes_played', 'goals', 'assists')
+
+
+def _lift_suspensions(match):
+    """Players whose suspension was this match become available again"""
+    lifted = db.session.query(Player.id, Player.name)\
+        .filter(Player.suspended_until_match_id == match.id, Player.is_suspended.is_(True)).all()
+    if lifted:
+        Player.query.filter(Player.id.in_([player_id for player_id, _ in lifted]))\
+            .update({Player.is_suspended: False, Player.suspended_until_match_id: None},
+                    synchronize_session=False)
+    return [name for _, name in lifted]
+
+
+def _roll_up_stats(performances):
+    """Add the performances of the match to PlayerStats, one upsert"""
+    if not unique_key_exists(PlayerStats, ['player_id']):
+        # Sans l'index unique, pas d'ON CONFLICT : statistiques des joueurs recalculées
+        rebuild_player_stats({performance.player_id for performance in performances})
+        return
+    rows = []
+    for performance in performances:
+        row = {'player_id': performance.player_id, 'matches_played': 1}
+        for column in ROLLED_UP:
+            row[column] = getattr(performance, column) or 0
+        rows.append(row)
+    upsert_increment(PlayerStats, ['player_id'], rows, ('matches_played',) + ROLLED_UP)
+
+
+def rebuild_player_stats(player_ids):
+    """Recompute the rolled-up PlayerStats of ``player_ids`` from their performances in completed matches.
+
+    ``player_ids`` is a list of ids or a SELECT of ids. Only matches_played
+    and the ROLLED_UP columns are rewritten: the other columns (shots,
+    passes, saves...) are not derived from the performances and are kept.
+    Uses one UPDATE ... FROM and one INSERT ... SELECT, for the players
+    without a row yet, per chunk of ids; does not commit.
+    """
+    if isinstance(player_ids, Select):
+        chunks = [player_ids]
+    else:
+        player_ids = list(player_ids)
+        chunks = [player_ids[i:i + 500] for i in range(0, len(player_ids), 500)]
+    performance = PlayerMatchPerformance
+    table = PlayerStats.__table__
+    columns = ('matches_played',) + ROLLED_UP
+    completed = join(performance, Match, and_(Match.id == performance.match_id, Match.status == 'completed'))
+    for chunk in chunks:
+        # Jointure externe : un joueur sans match terminé repasse à zéro
+        aggregate = select(
+            Player.id.label('player_id'),
+            func.count(performance.id).label('matches_played'),
+            *[func.coalesce(func.sum(getattr(performance, column)), 0).label(column) for column in ROLLED_UP]
+        ).select_from(Player)\
+         .outerjoin(completed, performance.player_id == Player.id)\
+         .where(Player.id.in_(chunk))\
+         .group_by(Player.id)\
+         .subquery()
+        db.session.execute(
+            update(table).where(table.c.player_id == aggregate.c.player_id)
+                         .values(updated_at=datetime.utcnow(), **{column: aggregate.c[column] for column in columns})
+        )
+        missing = select(aggregate.c.player_id, *[aggregate.c[column] for column in columns])\
+            .where(aggregate.c.matches_played > 0, aggregate.c.player_id.not_in(select(table.c.player_id)))
+        db.session.execute(insert(PlayerStats).from_select(['player_id', *columns], missing))
+
+
+def _next_fixture(match, team_id):
+    return Match.query.options(joinedload(Match.home_team), joinedload(Match.away_team))\
+        .filter(
+            db.or_(Match.home_team_id == team_id, Match.away_team_id == team_id),
+            Match.tournament_id == match.tournament_id,
+            Match.match_date > match.match_date,
+            Match.status == 'scheduled'
+        ).order_by(Match.match_date.asc()).first()
+
+
+def process_completed_match(match):
+    """Update suspensions and cumulative stats after ``match`` was completed.
+
+    Does not commit. Returns the notices for the users as (message,
+    category) tuples: lifted suspensions first, then new suspensions.
+    """
+    notices = [(f'{name} is no longer suspended.', 'info') for name in _lift_suspensions(match)]
+
+    # Performances et joueurs chargés ensemble, après la levée des suspensions
+    performances = PlayerMatchPerformance.query\
+        .join(PlayerMatchPerformance.player)\
+        .options(contains_eager(PlayerMatchPerformance.player))\
+        .filter(PlayerMatchPerformance.match_id == match.id)\
+        .populate_existing()\
+        .all()
+    if not performances:
+        return notices
+
+    _roll_up_stats(performances)
+
+    totals = dict(
+        (player_id, (yellow_cards, red_cards))
+        for player_id, yellow_cards, red_cards in db.session.query(
+            PlayerStats.player_id,
+            func.coalesce(PlayerStats.yellow_cards, 0),
+            func.coalesce(PlayerStats.red_cards, 0)
+        ).filter(PlayerStats.player_id.in_([p.player_id for p in performances]))
+    )
+
+    # Check for new suspensions (2 yellow cards OR 1 red card cumulative)
+    # Les cartons jaunes cumulés ne sont pas remis à zéro après une suspension (selon le règlement)
+    suspended_by_team = {}
+    for performance in performances:
+        player = performance.player
+        yellow_cards, red_cards = totals.get(player.id, (0, 0))
+        if (yellow_cards >= 2 or red_cards >= 1) and not player.is_suspended:
+            suspended_by_team.setdefault(player.team_id, []).append(player)
+
+    for team_id, players in suspended_by_team.items():
+        next_match = _next_fixture(match, team_id)
+        Player.query.filter(Player.id.in_([player.id for player in players]))\
+            .update({Player.is_suspended: True,
+                     Player.suspended_until_match_id: next_match.id if next_match else None},
+                    synchronize_session=False)
+        for player in players:
+            if next_match:
+                notices.append((f'{player.name} is suspended for the next match '
+                                f'({next_match.home_team.name} vs {next_match.away_team.name}).', 'warning'))
+            else:
+                # Player remains suspended until the end of the tournament/season
+                notices.append((f'{player.name} is suspended. No further matches scheduled '
+                                f'for their team in this tournament.', 'warning'))
+    return notices
+
+
+def completion_job_key(match_id):
+    return f'match_completed:{match_id}'
+
+
+@job_queue.task('match_completed')
+def match_completed(match_id, previous_status):
+    """Derived data of a completed match: standings, stats and suspensions"""
+    match = db.session.get(Match, match_id)
+    if match is None or match.status != 'completed':
+        return {'notices': [], 'skipped': True}
+    record_result_change(match, previous_status, match.home_score, match.away_score)
+    notices = process_completed_match(match)
+    refresh_eligibility(team_ids=[match.home_team_id, match.away_team_id])
+    return {'notices': [{'message': message, 'category': category} for message, category in notices]}
@@ -0,0 +1,284 @@
+"""Match events: the append-only log the live data is derived from.
+
+Every live write appends one typed MatchUpdate:
+
+- kickoff, final_whistle: start and end of the match;
+- goal: scored by ``team_id``; ``player_id`` the scorer and
+  ``related_player_id`` the assist, both optional;
+- card: ``detail`` yellow or red, shown to ``player_id``;
+- substitution: ``player_id`` comes on for ``related_player_id``;
+- result: score entered after the match (``home_score``, ``away_score``),
+  which also completes it.
+
+Events are never changed nor deleted. The projections follow the log:
+
+- score: score and status of the Match;
+- match_stats: cards per side in MatchStats;
+- performances: goals, assists, cards and is_playing of
+  PlayerMatchPerformance (a player with a goal, an assist or a card is on
+  the pitch unless a substitution took them off);
+- player_stats: PlayerStats, rolled up from the performances of the
+  completed matches (see match_completion.py).
+
+record_event() inserts the event and applies it to the projections with
+atomic ``col = col + n`` UPDATE and upsert statements, in the same
+transaction. They return the values written (see bulk.update_returning),
+so concurrent writers do not lose updates and nothing is read back.
+replay() rebuilds projections from the log, by pages of matches, for
+instance after a projection was fixed: ``flask replay-events``. Matches
+without any event (seeded or imported results) keep their columns.
+
+Shots, possession, corners and fouls of MatchStats are sampled figures,
+not events: they are written by live_stats.py.
+"""
+from collections import Counter
+from dataclasses import dataclass, field
+
+from sqlalchemy import event, func, select, update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from extensions import db
+from models import Match, MatchStats, MatchUpdate, PlayerMatchPerformance
+from bulk import upsert, upsert_increment, update_returning
+from standings import rebuild_standings
+from match_completion import rebuild_player_stats
+
+EVENT_TYPES = ('kickoff', 'goal', 'card', 'substitution', 'final_whistle', 'result')
+CARD_TYPES = ('yellow', 'red')
+PROJECTIONS = ('score', 'match_stats', 'performances', 'player_stats')
+
+# Compteurs de PlayerMatchPerformance et de MatchStats tirés du journal
+PERFORMANCE_COUNTERS = ('goals', 'assists', 'yellow_cards', 'red_cards')
+CARD_COUNTERS = ('home_yellow_cards', 'away_yellow_cards', 'home_red_cards', 'away_red_cards')
+STATUS_AFTER = {'kickoff': 'in_progress', 'final_whistle': 'completed', 'result': 'completed'}
+
+REPLAY_MATCHES_PER_WRITE = 500
+# Lignes par INSERT multi-VALUES (limite de paramètres de SQLite)
+ROWS_PER_STATEMENT = 1000
+
+
+class EventError(ValueError):
+    pass
+
+
+@event.listens_for(MatchUpdate, 'before_update')
+@event.listens_for(MatchUpdate, 'before_delete')
+def _append_only(mapper, connection, target):
+    raise EventError(f'Match events are append-only, event {target.id} cannot change.')
+
+
+def _side(match, team_id):
+    if team_id == match.home_team_id:
+        return 'home'
+    if team_id == match.away_team_id:
+        return 'away'
+    raise EventError(f'Team {team_id} does not play match {match.id}.')
+
+
+def check_event(update_type, team_id=None, player_id=None, related_player_id=None, detail=None,
+                home_score=None, away_score=None):
+    """Raise EventError if the fields do not make an event of ``update_type``"""
+    if update_type not in EVENT_TYPES:
+        raise EventError(f'Unknown event type {update_type!r}.')
+    if update_type == 'goal' and team_id is None:
+        raise EventError('A goal needs the team that scored.')
+    if update_type == 'card' and (detail not in CARD_TYPES or player_id is None or team_id is None):
+        raise EventError('A card needs a player, their team and a colour (yellow or red).')
+    if update_type == 'substitution' and (player_id is None or related_player_id is None or team_id is None):
+        raise EventError('A substitution needs the players coming on and off, and their team.')
+    if update_type == 'result' and not (isinstance(home_score, int) and isinstance(away_score, int)
+                                        and home_score >= 0 and away_score >= 0):
+        raise EventError('A result needs both scores.')
+
+
+def record_event(match, update_type, minute=None, team_id=None, player_id=None, related_player_id=None,
+                 detail=None, home_score=None, away_score=None, description=None):
+    """Append an event to the log of ``match`` and apply it. Does not commit.
+
+    The values written by the projections (score and status of the match,
+    cards of the player) are left in ``update.projection``, so callers can
+    answer without reading them back.
+    """
+    check_event(update_type, team_id, player_id, related_player_id, detail, home_score, away_score)
+    if team_id is not None:
+        _side(match, team_id)
+
+    update = MatchUpdate(match_id=match.id, minute=minute, update_type=update_type, team_id=team_id,
+                         player_id=player_id, related_player_id=related_player_id, detail=detail,
+                         home_score=home_score, away_score=away_score, description=description)
+    db.session.add(update)
+    db.session.flush()
+    update.projection = apply_event(match, update)
+    return update
+
+
+def _add_performance(match_id, player_id, counter):
+    """+1 on a counter of the performance, created if the player has none yet; returns its cards"""
+    return upsert_increment(PlayerMatchPerformance, ['match_id', 'player_id'],
+                            [{'match_id': match_id, 'player_id': player_id, counter: 1, 'is_playing': True}],
+                            [counter],
+                            returning=[PlayerMatchPerformance.yellow_cards, PlayerMatchPerformance.red_cards])
+
+
+def apply_event(match, update):
+    """Apply one event to the projections, incrementally; returns the values written"""
+    kind = update.update_type
+    projection = {}
+    values = {}
+    if kind in STATUS_AFTER:
+        values[Match.status] = STATUS_AFTER[kind]
+
+    if kind == 'goal':
+        score = Match.home_score if _side(match, update.team_id) == 'home' else Match.away_score
+        values[score] = func.coalesce(score, 0) + 1
+        if update.player_id:
+            _add_performance(match.id, update.player_id, 'goals')
+        if update.related_player_id:
+            _add_performance(match.id, update.related_player_id, 'assists')
+    elif kind == 'result':
+        values[Match.home_score] = update.home_score
+        values[Match.away_score] = update.away_score
+    elif kind == 'card':
+        counter = f'{update.detail}_cards'
+        projection['performance'] = dict(_add_performance(match.id, update.player_id, counter))
+        side_counter = f'{_side(match, update.team_id)}_{counter}'
+        upsert_increment(MatchStats, ['match_id'], [{'match_id': match.id, side_counter: 1}], [side_counter])
+    elif kind == 'substitution':
+        upsert(PlayerMatchPerformance, ['match_id', 'player_id'], [
+            {'match_id': match.id, 'player_id': update.player_id, 'is_playing': True},
+            {'match_id': match.id, 'player_id': update.related_player_id, 'is_playing': False}
+        ], ['is_playing'])
+
+    if values:
+        written = update_returning(Match, [Match.id == match.id], values,
+                                   [Match.home_score, Match.away_score, Match.status])
+        # L'objet match en session reçoit les valeurs écrites, sans relecture
+        for key, value in written.items():
+            set_committed_value(match, key, value)
+        projection.update(written)
+    return projection
+
+
+# Rejeu
+
+@dataclass
+class _MatchState:
+    """Projections of one match, folded from its events"""
+    match_id: int
+    tournament_id: int
+    home_team_id: int
+    status: str
+    home_score: int = 0
+    away_score: int = 0
+    cards: Counter = field(default_factory=Counter)
+    performances: dict = field(default_factory=dict)
+    playing: dict = field(default_factory=dict)
+
+    def _performance(self, player_id):
+        return self.performances.setdefault(player_id, Counter())
+
+    def apply(self, kind, team_id, player_id, related_player_id, detail, home_score, away_score):
+        self.status = STATUS_AFTER.get(kind, self.status)
+        side = 'home' if team_id == self.home_team_id else 'away'
+        if kind == 'goal':
+            setattr(self, f'{side}_score', getattr(self, f'{side}_score') + 1)
+            if player_id:
+                self._performance(player_id)['goals'] += 1
+                self.playing.setdefault(player_id, True)
+            if related_player_id:
+                self._performance(related_player_id)['assists'] += 1
+                self.playing.setdefault(related_player_id, True)
+        elif kind == 'result':
+            self.home_score, self.away_score = home_score, away_score
+        elif kind == 'card' and detail in CARD_TYPES and player_id:
+            self._performance(player_id)[f'{detail}_cards'] += 1
+            self.playing.setdefault(player_id, True)
+            self.cards[f'{side}_{detail}_cards'] += 1
+        elif kind == 'substitution':
+            self.playing[player_id] = True
+            self.playing[related_player_id] = False
+
+
+def _chunks(rows):
+    return [rows[i:i + ROWS_PER_STATEMENT] for i in range(0, len(rows), ROWS_PER_STATEMENT)]
+
+
+def _write(states, projections):
+    match_ids = [state.match_id for state in states]
+    if 'score' in projections:
+        db.session.execute(update(Match), [
+            {'id': state.match_id, 'home_score': state.home_score, 'away_score': state.away_score,
+             'status': state.status}
+            for state in states
+        ])
+    if 'match_stats' in projections:
+        for rows in _chunks([dict({'match_id': state.match_id}, **{c: state.cards[c] for c in CARD_COUNTERS})
+                             for state in states]):
+            upsert(MatchStats, ['match_id'], rows, CARD_COUNTERS)
+    if 'performances' in projections:
+        PlayerMatchPerformance.query.filter(PlayerMatchPerformance.match_id.in_(match_ids))\
+            .update(dict({counter: 0 for counter in PERFORMANCE_COUNTERS}, is_playing=False),
+                    synchronize_session=False)
+        counters = [dict({'match_id': state.match_id, 'player_id': player_id},
+                         **{c: performance[c] for c in PERFORMANCE_COUNTERS})
+                    for state in states for player_id, performance in state.performances.items()]
+        for rows in _chunks(counters):
+            upsert(PlayerMatchPerformance, ['match_id', 'player_id'], rows, PERFORMANCE_COUNTERS)
+        playing = [{'match_id': state.match_id, 'player_id': player_id, 'is_playing': is_playing}
+                   for state in states for player_id, is_playing in state.playing.items()]
+        for rows in _chunks(playing):
+            upsert(PlayerMatchPerformance, ['match_id', 'player_id'], rows, ['is_playing'])
+
+
+def replay(projections=PROJECTIONS, tournament_id=None, match_ids=None):
+    """Rebuild ``projections`` from the log of the matches in scope.
+
+    Matches are taken REPLAY_MATCHES_PER_WRITE at a time in id order: the
+    events of a page are read in full, folded match by match and written
+    before the next page is read, so no result is left open on the session
+    while it writes. Standings are recomputed when the score is. Does not
+    commit. Returns the number of matches and events.
+    """
+    unknown = set(projections) - set(PROJECTIONS)
+    if unknown:
+        raise EventError(f"Unknown projection(s): {', '.join(sorted(unknown))}.")
+    scope = select(MatchUpdate.match_id).join(Match, Match.id == MatchUpdate.match_id)
+    if tournament_id is not None:
+        scope = scope.where(Match.tournament_id == tournament_id)
+    if match_ids is not None:
+        scope = scope.where(MatchUpdate.match_id.in_(list(match_ids)))
+
+    statement = scope.with_only_columns(
+        MatchUpdate.match_id, Match.tournament_id, Match.home_team_id, Match.status, MatchUpdate.update_type,
+        MatchUpdate.team_id, MatchUpdate.player_id, MatchUpdate.related_player_id, MatchUpdate.detail,
+        MatchUpdate.home_score, MatchUpdate.away_score
+    ).order_by(MatchUpdate.match_id, MatchUpdate.id)
+
+    events, matches, tournaments, last_match_id = 0, 0, set(), 0
+    while True:
+        # Page suivante de matchs, par clé
+        page = db.session.execute(scope.where(MatchUpdate.match_id > last_match_id).distinct()
+                                  .order_by(MatchUpdate.match_id).limit(REPLAY_MATCHES_PER_WRITE)).scalars().all()
+        if not page:
+            break
+        states, state = [], None
+        for match_id, match_tournament_id, home_team_id, status, *payload in \
+                db.session.execute(statement.where(MatchUpdate.match_id.in_(page))).all():
+            if state is None or state.match_id != match_id:
+                # Le statut enregistré est gardé si aucun événement ne le change
+                state = _MatchState(match_id, match_tournament_id, home_team_id, status)
+                states.append(state)
+                tournaments.add(match_tournament_id)
+            state.apply(*payload)
+            events += 1
+        _write(states, projections)
+        matches += len(states)
+        last_match_id = page[-1]
+
+    if 'score' in projections:
+        for replayed_tournament_id in sorted(tournaments):
+            rebuild_standings(replayed_tournament_id)
+    if 'player_stats' in projections:
+        rebuild_player_stats(select(PlayerMatchPerformance.player_id).distinct()
+                             .where(PlayerMatchPerformance.match_id.in_(scope.distinct())))
+    return {'matches': matches, 'events': events}
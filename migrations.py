@@ -0,0 +1,187 @@
+"""Schema upgrades for databases created before the indexes were declared.
+
+db.create_all() only creates missing tables, it never adds a column or an
+index to a table that already exists. upgrade_indexes() adds the declared
+columns the database does not have yet (nullable, without constraint),
+widens the VARCHAR columns declared longer than they are in the database,
+then creates the missing indexes. explain_hot_queries() checks
+that the hot queries of the application are served by those indexes.
+"""
+from datetime import datetime
+
+from sqlalchemy import func, inspect, select, text, or_, tuple_
+
+from extensions import db
+from models import Match, Player, PlayerStats, PlayerMatchPerformance, MatchUpdate, MatchStats, Team, TeamStanding, \
+    PlayerEligibility
+
+
+def _declared_indexes():
+    for table in db.metadata.sorted_tables:
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            yield table, index
+
+
+def _duplicate_groups(table, index):
+    columns = list(index.columns)
+    groups = select(*columns).group_by(*columns).having(func.count() > 1).subquery()
+    return db.session.execute(select(func.count()).select_from(groups)).scalar()
+
+
+def _remove_duplicates(table, index):
+    """Keep the oldest row (lowest id) of every duplicated key"""
+    columns = list(index.columns)
+    keep = select(func.min(table.c.id)).group_by(*columns)
+    result = db.session.execute(table.delete().where(table.c.id.not_in(keep)))
+    return result.rowcount
+
+
+def upgrade_columns():
+    """Add the declared nullable columns missing from existing tables; returns their names"""
+    added = []
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    connection = db.session.connection()
+    preparer = connection.dialect.identifier_preparer
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            db.session.execute(text(f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN '
+                                    f'{preparer.format_column(column)} {column.type.compile(dialect=connection.dialect)}'))
+            added.append(f'{table.name}.{column.name}')
+
+    if 'match_update.detail' in added:
+        # Cartons enregistrés avant le journal typé : couleur lue dans la description
+        for colour, marker in (('yellow', '🟨'), ('red', '🟥')):
+            db.session.execute(MatchUpdate.__table__.update()
+                               .where(MatchUpdate.update_type == 'card', MatchUpdate.detail.is_(None),
+                                      MatchUpdate.description.like(f'{marker}%'))
+                               .values(detail=colour))
+    db.session.commit()
+    return added
+
+
+def widen_columns():
+    """Widen the VARCHAR columns declared longer than in the database; returns their names.
+
+    E.g. password_hash, widened for scrypt hashes. Postgres only: SQLite
+    does not enforce lengths.
+    """
+    widened = []
+    connection = db.session.connection()
+    if connection.dialect.name != 'postgresql':
+        return widened
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    preparer = connection.dialect.identifier_preparer
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column['name']: column['type'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            length = getattr(column.type, 'length', None)
+            current = getattr(existing.get(column.name), 'length', None)
+            if length and current and current < length:
+                db.session.execute(text(f'ALTER TABLE {preparer.format_table(table)} ALTER COLUMN '
+                                        f'{preparer.format_column(column)} TYPE '
+                                        f'{column.type.compile(dialect=connection.dialect)}'))
+                widened.append(f'{table.name}.{column.name}')
+    db.session.commit()
+    return widened
+
+
+def upgrade_indexes(dedupe=False):
+    """Add the missing columns, then create the declared indexes missing from the database.
+
+    A unique index cannot be created over duplicated keys: those are
+    skipped and reported, unless ``dedupe`` is set, in which case the
+    duplicates are deleted first, keeping the oldest row.
+    """
+    report = {'columns': upgrade_columns(), 'widened': widen_columns(), 'created': [], 'existing': [], 'skipped': {}, 'deduplicated': {}}
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+
+    for table, index in _declared_indexes():
+        if table.name not in existing_tables:
+            continue
+        existing = {ix['name'] for ix in inspector.get_indexes(table.name)}
+        if index.name in existing:
+            report['existing'].append(index.name)
+            continue
+
+        if index.unique:
+            duplicates = _duplicate_groups(table, index)
+            if duplicates and not dedupe:
+                report['skipped'][index.name] = duplicates
+                continue
+            if duplicates:
+                report['deduplicated'][index.name] = _remove_duplicates(table, index)
+
+        index.create(bind=db.session.connection())
+        db.session.commit()
+        report['created'].append(index.name)
+    return report
+
+
+def _hot_queries():
+    """The statements behind the standings, suspension and live pages"""
+    tournament_id, team_id, match_id = 1, 1, 1
+    return {
+        'standings lookup': select(TeamStanding).where(TeamStanding.tournament_id == tournament_id),
+        'completed matches of a tournament': select(Match).where(
+            Match.tournament_id == tournament_id, Match.status == 'completed'),
+        'teams of a tournament': select(Team).where(Team.tournament_id == tournament_id),
+        'squad of a team': select(Player).where(Player.team_id == team_id).order_by(Player.jersey_number),
+        'next fixture of a team': select(Match).where(
+            or_(Match.home_team_id == team_id, Match.away_team_id == team_id),
+            Match.status == 'scheduled',
+            Match.match_date > datetime(2024, 1, 1)
+        ).order_by(Match.match_date).limit(1),
+        'suspensions ending with a match': select(Player).where(Player.suspended_until_match_id == match_id),
+        'eligible players of a side': select(PlayerEligibility).where(
+            PlayerEligibility.match_id == match_id, PlayerEligibility.team_id == team_id,
+            PlayerEligibility.eligible.is_(True)),
+        'performances of a match': select(PlayerMatchPerformance).where(PlayerMatchPerformance.match_id == match_id),
+        'stats of a player': select(PlayerStats).where(PlayerStats.player_id == 1),
+        'stats of a match': select(MatchStats).where(MatchStats.match_id == match_id),
+        'page of the match list': select(Match).where(
+            tuple_(Match.match_date, Match.id) < tuple_(datetime(2024, 1, 1), 1)
+        ).order_by(Match.match_date.desc(), Match.id.desc()).limit(51),
+        'page of the team list': select(Team).where(tuple_(Team.name, Team.id) > tuple_('A', 1))
+                                              .order_by(Team.name, Team.id).limit(51),
+        'latest live updates': select(MatchUpdate).where(MatchUpdate.match_id == match_id)
+                                                  .order_by(MatchUpdate.timestamp.desc()).limit(10),
+        'live updates since cursor': select(MatchUpdate).where(
+            MatchUpdate.match_id == match_id, MatchUpdate.id > 10).order_by(MatchUpdate.id),
+    }
+
+
+def _plan(statement):
+    dialect = db.engine.dialect
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    if dialect.name == 'sqlite':
+        rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')).all()
+        lines = [row[-1] for row in rows]
+        full_scans = [line for line in lines if line.startswith('SCAN') and 'INDEX' not in line]
+        return lines, not full_scans
+
+    # Postgres préfère un seq scan sur de petites tables : on le lui interdit pour voir si un index existe
+    db.session.execute(text('SET LOCAL enable_seqscan = off'))
+    lines = [row[0] for row in db.session.execute(text(f'EXPLAIN {sql}')).all()]
+    return lines, not any('Seq Scan' in line for line in lines)
+
+
+def explain_hot_queries():
+    """EXPLAIN every hot query; returns (name, plan lines, uses_index) tuples"""
+    results = []
+    try:
+        for name, statement in _hot_queries().items():
+            lines, uses_index = _plan(statement)
+            results.append((name, lines, uses_index))
+    finally:
+        db.session.rollback()
+    return results
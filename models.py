@@ -1,8 +1,11 @@
 from extensions import db
-from datetime import datetime
+from datetime import datetime, timedelta
+import hashlib
+import json
 from sqlalchemy import func, Table, Column, Integer, ForeignKey
-from werkzeug.security import generate_password_hash, check_password_hash
+from passwords import hasher
 from flask_login import UserMixin
+from sqlalchemy.orm import joinedload, contains_eager
 
 # Association table for many-to-many relationship between Match and Referee
 match_referees = Table('match_referees',
@@ -16,7 +19,7 @@ class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128))
+    password_hash = db.Column(db.String(256))  # un hash scrypt fait 162 caractères
     role = db.Column(db.String(50), nullable=False, default='user')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     first_name = db.Column(db.String(80), nullable=True)
@@ -29,10 +32,13 @@ class User(UserMixin, db.Model):
     }
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hasher.hash(password)
         
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return hasher.check(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        return hasher.needs_rehash(self.password_hash)
     
     def __repr__(self):
         return f'<User {self.username}>'
@@ -59,6 +65,13 @@ class Team(db.Model):
     
     # Add a foreign key for the coach
     coach_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True) # Coach can be optional initially
+
+    __table_args__ = (
+        db.Index('ix_team_tournament_id', 'tournament_id'),
+        db.Index('ix_team_coach_id', 'coach_id'),
+        # Liste paginée par nom
+        db.Index('ix_team_name_id', 'name', 'id'),
+    )
     
     # Relationships
     players = db.relationship('Player', backref='team', lazy=True, cascade='all, delete-orphan')
@@ -73,86 +86,27 @@ class Team(db.Model):
     
     def get_stats(self):
         """Calculate team statistics"""
-        stats = {
-            'played': 0,
-            'won': 0,
-            'drawn': 0,
-            'lost': 0,
-            'goals_for': 0,
-            'goals_against': 0,
-            'points': 0
-        }
-        
-        # Get all matches for this team
-        matches = Match.query.filter(
-            db.or_(Match.home_team_id == self.id, Match.away_team_id == self.id),
-            Match.status == 'completed'
-        ).all()
-        
-        for match in matches:
-            if match.home_team_id == self.id:
-                goals_for = match.home_score
-                goals_against = match.away_score
-            else:
-                goals_for = match.away_score
-                goals_against = match.home_score
-            
-            stats['played'] += 1
-            stats['goals_for'] += goals_for
-            stats['goals_against'] += goals_against
-            
-            if goals_for > goals_against:
-                stats['won'] += 1
-                stats['points'] += 3
-            elif goals_for == goals_against:
-                stats['drawn'] += 1
-                stats['points'] += 1
-            else:
-                stats['lost'] += 1
-        
-        stats['goal_difference'] = stats['goals_for'] - stats['goals_against']
-        return stats
+        from standings import StandingRow, compute_standings
+        rows = compute_standings(self.tournament_id, team_id=self.id)
+        return (rows[0] if rows else StandingRow(team=self)).stats
 
-    def get_available_players(self):
+    def get_available_players(self, match_id=None):
         """Retourne la liste des joueurs disponibles pour le prochain match"""
+        if match_id is not None:
+            # Éligibilité précalculée pour ce match (voir eligibility.py)
+            return Player.query.join(PlayerEligibility, PlayerEligibility.player_id == Player.id)\
+                .filter(PlayerEligibility.match_id == match_id, PlayerEligibility.team_id == self.id,
+                        PlayerEligibility.eligible.is_(True))\
+                .order_by(Player.jersey_number, Player.id).all()
         # Filter by team_id, is_available, AND is_suspended=False
         return Player.query.filter_by(team_id=self.id, is_available=True, is_suspended=False).all()
     
     def select_players_for_match(self, match_id, player_ids):
         """Sélectionne les joueurs pour un match spécifique"""
-        # Vérifier que tous les joueurs appartiennent à l'équipe
-        players = Player.query.filter(
-            Player.id.in_(player_ids),
-            Player.team_id == self.id
-        ).all()
-        
-        # Supprimer les sélections précédentes pour ce match et cette équipe
-        PlayerMatchPerformance.query.filter(
-            PlayerMatchPerformance.match_id == match_id,
-            PlayerMatchPerformance.player_id.in_([p.id for p in self.players])
-        ).delete(synchronize_session=False)
-
-        # Créer les performances des joueurs pour le match
-        for player in players:
-            # S'assurer qu'une performance n'existe pas déjà pour ce joueur et ce match
-            performance = PlayerMatchPerformance.query.filter_by(
-                player_id=player.id,
-                match_id=match_id
-            ).first()
-            
-            if not performance:
-                performance = PlayerMatchPerformance(
-                    player_id=player.id,
-                    match_id=match_id,
-                    is_selected=True # Marquer comme sélectionné
-                )
-                db.session.add(performance)
-            else:
-                # Mettre à jour si déjà existant
-                performance.is_selected = True
-        
-        db.session.commit()
-        return players
+        # Une requête de validation, un DELETE des joueurs retirés, un upsert (voir lineups.py)
+        from lineups import select_lineups
+        lineup, = select_lineups([(match_id, self.id, player_ids)])
+        return lineup.players
 
 class Coach(User):
     __tablename__ = 'coach'
@@ -201,6 +155,58 @@ class Tournament(db.Model):
     def __repr__(self):
         return f'<Tournament {self.name}>'
 
+class TeamStanding(db.Model):
+    """Ligne de classement maintenue à chaque fin de match (voir standings.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    tournament_id = db.Column(db.Integer, db.ForeignKey('tournament.id'), nullable=False)
+    team_id = db.Column(db.Integer, db.ForeignKey('team.id'), nullable=False)
+    played = db.Column(db.Integer, default=0, nullable=False)
+    won = db.Column(db.Integer, default=0, nullable=False)
+    drawn = db.Column(db.Integer, default=0, nullable=False)
+    lost = db.Column(db.Integer, default=0, nullable=False)
+    goals_for = db.Column(db.Integer, default=0, nullable=False)
+    goals_against = db.Column(db.Integer, default=0, nullable=False)
+    points = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_team_standing_tournament_team', 'tournament_id', 'team_id', unique=True),
+    )
+
+    # Relationship
+    team = db.relationship('Team', backref=db.backref('standing_rows', cascade='all, delete-orphan'))
+
+    def __repr__(self):
+        return f'<TeamStanding {self.team_id} ({self.points} pts)>'
+
+class PlayerEligibility(db.Model):
+    """Éligibilité d'un joueur pour un match pas encore terminé (voir eligibility.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    match_id = db.Column(db.Integer, db.ForeignKey('match.id'), nullable=False)
+    player_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=False)
+    team_id = db.Column(db.Integer, db.ForeignKey('team.id'), nullable=False)
+    eligible = db.Column(db.Boolean, nullable=False)
+    reason = db.Column(db.String(20))  # unavailable, suspended
+
+    __table_args__ = (
+        db.Index('ix_player_eligibility_match_player', 'match_id', 'player_id', unique=True),
+        # Joueurs éligibles d'un côté du match
+        db.Index('ix_player_eligibility_match_team', 'match_id', 'team_id', 'eligible'),
+        db.Index('ix_player_eligibility_player_id', 'player_id'),
+    )
+
+    player = db.relationship('Player')
+
+    @classmethod
+    def for_match(cls, match_id):
+        """Rows of both sides of a match, players loaded, by team then jersey number"""
+        return cls.query.join(cls.player).options(contains_eager(cls.player))\
+            .filter(cls.match_id == match_id)\
+            .order_by(cls.team_id, Player.jersey_number, Player.id).all()
+
+    def __repr__(self):
+        return f'<PlayerEligibility {self.player_id} match {self.match_id}: {self.eligible}>'
+
 class Player(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), nullable=False)
@@ -214,6 +220,11 @@ class Player(db.Model):
     is_suspended = db.Column(db.Boolean, default=False) # Si le joueur est suspendu
     suspended_until_match_id = db.Column(db.Integer, db.ForeignKey('match.id'), nullable=True) # Match ID for which the player is suspended
 
+    __table_args__ = (
+        db.Index('ix_player_team_jersey', 'team_id', 'jersey_number'),
+        db.Index('ix_player_suspended_until_match_id', 'suspended_until_match_id'),
+    )
+
     def __repr__(self):
         return f'<Player {self.name}>'
     
@@ -228,7 +239,9 @@ class Player(db.Model):
 
     def toggle_availability(self):
         """Change la disponibilité du joueur"""
+        from eligibility import refresh_eligibility
         self.is_available = not self.is_available
+        refresh_eligibility(team_ids=[self.team_id])
         db.session.commit()
         return self.is_available
 
@@ -245,9 +258,51 @@ class Match(db.Model):
     round_number = db.Column(db.Integer, default=1)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Classements et listes par tournoi
+        db.Index('ix_match_tournament_status', 'tournament_id', 'status'),
+        # Prochain match d'une équipe (suspensions)
+        db.Index('ix_match_home_team_status_date', 'home_team_id', 'status', 'match_date'),
+        db.Index('ix_match_away_team_status_date', 'away_team_id', 'status', 'match_date'),
+        # Derniers résultats et calendrier
+        db.Index('ix_match_status_date', 'status', 'match_date'),
+        db.Index('ix_match_date_id', 'match_date', 'id'),
+    )
+
     def __repr__(self):
         return f'<Match {self.home_team.name} vs {self.away_team.name} on {self.match_date}>'
     
+    @classmethod
+    def live_version(cls, match_id):
+        """Fingerprint of what the live snapshot of a match shows; None if there is no such match.
+
+        Score, status, last event and stats row, read with one query on the
+        primary key and the (match_id, id) index: it is the same in every
+        worker, so ETags issued by one are valid in the others.
+        """
+        last_update = db.select(func.max(MatchUpdate.id)).where(MatchUpdate.match_id == cls.id).scalar_subquery()
+        row = db.session.execute(
+            db.select(cls.home_score, cls.away_score, cls.status, last_update, *MatchStats.__table__.c)
+            .outerjoin(MatchStats, MatchStats.match_id == cls.id).where(cls.id == match_id)
+        ).first()
+        if row is None:
+            return None
+        return hashlib.blake2b(repr(tuple(row)).encode(), digest_size=8).hexdigest()
+
+    @classmethod
+    def listing(cls, tournament_id=None, status=None, date_from=None, date_to=None):
+        """Matches with both teams loaded, filtered for the list pages (``date_to`` included)"""
+        query = cls.query.options(joinedload(cls.home_team), joinedload(cls.away_team))
+        if tournament_id is not None:
+            query = query.filter(cls.tournament_id == tournament_id)
+        if status:
+            query = query.filter(cls.status == status)
+        if date_from is not None:
+            query = query.filter(cls.match_date >= datetime.combine(date_from, datetime.min.time()))
+        if date_to is not None:
+            query = query.filter(cls.match_date < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+        return query
+    
     @property
     def result_string(self):
         if self.status == 'completed':
@@ -255,25 +310,54 @@ class Match(db.Model):
         return "vs"
 
 class MatchUpdate(db.Model):
+    """Événement du journal d'un match, jamais modifié ni supprimé (voir match_events.py)"""
     id = db.Column(db.Integer, primary_key=True)
     match_id = db.Column(db.Integer, db.ForeignKey('match.id'), nullable=False)
     minute = db.Column(db.Integer)  # Match minute
-    update_type = db.Column(db.String(20))  # goal, card, substitution, etc.
+    update_type = db.Column(db.String(20))  # kickoff, goal, card, substitution, final_whistle, result
     team_id = db.Column(db.Integer, db.ForeignKey('team.id'))
-    player_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=True)
+    player_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=True)  # buteur, joueur averti, entrant
+    related_player_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=True)  # passeur, sortant
+    detail = db.Column(db.String(20))  # couleur du carton
+    home_score = db.Column(db.Integer)  # score saisi (événement result)
+    away_score = db.Column(db.Integer)
     description = db.Column(db.Text)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        # Curseur since=<id> : parcours d'index par match
+        db.Index('ix_match_update_match_id_id', 'match_id', 'id'),
+        db.Index('ix_match_update_match_id_timestamp', 'match_id', 'timestamp'),
+    )
+    
     # Relationships
     match = db.relationship('Match', backref='updates')
     team = db.relationship('Team')
-    player = db.relationship('Player')
+    player = db.relationship('Player', foreign_keys=[player_id])
+    related_player = db.relationship('Player', foreign_keys=[related_player_id])
+
+    @classmethod
+    def with_related(cls):
+        """Query loading team and player along, so to_dict() adds no query"""
+        return cls.query.options(joinedload(cls.team), joinedload(cls.player))
+
+    @classmethod
+    def page_after(cls, match_id, since=0, limit=100):
+        """Updates of a match with an id greater than ``since``, oldest first.
+
+        Returns ``(updates, has_more)``.
+        """
+        updates = cls.with_related().filter(cls.match_id == match_id, cls.id > (since or 0))\
+                                    .order_by(cls.id)\
+                                    .limit(limit + 1).all()
+        return updates[:limit], len(updates) > limit
     
     def to_dict(self):
         return {
             'id': self.id,
             'minute': self.minute,
             'type': self.update_type,
+            'detail': self.detail,
             'team': self.team.name if self.team else None,
             'player': self.player.name if self.player else None,
             'description': self.description,
@@ -300,9 +384,13 @@ class MatchStats(db.Model):
     home_red_cards = db.Column(db.Integer, default=0)
     away_red_cards = db.Column(db.Integer, default=0)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_match_stats_match_id', 'match_id', unique=True),
+    )
     
     # Relationship
-    match = db.relationship('Match', backref='stats_detail', uselist=False)
+    match = db.relationship('Match', backref=db.backref('stats_detail', uselist=False))
     
     def to_dict(self):
         return {
@@ -352,9 +440,56 @@ class PlayerStats(db.Model):
     clean_sheets = db.Column(db.Integer, default=0)  # For goalkeepers
     saves = db.Column(db.Integer, default=0)  # For goalkeepers
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # Une seule ligne de statistiques cumulées par joueur
+        db.Index('ix_player_stats_player_id', 'player_id', unique=True),
+    )
     
     # Relationship
     player = db.relationship('Player', backref='stats_record', uselist=False)
+
+    COUNTERS = ('goals', 'assists', 'yellow_cards', 'red_cards', 'matches_played', 'minutes_played',
+                'shots', 'shots_on_target', 'passes', 'tackles', 'interceptions', 'clean_sheets', 'saves')
+
+    @classmethod
+    def empty(cls, player_id):
+        """Statistiques à zéro, jamais ajoutées à la session"""
+        stats = cls(player_id=player_id, pass_accuracy=0.0)
+        for counter in cls.COUNTERS:
+            setattr(stats, counter, 0)
+        return stats
+
+    @classmethod
+    def for_players(cls, player_ids):
+        """Load the stats of many players in one query, keyed by player id.
+
+        Players without a PlayerStats row get zeros; nothing is written.
+        """
+        player_ids = list(player_ids)
+        if not player_ids:
+            return {}
+        stats_by_player = {}
+        for stats in cls.query.filter(cls.player_id.in_(player_ids)).order_by(cls.id):
+            stats_by_player.setdefault(stats.player_id, stats)
+        for player_id in player_ids:
+            if player_id not in stats_by_player:
+                stats_by_player[player_id] = cls.empty(player_id)
+        return stats_by_player
+
+    @classmethod
+    def for_team(cls, team_id):
+        """Same as for_players() for the whole squad of a team"""
+        stats_by_player = {}
+        rows = db.session.query(Player.id, cls)\
+                         .outerjoin(cls, cls.player_id == Player.id)\
+                         .filter(Player.team_id == team_id)\
+                         .order_by(cls.id)
+        for player_id, stats in rows:
+            if stats is None:
+                stats = cls.empty(player_id)
+            stats_by_player.setdefault(player_id, stats)
+        return stats_by_player
     
     def to_dict(self):
         return {
@@ -397,10 +532,25 @@ class PlayerMatchPerformance(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_selected = db.Column(db.Boolean, default=False)  # Si le joueur est sélectionné pour le match
     is_playing = db.Column(db.Boolean, default=False)   # Si le joueur est sur le terrain
+
+    __table_args__ = (
+        # Une seule performance par joueur et par match
+        db.Index('ix_player_match_performance_match_player', 'match_id', 'player_id', unique=True),
+        db.Index('ix_player_match_performance_player_id', 'player_id'),
+    )
     
     # Relationships
     player = db.relationship('Player', backref='match_performances')
     match = db.relationship('Match', backref='player_performances')
+
+    @classmethod
+    def with_related(cls):
+        """Query loading player, match and both teams, so to_dict() adds no query"""
+        return cls.query.options(
+            joinedload(cls.player),
+            joinedload(cls.match).joinedload(Match.home_team),
+            joinedload(cls.match).joinedload(Match.away_team)
+        )
     
     def to_dict(self):
         return {
@@ -421,3 +571,33 @@ class PlayerMatchPerformance(db.Model):
             'saves': self.saves,
             'rating': self.rating
         }
+
+
+class BackgroundJob(db.Model):
+    """Tâche différée du mode durable de la file (voir jobs.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(120), nullable=False)  # Clé d'idempotence, ex. match_completed:42
+    name = db.Column(db.String(80), nullable=False)
+    payload = db.Column(db.Text)  # JSON
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    result = db.Column(db.Text)  # JSON
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_background_job_key', 'key', unique=True),
+        db.Index('ix_background_job_status', 'status'),
+    )
+
+    def to_dict(self):
+        return {
+            'key': self.key,
+            'name': self.name,
+            'status': self.status,
+            'attempts': self.attempts,
+            'error': self.last_error,
+            'result': json.loads(self.result) if self.result else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
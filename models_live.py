@@ -50,7 +50,7 @@ class MatchStats(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationship
-    match = db.relationship('Match', backref='stats_detail', uselist=False)
+    match = db.relationship('Match', backref=db.backref('stats_detail', uselist=False))
     
     def to_dict(self):
         return {
@@ -0,0 +1,116 @@
+"""Keyset (seek) pagination for the list pages.
+
+A page is read with ``WHERE (k1, k2) > (:last_k1, :last_k2) ORDER BY k1, k2
+LIMIT n + 1`` on the ordering columns of the list, ending with a unique
+column (the id). Its cost does not depend on how deep the page is, unlike
+OFFSET, and an index on the ordering columns serves it directly.
+
+The position is carried by an opaque ``after`` cursor: the key of the last
+row of the previous page, JSON then URL-safe base64. Pages only go forward;
+the first page is the one without a cursor.
+"""
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import date, datetime
+
+from flask import abort, request
+from sqlalchemy import tuple_
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+
+
+@dataclass
+class Page:
+    items: list
+    next_cursor: str = None
+    per_page: int = DEFAULT_PER_PAGE
+    cursor: str = None
+
+    @property
+    def has_more(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(values):
+    payload = json.dumps([value.isoformat() if isinstance(value, (date, datetime)) else value for value in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    """Key values of ``cursor``, converted to the Python types of ``columns``"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError(cursor)
+        return [_convert(value, column) for value, column in zip(values, columns)]
+    except (ValueError, TypeError, binascii.Error):
+        abort(400, description='Invalid pagination cursor.')
+
+
+def _convert(value, column):
+    python_type = column.type.python_type
+    if value is None:
+        raise ValueError('NULL key')
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return python_type(value)
+
+
+def keyset_page(query, columns, after=None, per_page=DEFAULT_PER_PAGE, descending=False, key=None):
+    """One page of ``query`` ordered by ``columns``, after the cursor ``after``.
+
+    ``columns`` must end with a unique column and hold no NULL. ``key(item)``
+    returns the values of ``columns`` for a loaded item; by default they are
+    read as attributes of the item with the same names.
+    """
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    if after:
+        values = decode_cursor(after, columns)
+        row = tuple_(*columns)
+        query = query.filter(row < tuple_(*values) if descending else row > tuple_(*values))
+    query = query.order_by(*[column.desc() if descending else column.asc() for column in columns])
+    items = query.limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        last = items[-1]
+        next_cursor = encode_cursor(key(last) if key else [getattr(last, column.key) for column in columns])
+    return Page(items, next_cursor, per_page, after)
+
+
+def page_args():
+    """``after`` and ``per_page`` of the current request"""
+    return request.args.get('after') or None, request.args.get('per_page', DEFAULT_PER_PAGE, type=int)
+
+
+def date_arg(name):
+    """A YYYY-MM-DD query argument, or None; 400 if malformed"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        abort(400, description=f'{name} must be a date formatted as YYYY-MM-DD.')
+
+
+def match_filters():
+    """Filters of the match lists, for Match.listing()"""
+    return {
+        'tournament_id': request.args.get('tournament', type=int),
+        'status': request.args.get('status') or None,
+        'date_from': date_arg('from'),
+        'date_to': date_arg('to')
+    }
@@ -0,0 +1,82 @@
+"""Password hashing with a configurable cost, verified off the request thread.
+
+PASSWORD_HASH_METHOD takes a werkzeug method string, e.g. ``scrypt`` (the
+default, ``scrypt:32768:8:1``), ``scrypt:16384:8:1`` or
+``pbkdf2:sha256:600000``. Hashes made with other parameters still verify;
+login() rehashes them with the current ones.
+
+Both scrypt and pbkdf2 release the GIL, so PASSWORD_VERIFY_WORKERS threads
+bound how many verifications run at once per process. At most
+PASSWORD_VERIFY_QUEUE more wait for a thread; beyond that check() raises
+LoginBusy and the login is refused with a 503 instead of every worker
+spinning on hashes. With PASSWORD_VERIFY_WORKERS = 0 verification runs in
+the request thread.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_METHOD = 'scrypt'
+
+
+class LoginBusy(Exception):
+    """Too many password verifications already running or queued"""
+
+
+class PasswordHasher:
+
+    def __init__(self, method=DEFAULT_METHOD):
+        self.method = method
+        self.timeout = 10.0
+        self._prefixes = {}
+        self._executor = None
+        self._slots = None
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', self.method)
+        self.timeout = app.config.get('PASSWORD_VERIFY_TIMEOUT', self.timeout)
+        workers = app.config.get('PASSWORD_VERIFY_WORKERS', os.cpu_count() or 1)
+        if workers:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='passwords')
+            self._slots = threading.BoundedSemaphore(workers + app.config.get('PASSWORD_VERIFY_QUEUE', 4 * workers))
+        app.extensions['passwords'] = self
+
+    def hash(self, password, method=None):
+        return generate_password_hash(password, method or self.method)
+
+    def prefix(self, method=None):
+        """Stored form of the method and its parameters, e.g. 'scrypt:32768:8:1'"""
+        method = method or self.method
+        if method not in self._prefixes:
+            # werkzeug complète les paramètres par défaut : on les lit sur un hash réel
+            self._prefixes[method] = generate_password_hash('', method).split('$', 1)[0]
+        return self._prefixes[method]
+
+    def needs_rehash(self, password_hash):
+        return bool(password_hash) and password_hash.split('$', 1)[0] != self.prefix()
+
+    def check(self, password_hash, password):
+        """Verify ``password``, in the pool when there is one"""
+        if not password_hash:
+            return False
+        if self._executor is None:
+            return check_password_hash(password_hash, password)
+        if not self._slots.acquire(blocking=False):
+            raise LoginBusy()
+        try:
+            future = self._executor.submit(check_password_hash, password_hash, password)
+        except BaseException:
+            self._slots.release()
+            raise
+        # La place est rendue à la fin du calcul, même si la requête a abandonné
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # Vérification trop lente (pool saturé) : même réponse que sans place libre
+            raise LoginBusy()
+
+
+hasher = PasswordHasher()
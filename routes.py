@@ -1,12 +1,26 @@
-from flask import render_template, request, redirect, url_for, flash, jsonify
+from flask import render_template, request, redirect, url_for, flash, jsonify, Response, abort
+from sqlalchemy import func
+from sqlalchemy.orm import contains_eager, joinedload
 from app import app, db
-from models import Tournament, Team, Player, Match, MatchUpdate, MatchStats, PlayerStats, PlayerMatchPerformance
+from models import Tournament, Team, Player, Match, MatchUpdate, MatchStats, PlayerStats, PlayerMatchPerformance, PlayerEligibility
 from forms import TournamentForm, TeamForm, PlayerForm, MatchForm, ScoreForm
+from standings import compute_standings, rebuild_standings, record_result_change
+from live_feed import broker as live_feed, snapshots as live_snapshots
+from match_completion import completion_job_key
+from jobs import job_queue
+from scheduler import fixture_rows, insert_fixtures
+from fixture_optimizer import optimize_fixtures
+from pagination import keyset_page, page_args, match_filters
+from lineups import select_lineups, LineupError
+from match_events import record_event
+from live_stats import add_stat_deltas, stats_buffer
+from eligibility import clear_eligibility, refresh_eligibility
 from datetime import datetime, timedelta
-import itertools
+import json
 import random
 
-@app.route('/')
+# L'endpoint index est déjà celui de app.py (redirection selon le rôle), enregistré en premier
+@app.route('/', endpoint='home')
 def index():
     tournaments = Tournament.query.order_by(Tournament.created_at.desc()).limit(5).all()
     recent_matches = Match.query.filter_by(status='completed').order_by(Match.match_date.desc()).limit(5).all()
@@ -15,8 +29,14 @@ def index():
 # Tournament routes
 @app.route('/tournaments')
 def tournaments():
-    tournaments = Tournament.query.order_by(Tournament.created_at.desc()).all()
-    return render_template('tournaments/list.html', tournaments=tournaments)
+    query = Tournament.query
+    status = request.args.get('status')
+    if status:
+        query = query.filter(Tournament.status == status)
+    # created_at peut être NULL en base (lignes importées) : les tournois sans date viennent en dernier
+    page = keyset_page(query, [func.coalesce(Tournament.created_at, datetime.min), Tournament.id], *page_args(),
+                       descending=True, key=lambda tournament: [tournament.created_at or datetime.min, tournament.id])
+    return render_template('tournaments/list.html', tournaments=page.items, page=page, status=status)
 
 @app.route('/tournaments/create', methods=['GET', 'POST'])
 def create_tournament():
@@ -41,48 +61,62 @@ def tournament_detail(id):
     teams = Team.query.filter_by(tournament_id=id).all()
     matches = Match.query.filter_by(tournament_id=id).order_by(Match.match_date).all()
     
-    # Calculate standings
-    standings = []
-    for team in teams:
-        stats = team.get_stats()
-        standings.append({
-            'team': team,
-            'stats': stats
-        })
-    
-    # Sort standings by points, then goal difference, then goals for
-    standings.sort(key=lambda x: (x['stats']['points'], x['stats']['goal_difference'], x['stats']['goals_for']), reverse=True)
+    # Calculate standings (already sorted by points, goal difference, goals for)
+    standings = compute_standings(id)
     
     return render_template('tournaments/detail.html', tournament=tournament, teams=teams, matches=matches, standings=standings)
 
 @app.route('/tournaments/<int:id>/generate_fixtures', methods=['POST'])
 def generate_fixtures(id):
     tournament = Tournament.query.get_or_404(id)
-    teams = Team.query.filter_by(tournament_id=id).all()
+    teams = Team.query.filter_by(tournament_id=id).order_by(Team.id).all()
     
     if len(teams) < 2:
         flash('Need at least 2 teams to generate fixtures!', 'error')
         return redirect(url_for('tournament_detail', id=id))
     
+    double = request.form.get('double_round_robin') in ('1', 'on', 'true')
+    days_between_rounds = request.form.get('days_between_rounds', 7, type=int)
+    if days_between_rounds < 1:
+        flash('Matchdays must be at least one day apart!', 'error')
+        return redirect(url_for('tournament_detail', id=id))
+    try:
+        blackout_dates = {datetime.strptime(value.strip(), '%Y-%m-%d').date()
+                          for value in request.form.get('blackout_dates', '').split(',') if value.strip()}
+    except ValueError:
+        flash('Blackout dates must be given as YYYY-MM-DD, separated by commas.', 'error')
+        return redirect(url_for('tournament_detail', id=id))
+    
     # Delete existing matches
+    clear_eligibility(tournament_id=id)
     Match.query.filter_by(tournament_id=id).delete()
     
-    # Generate round-robin fixtures
-    team_combinations = list(itertools.combinations(teams, 2))
-    start_date = tournament.start_date
-    
-    for i, (home_team, away_team) in enumerate(team_combinations):
-        match_date = start_date + timedelta(days=i * 3)  # Matches every 3 days
-        match = Match(
-            tournament_id=id,
-            home_team_id=home_team.id,
-            away_team_id=away_team.id,
-            match_date=match_date,
-            round_number=1
+    # Generate round-robin fixtures (circle method), one matchday every N days
+    rows = fixture_rows(id, [team.id for team in teams], tournament.start_date,
+                        days_between_rounds=days_between_rounds, double=double)
+    
+    # Optional pass: shared stadiums (same city), rest days and blackout dates
+    if request.form.get('optimize') in ('1', 'on', 'true'):
+        result = optimize_fixtures(
+            rows,
+            venue_of={team.id: team.city for team in teams if team.city},
+            double=double,
+            min_rest_days=request.form.get('min_rest_days', 2, type=int),
+            blackout_dates=blackout_dates,
+            matchday_window=request.form.get('matchday_window', 3, type=int),
+            seed=request.form.get('seed', 0, type=int),
+            time_budget=app.config.get('FIXTURE_OPTIMIZER_TIME_BUDGET', 5.0)
         )
-        db.session.add(match)
+        rows = result.rows
+        if result.violations:
+            flash(f'{len(result.violations)} scheduling constraint(s) could not be satisfied.', 'warning')
+    
+    insert_fixtures(rows)
     
     tournament.status = 'active'
+    db.session.flush()
+    rebuild_standings(id)
+    refresh_eligibility(tournament_id=id)
     db.session.commit()
     flash('Fixtures generated successfully!', 'success')
     return redirect(url_for('tournament_detail', id=id))
@@ -90,8 +124,12 @@ def generate_fixtures(id):
 # Team routes
 @app.route('/teams')
 def teams():
-    teams = Team.query.order_by(Team.name).all()
-    return render_template('teams/list.html', teams=teams)
+    query = Team.query
+    tournament_id = request.args.get('tournament', type=int)
+    if tournament_id is not None:
+        query = query.filter(Team.tournament_id == tournament_id)
+    page = keyset_page(query, [Team.name, Team.id], *page_args())
+    return render_template('teams/list.html', teams=page.items, page=page, tournament_id=tournament_id)
 
 @app.route('/tournaments/<int:tournament_id>/teams/create', methods=['GET', 'POST'])
 def create_team(tournament_id):
@@ -125,13 +163,13 @@ def team_detail(id):
     players = Player.query.filter_by(team_id=id).order_by(Player.jersey_number).all()
     stats = team.get_stats()
     
-    # Get player stats for the team
+    # Get player stats for the team (one query, missing rows read as zeros)
+    stats_by_player = PlayerStats.for_team(id)
     players_with_stats = []
     for player in players:
-        player_stats = player.get_stats()
         players_with_stats.append({
             'player': player,
-            'stats': player_stats
+            'stats': stats_by_player.get(player.id) or PlayerStats.empty(player.id)
         })
     
     return render_template('teams/detail.html', team=team, players=players_with_stats, stats=stats)
@@ -139,8 +177,19 @@ def team_detail(id):
 # Player routes
 @app.route('/players')
 def players():
-    players = Player.query.join(Team).order_by(Team.name, Player.jersey_number).all()
-    return render_template('players/list.html', players=players)
+    query = Player.query.join(Team).options(contains_eager(Player.team))
+    tournament_id = request.args.get('tournament', type=int)
+    team_id = request.args.get('team', type=int)
+    if tournament_id is not None:
+        query = query.filter(Team.tournament_id == tournament_id)
+    if team_id is not None:
+        query = query.filter(Player.team_id == team_id)
+    # Le numéro de maillot peut être NULL en base : la clé de pagination ne doit pas l'être
+    page = keyset_page(query, [Team.name, Team.id, func.coalesce(Player.jersey_number, 0), Player.id], *page_args(),
+                       key=lambda player: [player.team.name, player.team_id, player.jersey_number or 0, player.id])
+    player_stats = PlayerStats.for_players(player.id for player in page.items)
+    return render_template('players/list.html', players=page.items, player_stats=player_stats, page=page,
+                           tournament_id=tournament_id, team_id=team_id)
 
 @app.route('/teams/<int:team_id>/players/create', methods=['GET', 'POST'])
 def create_player(team_id):
@@ -163,6 +212,8 @@ def create_player(team_id):
             team_id=team_id
         )
         db.session.add(player)
+        db.session.flush()
+        refresh_eligibility(team_ids=[team_id])
         db.session.commit()
         flash(f'Player "{player.name}" added successfully!', 'success')
         return redirect(url_for('team_detail', id=team_id))
@@ -172,8 +223,9 @@ def create_player(team_id):
 # Match routes
 @app.route('/matches')
 def matches():
-    matches = Match.query.order_by(Match.match_date.desc()).all()
-    return render_template('matches/list.html', matches=matches)
+    filters = match_filters()
+    page = keyset_page(Match.listing(**filters), [Match.match_date, Match.id], *page_args(), descending=True)
+    return render_template('matches/list.html', matches=page.items, page=page, filters=filters)
 
 @app.route('/matches/<int:id>/update_score', methods=['GET', 'POST'])
 def update_score(id):
@@ -185,10 +237,14 @@ def update_score(id):
         form.away_score.data = match.away_score
     
     if form.validate_on_submit():
-        match.home_score = form.home_score.data
-        match.away_score = form.away_score.data
-        match.status = 'completed'
+        previous = (match.status, match.home_score, match.away_score)
+        update = record_event(match, 'result', home_score=form.home_score.data, away_score=form.away_score.data,
+                              description=f'Score final : {form.home_score.data} - {form.away_score.data}')
+        record_result_change(match, *previous)
+        refresh_eligibility(team_ids=[match.home_team_id, match.away_team_id])
+        payload = update.to_dict()
         db.session.commit()
+        _publish_live(id, _score(update.projection), payload)
         flash('Match score updated successfully!', 'success')
         return redirect(url_for('matches'))
     
@@ -197,18 +253,9 @@ def update_score(id):
 @app.route('/tournaments/<int:id>/standings')
 def standings(id):
     tournament = Tournament.query.get_or_404(id)
-    teams = Team.query.filter_by(tournament_id=id).all()
     
-    standings = []
-    for team in teams:
-        stats = team.get_stats()
-        standings.append({
-            'team': team,
-            'stats': stats
-        })
-    
-    # Sort standings by points, then goal difference, then goals for
-    standings.sort(key=lambda x: (x['stats']['points'], x['stats']['goal_difference'], x['stats']['goals_for']), reverse=True)
+    # Sorted by points, then goal difference, then goals for
+    standings = compute_standings(id)
     
     return render_template('standings.html', tournament=tournament, standings=standings)
 
@@ -223,30 +270,134 @@ def live_match(id):
         db.session.add(stats)
         db.session.commit()
     
-    return render_template('matches/live.html', match=match, home_team_players=match.home_team.players, away_team_players=match.away_team.players)
-
-# API Routes for Live Updates
-@app.route('/api/matches/<int:id>/live')
-def api_live_match_data(id):
-    match = Match.query.get_or_404(id)
-    
-    # Get recent updates (last 10)
-    recent_updates = MatchUpdate.query.filter_by(match_id=id)\
-                                    .order_by(MatchUpdate.timestamp.desc())\
-                                    .limit(10).all()
+    # Joueurs éligibles de chaque côté ; effectifs complets une fois le match terminé
+    eligibility = PlayerEligibility.for_match(id)
+    if eligibility:
+        home_team_players = [row.player for row in eligibility if row.team_id == match.home_team_id and row.eligible]
+        away_team_players = [row.player for row in eligibility if row.team_id == match.away_team_id and row.eligible]
+    else:
+        home_team_players, away_team_players = match.home_team.players, match.away_team.players
+    
+    return render_template('matches/live.html', match=match, home_team_players=home_team_players, away_team_players=away_team_players)
+
+LIVE_UPDATES_PAGE_SIZE = 100
+
+def _live_snapshot(match, since=None):
+    """Current state of a live match, as served to the live page.
+
+    Without ``since`` the last 10 updates are returned, newest first. With
+    ``since`` only the updates after that id are returned, oldest first, and
+    ``has_more`` tells the client to poll again right away.
+    """
+    if since is None:
+        # Get recent updates (last 10)
+        updates = MatchUpdate.with_related().filter_by(match_id=match.id)\
+                                            .order_by(MatchUpdate.timestamp.desc())\
+                                            .limit(10).all()
+        has_more = False
+        last_update_id = max((update.id for update in updates), default=None)
+    else:
+        updates, has_more = MatchUpdate.page_after(match.id, since, LIVE_UPDATES_PAGE_SIZE)
+        last_update_id = updates[-1].id if updates else since
     
     # Get match stats
     stats = match.stats_detail
     
-    response_data = {
+    return {
         'home_score': match.home_score,
         'away_score': match.away_score,
         'status': match.status,
-        'updates': [update.to_dict() for update in recent_updates],
+        'updates': [update.to_dict() for update in updates],
+        'last_update_id': last_update_id,
+        'has_more': has_more,
         'stats': stats.to_dict() if stats else None
     }
-    
-    return jsonify(response_data)
+
+def _score(projection):
+    return {key: projection[key] for key in ('home_score', 'away_score', 'status')}
+
+def _publish_live(match_id, score, update=None, stats=None):
+    """Push a change to the live feed subscribers, once it is committed.
+
+    Takes dicts built before the commit, which expires the ORM objects:
+    publishing reads nothing back from the database.
+    """
+    live_feed.publish(match_id, 'score', score)
+    if update is not None:
+        live_feed.publish(match_id, 'update', update, event_id=update['id'])
+    if stats is not None:
+        live_feed.publish_stats(match_id, stats)
+
+# API Routes for Live Updates
+@app.route('/api/matches/<int:id>/live')
+def api_live_match_data(id):
+    since = request.args.get('since', type=int)
+
+    # Version lue en base avant l'instantané : la même dans tous les workers
+    version = Match.live_version(id)
+    if version is None:
+        abort(404)
+    etag = live_snapshots.etag(id, version)
+
+    if since is not None:
+        # Réponse propre à chaque curseur (pages has_more) : ni cache ni 304, ETag propre au curseur
+        match = Match.query.get_or_404(id)
+        body = json.dumps(_live_snapshot(match, since))
+        etag = f'{etag}-since-{since}'
+    elif etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    else:
+        body = live_snapshots.get(id, version)
+        if body is None:
+            match = Match.query.get_or_404(id)
+            body = json.dumps(_live_snapshot(match))
+            live_snapshots.store(id, version, body)
+
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/matches/<int:id>/updates')
+def api_match_timeline(id):
+    """Full timeline of a match, paginated with the ``since`` cursor"""
+    Match.query.get_or_404(id)
+    since = request.args.get('since', 0, type=int)
+    limit = min(max(request.args.get('limit', LIVE_UPDATES_PAGE_SIZE, type=int), 1), 500)
+    updates, has_more = MatchUpdate.page_after(id, since, limit)
+    return jsonify({
+        'updates': [update.to_dict() for update in updates],
+        'next_since': updates[-1].id if updates else since,
+        'has_more': has_more
+    })
+
+@app.route('/api/matches/<int:id>/stream')
+def api_live_match_stream(id):
+    """Server-Sent Events feed of a live match.
+
+    The snapshot is read once at connection time; everything after that is
+    pushed by the write endpoints through the live feed broker.
+    """
+    match = Match.query.get_or_404(id)
+    # Abonné avant de lire l'instantané : un événement commité entre les deux
+    # arrive dans la file au lieu d'être perdu (au pire envoyé deux fois)
+    subscription = live_feed.subscribe(id)
+    try:
+        # Reconnexion EventSource : on renvoie les événements manqués depuis le dernier id reçu
+        last_event_id = request.headers.get('Last-Event-ID', type=int)
+        snapshot = _live_snapshot(match, since=last_event_id)
+    except Exception:
+        live_feed.unsubscribe(subscription)
+        raise
+    # Le flux peut durer tout le match : on rend la connexion au pool tout de suite
+    db.session.remove()
+    return Response(
+        live_feed.stream(id, initial=snapshot, subscription=subscription),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/api/matches/<int:id>/score', methods=['POST'])
 def api_update_score(id):
@@ -256,75 +407,59 @@ def api_update_score(id):
     team = data.get('team')  # 'home' or 'away'
     
     if team == 'home':
-        match.home_score += 1
-        team_obj = Team.query.get(match.home_team_id)
+        team_obj = match.home_team
     elif team == 'away':
-        match.away_score += 1
-        team_obj = Team.query.get(match.away_team_id)
+        team_obj = match.away_team
     else:
         return jsonify({'error': 'Invalid team'}), 400
     
-    # Create match update
-    update = MatchUpdate(
-        match_id=id,
-        minute=random.randint(1, 90),
-        update_type='goal',
+    # Buteur et passeur facultatifs, de l'équipe qui marque
+    scorers = [player_id for player_id in (data.get('player_id'), data.get('assist_player_id')) if player_id]
+    if scorers and Player.query.filter(Player.id.in_(scorers), Player.team_id == team_obj.id).count() != len(set(scorers)):
+        return jsonify({'error': 'Scorer and assist must be players of the scoring team.'}), 400
+    
+    # Le score, les performances et les statistiques suivent le journal (voir match_events.py)
+    update = record_event(
+        match, 'goal',
+        minute=data.get('minute') or random.randint(1, 90),
         team_id=team_obj.id,
+        player_id=data.get('player_id'),
+        related_player_id=data.get('assist_player_id'),
         description=f'⚽ BUT ! {team_obj.name} marque !'
     )
     
-    # Update match stats
-    if not match.stats_detail:
-        stats = MatchStats(match_id=id)
-        db.session.add(stats)
-    else:
-        stats = match.stats_detail
-    
-    # Simulate some stats updates
-    if team == 'home':
-        stats.home_shots += random.randint(1, 3)
-        stats.home_shots_on_target += 1
-    else:
-        stats.away_shots += random.randint(1, 3)
-        stats.away_shots_on_target += 1
-    
-    # Random possession adjustment
+    # Simulate some stats updates, atomically (created with the first goal if needed)
     possession_change = random.randint(-5, 5)
-    if team == 'home':
-        stats.home_possession = min(100, max(0, stats.home_possession + possession_change))
-        stats.away_possession = 100 - stats.home_possession
+    deltas = {f'{team}_shots': random.randint(1, 3), f'{team}_shots_on_target': 1}
+    possession = possession_change if team == 'home' else -possession_change
+    # Tampon réservé aux matchs en cours : après le coup de sifflet, plus de flush de fin de match
+    buffered = stats_buffer.enabled and update.projection['status'] == 'in_progress'
+    if buffered:
+        # Écrites et publiées au prochain flush du tampon : pas de stats dans la réponse
+        stats = None
     else:
-        stats.away_possession = min(100, max(0, stats.away_possession + possession_change))
-        stats.home_possession = 100 - stats.away_possession
+        stats = add_stat_deltas(id, deltas, possession=possession)
     
-    db.session.add(update)
+    score, payload = _score(update.projection), update.to_dict()
     db.session.commit()
+    if buffered:
+        stats_buffer.add(id, deltas, possession=possession)
+    _publish_live(id, score, payload, stats)
     
-    return jsonify({
-        'home_score': match.home_score,
-        'away_score': match.away_score,
-        'status': match.status,
-        'stats': stats.to_dict(),
-        'updates': [update.to_dict()]
-    })
+    return jsonify(dict(score, stats=stats, updates=[payload]))
 
 @app.route('/api/matches/<int:id>/start', methods=['POST'])
 def api_start_match(id):
     match = Match.query.get_or_404(id)
-    match.status = 'in_progress'
     
     # Create kick-off update
-    update = MatchUpdate(
-        match_id=id,
-        minute=0,
-        update_type='kickoff',
-        description='🟢 Le match commence !'
-    )
+    update = record_event(match, 'kickoff', minute=0, description='🟢 Le match commence !')
     
-    db.session.add(update)
+    score, payload = _score(update.projection), update.to_dict()
     db.session.commit()
+    _publish_live(id, score, payload)
     
-    return jsonify({'status': 'success', 'match_status': match.status})
+    return jsonify({'status': 'success', 'match_status': score['status']})
 
 @app.route('/api/matches/<int:id>/end', methods=['POST'])
 def api_end_match(id):
@@ -332,123 +467,146 @@ def api_end_match(id):
     
     # Prevent processing if match is already completed
     if match.status == 'completed':
+        job = job_queue.status(completion_job_key(id))
+        if job is not None and job['status'] == 'failed':
+            # Dérivés d'un match terminé ici mais dont la tâche a échoué : relancée.
+            # Tout statut non terminé donne le même effet au classement.
+            job_queue.enqueue('match_completed', completion_job_key(id), match_id=id, previous_status='in_progress')
+            db.session.commit()
+            return jsonify({'status': 'info', 'message': 'Match already completed, derived data retried.',
+                            'derived_status_url': url_for('api_match_derived_status', id=id)}), 200
         return jsonify({'status': 'info', 'message': 'Match already completed.'}), 200
 
     # Set match status to completed
-    match.status = 'completed'
+    previous_status = match.status
+
+    # Statistiques encore en tampon écrites avant le coup de sifflet final
+    stats_buffer.flush(id)
     
     # Create final whistle update
-    update = MatchUpdate(
-        match_id=id,
-        minute=90,
-        update_type='final_whistle',
-        description='🔴 Fin du match !'
-    )
-    db.session.add(update)
-
-    # --- Suspension Logic --- #
-    # 1. Lift suspensions for players whose suspension match was the just-completed one
-    for team in [match.home_team, match.away_team]:
-        for player in team.players:
-            if player.is_suspended and player.suspended_until_match_id == match.id:
-                player.is_suspended = False
-                player.suspended_until_match_id = None
-                flash(f'{player.name} is no longer suspended.', 'info') # Optional: notify users
-
-    # 2. Process player performances from this match for new suspensions
-    player_performances = PlayerMatchPerformance.query.filter_by(match_id=match.id).all()
-    for performance in player_performances:
-        player = performance.player
-        player_stats = player.get_stats() # Get or create PlayerStats
-        
-        # Update cumulative stats with cards from this match
-        player_stats.yellow_cards += performance.yellow_cards
-        player_stats.red_cards += performance.red_cards
-        player_stats.matches_played += 1 # Increment matches played
-        player_stats.minutes_played += performance.minutes_played # Add minutes played
-        player_stats.goals += performance.goals # Add goals
-        player_stats.assists += performance.assists # Add assists
-        # Add other stats updates as needed...
-
-        db.session.add(player_stats)
-
-        # Check for new suspensions (2 yellow cards OR 1 red card cumulative)
-        if player_stats.yellow_cards >= 2 or player_stats.red_cards >= 1:
-            if not player.is_suspended: # Avoid suspending someone already suspended
-                player.is_suspended = True
-                
-                # Find the player's team's next scheduled match in the same tournament
-                next_match = Match.query.filter(
-                    db.or_(Match.home_team_id == player.team_id, Match.away_team_id == player.team_id),
-                    Match.tournament_id == match.tournament_id, # Same tournament
-                    Match.match_date > match.match_date, # After the current match date
-                    Match.status == 'scheduled' # Must be a scheduled match
-                ).order_by(Match.match_date.asc()).first()
-
-                if next_match:
-                    player.suspended_until_match_id = next_match.id
-                    flash(f'{player.name} is suspended for the next match ({next_match.home_team.name} vs {next_match.away_team.name}).', 'warning') # Optional: notify users
-                else:
-                     # Handle case where there are no more scheduled matches for the team
-                     # Player remains suspended until the end of the tournament/season
-                     flash(f'{player.name} is suspended. No further matches scheduled for their team in this tournament.', 'warning')
-
-        # Optional: Reset yellow card count after 2 yellows lead to suspension? (Depends on rules)
-        # If accumulated yellow cards reset after a suspension:
-        # if player_stats.yellow_cards >= 2:
-        #    player_stats.yellow_cards = 0 # Reset yellow cards if they triggered a suspension
-            
+    update = record_event(match, 'final_whistle', minute=90, description='🔴 Fin du match !')
+
+    # Standings, cumulative stats and suspensions are derived in the
+    # background once this commit lands (see match_completion.py)
+    job_queue.enqueue('match_completed', completion_job_key(id),
+                      match_id=id, previous_status=previous_status)
 
+    score, payload = _score(update.projection), update.to_dict()
     db.session.commit()
+    _publish_live(id, score, payload)
     
-    return jsonify({'status': 'success', 'match_status': match.status})
+    return jsonify({
+        'status': 'success',
+        'match_status': score['status'],
+        'derived_status_url': url_for('api_match_derived_status', id=id)
+    })
+
+@app.route('/api/matches/<int:id>/derived_status')
+def api_match_derived_status(id):
+    """Whether standings, stats and suspensions reflect the end of this match.
+
+    ``up_to_date`` is null when this process cannot tell: the match was
+    ended through the completion job but its status is not known here
+    (memory job queue of another worker, or lost on restart).
+    """
+    match = Match.query.get_or_404(id)
+    job = job_queue.status(completion_job_key(id))
+    if match.status != 'completed':
+        up_to_date = True
+    elif job is not None:
+        up_to_date = job['status'] == 'done'
+    elif job_queue.mode == 'durable' or not MatchUpdate.query.filter_by(match_id=id, update_type='final_whistle').first():
+        # Pas de tâche : match terminé par la saisie du score (classement écrit dans la requête)
+        # ou avant les tâches ; en mode durable, la tâche de /end serait en base
+        up_to_date = True
+    else:
+        up_to_date = None
+    return jsonify({
+        'match_id': id,
+        'match_status': match.status,
+        'job': job,
+        'up_to_date': up_to_date
+    })
 
 # API Route to record a player card
 @app.route('/api/matches/<int:match_id>/player/<int:player_id>/card/<string:card_type>', methods=['POST'])
 def api_record_card(match_id, player_id, card_type):
     match = Match.query.get_or_404(match_id)
-    player = Player.query.get_or_404(player_id)
+    player = Player.query.options(joinedload(Player.team)).filter_by(id=player_id).first_or_404()
 
     # Ensure the player is in one of the teams playing the match
     if player.team_id != match.home_team_id and player.team_id != match.away_team_id:
         return jsonify({'error': 'Player is not in one of the teams playing this match.'}), 400
 
-    # Find or create PlayerMatchPerformance entry for this player and match
-    performance = PlayerMatchPerformance.query.filter_by(player_id=player_id, match_id=match_id).first()
-    if not performance:
-        # Create a minimal performance entry if it doesn't exist (e.g., if player came on as sub and wasn't selected initially)
-        performance = PlayerMatchPerformance(player_id=player_id, match_id=match_id, is_selected=False, is_playing=True) # Assume playing if they get a card
-        db.session.add(performance)
-
-    # Update card count in performance
     if card_type == 'yellow':
-        performance.yellow_cards += 1
         card_description = f'🟨 Carton jaune pour {player.name} ({player.team.name})'
     elif card_type == 'red':
-        performance.red_cards += 1
         card_description = f'🟥 Carton rouge pour {player.name} ({player.team.name})'
     else:
         return jsonify({'error': 'Invalid card type.'}), 400
 
-    # Create a MatchUpdate for the live feed
     # Get current match minute (can be approximated or added to API call)
     # For now, use a random minute for simulation
-    current_minute = random.randint(1, 90)
-
-    update = MatchUpdate(
-        match_id=match_id,
-        minute=current_minute,
-        update_type='card',
-        team_id=player.team_id,
-        player_id=player_id,
-        description=card_description
-    )
-    db.session.add(update)
+    current_minute = request.args.get('minute', type=int) or random.randint(1, 90)
 
+    # La performance du joueur (créée au besoin) et les cartons du match suivent l'événement
+    update = record_event(match, 'card', minute=current_minute, team_id=player.team_id, player_id=player_id,
+                          detail=card_type, description=card_description)
+
+    payload, message = update.to_dict(), f'Card recorded for {player.name}.'
     db.session.commit()
+    live_feed.publish(match_id, 'update', payload, event_id=payload['id'])
 
     return jsonify({
         'status': 'success',
-        'message': f'Card recorded for {player.name}.',
-        'update': update.to_dict() # Return the update for the live feed
+        'message': message,
+        'performance': update.projection['performance'],  # Cartons du joueur dans ce match
+        'update': payload # Return the update for the live feed
     })
+
+@app.route('/api/matches/<int:id>/substitution', methods=['POST'])
+def api_record_substitution(id):
+    """Body: {"player_in": 1, "player_out": 2, "minute": 60}"""
+    match = Match.query.get_or_404(id)
+    data = request.get_json(silent=True) or {}
+    players = {player.id: player for player in Player.query.filter(
+        Player.id.in_([data.get('player_in'), data.get('player_out')]),
+        Player.team_id.in_([match.home_team_id, match.away_team_id])
+    )}
+    player_in, player_out = players.get(data.get('player_in')), players.get(data.get('player_out'))
+    if player_in is None or player_out is None or player_in.team_id != player_out.team_id or player_in is player_out:
+        return jsonify({'error': 'player_in and player_out must be two players of the same team in this match.'}), 400
+
+    update = record_event(match, 'substitution', minute=data.get('minute') or random.randint(1, 90),
+                          team_id=player_in.team_id, player_id=player_in.id, related_player_id=player_out.id,
+                          description=f'🔁 {player_in.name} remplace {player_out.name} ({player_in.team.name})')
+    payload = update.to_dict()
+    db.session.commit()
+    live_feed.publish(id, 'update', payload, event_id=payload['id'])
+
+    return jsonify({'status': 'success', 'update': payload})
+
+@app.route('/api/tournaments/<int:id>/rounds/<int:round_number>/lineups', methods=['POST'])
+def api_submit_lineups(id, round_number):
+    """Lineups of a matchday, all written in one transaction.
+
+    Body: {"lineups": [{"match_id": 1, "team_id": 2, "player_ids": [3, 4]}, ...]}
+    """
+    Tournament.query.get_or_404(id)
+    data = request.get_json(silent=True) or {}
+    try:
+        submitted = [(int(entry['match_id']), int(entry['team_id']),
+                      [int(player_id) for player_id in entry['player_ids']])
+                     for entry in data.get('lineups', [])]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Each lineup needs a match_id, a team_id and a list of player_ids.'}), 400
+    if not submitted:
+        return jsonify({'error': 'No lineup submitted.'}), 400
+
+    try:
+        lineups = select_lineups(submitted, tournament_id=id, round_number=round_number)
+    except LineupError as error:
+        db.session.rollback()
+        return jsonify({'error': str(error)}), 400
+
+    return jsonify({'status': 'success', 'lineups': [lineup.to_dict() for lineup in lineups]})
@@ -0,0 +1,82 @@
+"""Round-robin fixture generation (circle method).
+
+One team stays fixed while the others rotate around it. Every round each
+team plays once (or rests when the number of teams is odd). Home and away
+alternate so that over a single round-robin no team has more than one home
+match more than away matches. The double round-robin replays the same
+rounds with home and away swapped.
+"""
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import insert
+
+from extensions import db
+from models import Match
+
+
+def round_robin(team_ids, double=False):
+    """List of rounds, each a list of (home_team_id, away_team_id) pairs"""
+    teams = list(team_ids)
+    if len(teams) < 2:
+        return []
+    if len(teams) % 2:
+        # Exempt en position fixe : l'équipe qui lui est opposée est au repos
+        teams.insert(0, None)
+
+    n = len(teams)
+    fixed, rotating = teams[0], teams[1:]
+    rounds = []
+    for round_index in range(n - 1):
+        current = [fixed] + rotating
+        pairs = []
+        for i in range(n // 2):
+            first, second = current[i], current[n - 1 - i]
+            if first is None or second is None:
+                continue
+            if i == 0:
+                # L'équipe fixe alterne domicile / extérieur d'une journée à l'autre
+                swap = round_index % 2 == 1
+            else:
+                swap = i % 2 == 0
+            pairs.append((second, first) if swap else (first, second))
+        rounds.append(pairs)
+        rotating = rotating[-1:] + rotating[:-1]
+
+    if double:
+        rounds += [[(away, home) for home, away in pairs] for pairs in rounds]
+    return rounds
+
+
+def fixture_rows(tournament_id, team_ids, start_date, days_between_rounds=7, double=False,
+                 kickoff=time(18, 0), venues=None):
+    """Match rows for a full round-robin, ready for a bulk insert.
+
+    Round ``k`` is played ``(k - 1) * days_between_rounds`` days after
+    ``start_date``. ``venues`` optionally maps a team id to its home venue.
+    """
+    venues = venues or {}
+    first_day = datetime.combine(start_date, kickoff)
+    rows = []
+    for round_number, pairs in enumerate(round_robin(team_ids, double), start=1):
+        match_date = first_day + timedelta(days=(round_number - 1) * days_between_rounds)
+        for home_team_id, away_team_id in pairs:
+            rows.append({
+                'tournament_id': tournament_id,
+                'home_team_id': home_team_id,
+                'away_team_id': away_team_id,
+                'match_date': match_date,
+                'venue': venues.get(home_team_id),
+                'round_number': round_number,
+                'home_score': 0,
+                'away_score': 0,
+                'status': 'scheduled',
+                'created_at': datetime.utcnow()
+            })
+    return rows
+
+
+def insert_fixtures(rows):
+    """Write all the fixtures with one executemany INSERT"""
+    if rows:
+        db.session.execute(insert(Match), rows)
+    return len(rows)
@@ -1,10 +1,19 @@
 from app import app
 from extensions import db
-from models import User, Admin, Coach, Referee, Tournament, Team, Player, Match
+from models import User, Admin, Coach, Referee, Tournament, Team, Player, Match, PlayerMatchPerformance
 from werkzeug.security import generate_password_hash
+from sqlalchemy import func
 from datetime import datetime, date
+from bulk import dialect_name, copy_rows, reset_sequences
+from passwords import hasher
+from scheduler import fixture_rows
+from standings import rebuild_standings
+from match_completion import rebuild_player_stats
+from eligibility import refresh_eligibility
+import argparse
 import random
 import string
+import time
 
 def generate_random_password(length=12):
     characters = string.ascii_letters + string.digits + string.punctuation
@@ -244,6 +253,8 @@ def seed_matches(tournament, teams):
                  db.session.add(match)
                  print(f"   - Created match: {home_team.name} vs {away_team.name} on {match_date.strftime('%Y-%m-%d')}")
 
+        db.session.flush()
+        refresh_eligibility(tournament_id=tournament.id)
         db.session.commit()
     else:
         print(" - Matches already exist or not enough teams to create pairs.")
@@ -251,30 +262,266 @@ def seed_matches(tournament, teams):
     print("Matches seeding complete.")
 
 
+# Mode --scale : ligues synthétiques volumineuses pour les tests de charge
+
+SCALE_CITIES = ['Casablanca', 'Rabat', 'Fes', 'Marrakech', 'Tangier', 'Agadir', 'Oujda', 'Berkane',
+                'El Jadida', 'Khouribga', 'Safi', 'Tetouan', 'Meknes', 'Nador', 'Kenitra', 'Laayoune']
+SCALE_POSITIONS = ['Goalkeeper'] + ['Defender'] * 4 + ['Midfielder'] * 4 + ['Forward'] * 2
+SCALE_NATIONALITIES = ['Moroccan', 'Senegalese', 'Ivorian', 'Cameroonian', 'Nigerian']
+SCALE_BATCH_SIZE = 20000
+
+
+def _next_id(model):
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def _bulk_insert(model, rows):
+    """Insert rows with explicit ids: COPY on Postgres, executemany elsewhere"""
+    table = model.__table__
+    for start in range(0, len(rows), SCALE_BATCH_SIZE):
+        batch = rows[start:start + SCALE_BATCH_SIZE]
+        if dialect_name() == 'postgresql':
+            copy_rows(table, batch)
+        else:
+            db.session.execute(table.insert(), batch)
+
+
+def _performance_rows(rng, match, squad, goals, next_id, now):
+    """Performances of one side of a completed match: 11 starters and 3 substitutes"""
+    selected = rng.sample(squad, min(14, len(squad)))
+    starters, substitutes = selected[:11], selected[11:]
+    scorers = [player_id for player_id, position in selected if position != 'Goalkeeper'] or [selected[0][0]]
+    goals_by_player = {}
+    for _ in range(goals):
+        scorer = rng.choice(scorers)
+        goals_by_player[scorer] = goals_by_player.get(scorer, 0) + 1
+
+    rows = []
+    for index, (player_id, position) in enumerate(starters + substitutes):
+        if index < len(starters):
+            minutes = 90 if index >= len(substitutes) else rng.randint(55, 85)
+        else:
+            minutes = 90 - rows[index - len(starters)]['minutes_played']
+        yellow_cards = int(rng.random() < 0.12)
+        passes = rng.randint(10, 70) * minutes // 90
+        player_goals = goals_by_player.get(player_id, 0)
+        shots = max(player_goals, rng.randint(0, 4) if position == 'Forward' else rng.randint(0, 2))
+        rows.append({
+            'id': next_id + index,
+            'player_id': player_id,
+            'match_id': match['id'],
+            'goals': player_goals,
+            'assists': int(rng.random() < 0.08),
+            'yellow_cards': yellow_cards,
+            'red_cards': int(not yellow_cards and rng.random() < 0.01),
+            'minutes_played': minutes,
+            'shots': shots,
+            'shots_on_target': rng.randint(player_goals, shots),
+            'passes': passes,
+            'passes_completed': passes * rng.randint(65, 92) // 100,
+            'tackles': rng.randint(0, 5),
+            'interceptions': rng.randint(0, 4),
+            'saves': rng.randint(0, 6) if position == 'Goalkeeper' else 0,
+            'rating': round(rng.uniform(5.0, 8.5) + player_goals * 0.5, 1),
+            'created_at': now,
+            'is_selected': True,
+            'is_playing': False
+        })
+    return rows
+
+
+def seed_scale(tournaments, teams, players, seed=0, double=True, played=0.5, password='scale-password', referees=4):
+    """Generate ``tournaments`` leagues of ``teams`` teams of ``players`` players, with fixtures.
+
+    The first ``played`` share of the rounds is completed, with performances
+    for 14 players per side. Every synthetic account (a coach per team and
+    ``referees`` referees per league) shares one precomputed password hash. Each league only depends on ``seed`` and its index, so
+    two runs with the same arguments produce the same data.
+    """
+    started = time.perf_counter()
+    password_hash = hasher.hash(password)
+    now = datetime.utcnow()
+    ids = {model: _next_id(model) for model in (User, Tournament, Team, Player, Match, PlayerMatchPerformance)}
+    first_player_id = ids[Player]
+    counts = dict.fromkeys(('users', 'teams', 'players', 'matches', 'performances'), 0)
+    tournament_ids = []
+
+    for t in range(tournaments):
+        rng = random.Random(f'{seed}:{t}')
+        tournament_id = ids[Tournament]
+        ids[Tournament] += 1
+        tournament_ids.append(tournament_id)
+        db.session.execute(Tournament.__table__.insert(), [{
+            'id': tournament_id,
+            'name': f'Scale League {seed}-{t + 1}',
+            'description': 'Synthetic league for load testing',
+            'start_date': date(2024, 9, 1),
+            'end_date': date(2025, 6, 15),
+            'max_teams': teams,
+            'status': 'ongoing',
+            'created_at': now
+        }])
+
+        user_rows, team_rows, player_rows = [], [], []
+        squads = {}
+        for i in range(teams):
+            team_id, coach_id = ids[Team] + i, ids[User] + i
+            user_rows.append({
+                'id': coach_id,
+                'username': f'coach{coach_id}',
+                'email': f'coach{coach_id}@scale.example.com',
+                'password_hash': password_hash,
+                'role': 'coach',
+                'created_at': now,
+                'first_name': 'Coach',
+                'last_name': f'{tournament_id}-{i + 1}',
+                'team_id': team_id
+            })
+            team_rows.append({
+                'id': team_id,
+                'name': f'Team {tournament_id}-{i + 1}',
+                'city': SCALE_CITIES[i % len(SCALE_CITIES)],
+                'founded_year': rng.randint(1920, 2010),
+                'tournament_id': tournament_id,
+                'created_at': now,
+                'coach_id': coach_id
+            })
+            squad = []
+            for k in range(players):
+                player_id = ids[Player] + i * players + k
+                position = SCALE_POSITIONS[k % len(SCALE_POSITIONS)]
+                squad.append((player_id, position))
+                player_rows.append({
+                    'id': player_id,
+                    'name': f'Player {k + 1} ({tournament_id}-{i + 1})',
+                    'position': position,
+                    'jersey_number': k + 1,
+                    'age': rng.randint(17, 38),
+                    'nationality': rng.choice(SCALE_NATIONALITIES),
+                    'team_id': team_id,
+                    'created_at': now,
+                    'is_available': True,
+                    'is_suspended': False,
+                    'suspended_until_match_id': None
+                })
+            squads[team_id] = squad
+        referee_rows = []
+        for r in range(referees):
+            referee_id = ids[User] + teams + r
+            user_rows.append({
+                'id': referee_id,
+                'username': f'referee{referee_id}',
+                'email': f'referee{referee_id}@scale.example.com',
+                'password_hash': password_hash,
+                'role': 'referee',
+                'created_at': now,
+                'first_name': 'Referee',
+                'last_name': f'{tournament_id}-{r + 1}',
+                'team_id': None
+            })
+            referee_rows.append({'id': referee_id, 'nationality': rng.choice(SCALE_NATIONALITIES), 'created_at': now})
+        ids[User] += teams + referees
+        ids[Team] += teams
+        ids[Player] += teams * players
+
+        # Coach et équipe se référencent : Postgres vérifie les clés étrangères tout de suite,
+        # donc user.team_id est renseigné après l'insertion des équipes
+        if dialect_name() == 'postgresql':
+            for row in user_rows:
+                row['team_id'] = None
+        _bulk_insert(User, user_rows)
+        _bulk_insert(Referee, referee_rows)
+        _bulk_insert(Team, team_rows)
+        if dialect_name() == 'postgresql':
+            User.query.filter(User.id.between(user_rows[0]['id'], user_rows[teams - 1]['id']))\
+                .update({User.__table__.c.team_id: User.__table__.c.id - user_rows[0]['id'] + team_rows[0]['id']},
+                        synchronize_session=False)
+        _bulk_insert(Player, player_rows)
+
+        match_rows = fixture_rows(tournament_id, [row['id'] for row in team_rows], date(2024, 9, 1), double=double)
+        last_played_round = int(max(row['round_number'] for row in match_rows) * played)
+        performance_rows = []
+        for row in match_rows:
+            row['id'] = ids[Match]
+            ids[Match] += 1
+            row['venue'] = f"Stadium of {SCALE_CITIES[(row['home_team_id'] - team_rows[0]['id']) % len(SCALE_CITIES)]}"
+            row['created_at'] = now
+            if row['round_number'] <= last_played_round:
+                row['status'] = 'completed'
+                row['home_score'], row['away_score'] = rng.choice((0, 0, 1, 1, 1, 2, 2, 3, 4)), rng.choice((0, 0, 1, 1, 2, 2, 3))
+                for team_id, goals in ((row['home_team_id'], row['home_score']), (row['away_team_id'], row['away_score'])):
+                    rows = _performance_rows(rng, row, squads[team_id], goals, ids[PlayerMatchPerformance], now)
+                    ids[PlayerMatchPerformance] += len(rows)
+                    performance_rows.extend(rows)
+        _bulk_insert(Match, match_rows)
+        _bulk_insert(PlayerMatchPerformance, performance_rows)
+        db.session.commit()
+
+        counts['users'] += len(user_rows)
+        counts['teams'] += len(team_rows)
+        counts['players'] += len(player_rows)
+        counts['matches'] += len(match_rows)
+        counts['performances'] += len(performance_rows)
+        print(f" - {t + 1}/{tournaments} leagues, {counts['performances']} performances "
+              f"({time.perf_counter() - started:.1f}s)")
+
+    # Données dérivées recalculées une seule fois, en SQL
+    reset_sequences((User, Tournament, Team, Player, Match, PlayerMatchPerformance))
+    for tournament_id in tournament_ids:
+        rebuild_standings(tournament_id)
+        refresh_eligibility(tournament_id=tournament_id)
+    rebuild_player_stats(db.select(Player.id).where(Player.id >= first_player_id))
+    db.session.commit()
+
+    counts['seconds'] = round(time.perf_counter() - started, 2)
+    return counts
+
+
 if __name__ == '__main__':
-    with app.app_context():
-        print("Starting database seeding...")
-        # Create database tables if they don't exist
-        db.create_all()
-
-        seed_users()
-        tournament = seed_tournaments()
-        # Only seed teams and players if a tournament was created or found
-        if tournament:
-            # Fetch teams after potential initial creation
-            teams = Team.query.filter_by(tournament_id=tournament.id).all()
-
-            # Seed teams if the current number is less than max_teams
-            if len(teams) < tournament.max_teams:
-                 seed_teams(tournament)
-                 # Refresh teams list after seeding
-                 teams = Team.query.filter_by(tournament_id=tournament.id).all()
-
-            # Seed players for all teams in the tournament
-            if teams:
-                 seed_players(teams)
-
-            # Seed matches for the tournament
-            seed_matches(tournament, teams)
-
-        print("Database seeding complete.") 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Seed the database.')
+    parser.add_argument('--scale', action='store_true', help='Generate large synthetic leagues instead of Botola Pro 1.')
+    parser.add_argument('--tournaments', type=int, default=10)
+    parser.add_argument('--teams', type=int, default=20, help='Teams per tournament.')
+    parser.add_argument('--players', type=int, default=25, help='Players per team.')
+    parser.add_argument('--referees', type=int, default=4, help='Referees per tournament.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--single', action='store_true', help='Single round-robin (default: home and away).')
+    parser.add_argument('--played', type=float, default=0.5, help='Share of the rounds already played.')
+    parser.add_argument('--password', default='scale-password', help='Password of every synthetic account.')
+    args = parser.parse_args()
+
+    if args.scale:
+        with app.app_context():
+            db.create_all()
+            print(f"Seeding {args.tournaments} x {args.teams} teams x {args.players} players (seed {args.seed})...")
+            counts = seed_scale(args.tournaments, args.teams, args.players, seed=args.seed,
+                                double=not args.single, played=args.played, password=args.password,
+                                referees=args.referees)
+            print(', '.join(f'{value} {name}' for name, value in counts.items()))
+    else:
+        with app.app_context():
+            print("Starting database seeding...")
+            # Create database tables if they don't exist
+            db.create_all()
+
+            seed_users()
+            tournament = seed_tournaments()
+            # Only seed teams and players if a tournament was created or found
+            if tournament:
+                # Fetch teams after potential initial creation
+                teams = Team.query.filter_by(tournament_id=tournament.id).all()
+
+                # Seed teams if the current number is less than max_teams
+                if len(teams) < tournament.max_teams:
+                     seed_teams(tournament)
+                     # Refresh teams list after seeding
+                     teams = Team.query.filter_by(tournament_id=tournament.id).all()
+
+                # Seed players for all teams in the tournament
+                if teams:
+                     seed_players(teams)
+
+                # Seed matches for the tournament
+                seed_matches(tournament, teams)
+
+            print("Database seeding complete.") 
\ No newline at end of file
@@ -0,0 +1,228 @@
+from dataclasses import dataclass
+from sqlalchemy import and_, case, func, insert, select, union_all
+from extensions import db
+from models import Team, Match, TeamStanding
+
+
+@dataclass
+class StandingRow:
+    """One line of a tournament table"""
+    team: Team
+    played: int = 0
+    won: int = 0
+    drawn: int = 0
+    lost: int = 0
+    goals_for: int = 0
+    goals_against: int = 0
+    goal_difference: int = 0
+    points: int = 0
+
+    @property
+    def stats(self):
+        """Same shape as Team.get_stats(), kept for the templates"""
+        return {
+            'played': self.played,
+            'won': self.won,
+            'drawn': self.drawn,
+            'lost': self.lost,
+            'goals_for': self.goals_for,
+            'goals_against': self.goals_against,
+            'goal_difference': self.goal_difference,
+            'points': self.points
+        }
+
+    def __getitem__(self, key):
+        # Les templates existants accèdent à standing['team'] / standing['stats']
+        return getattr(self, key)
+
+
+def _match_sides(tournament_id):
+    """Completed matches of a tournament, one row per team and per match"""
+    home = select(
+        Match.home_team_id.label('team_id'),
+        func.coalesce(Match.home_score, 0).label('goals_for'),
+        func.coalesce(Match.away_score, 0).label('goals_against')
+    ).where(Match.tournament_id == tournament_id, Match.status == 'completed')
+    away = select(
+        Match.away_team_id.label('team_id'),
+        func.coalesce(Match.away_score, 0).label('goals_for'),
+        func.coalesce(Match.home_score, 0).label('goals_against')
+    ).where(Match.tournament_id == tournament_id, Match.status == 'completed')
+    return union_all(home, away).subquery('sides')
+
+
+def _aggregate_columns(sides):
+    won = func.coalesce(func.sum(case((sides.c.goals_for > sides.c.goals_against, 1), else_=0)), 0)
+    drawn = func.coalesce(func.sum(case((sides.c.goals_for == sides.c.goals_against, 1), else_=0)), 0)
+    lost = func.coalesce(func.sum(case((sides.c.goals_for < sides.c.goals_against, 1), else_=0)), 0)
+    return {
+        'played': func.count(sides.c.team_id),
+        'won': won,
+        'drawn': drawn,
+        'lost': lost,
+        'goals_for': func.coalesce(func.sum(sides.c.goals_for), 0),
+        'goals_against': func.coalesce(func.sum(sides.c.goals_against), 0),
+        'points': won * 3 + drawn
+    }
+
+
+def aggregate_standings(tournament_id, team_id=None):
+    """Build the table of a tournament straight from Match, in one query.
+
+    This is the reference computation used to rebuild TeamStanding; pages
+    should read compute_standings() instead.
+    """
+    sides = _match_sides(tournament_id)
+    columns = _aggregate_columns(sides)
+    goal_difference = (columns['goals_for'] - columns['goals_against']).label('goal_difference')
+    points = columns['points'].label('points')
+
+    query = db.session.query(
+        Team,
+        columns['played'],
+        columns['won'],
+        columns['drawn'],
+        columns['lost'],
+        columns['goals_for'],
+        columns['goals_against'],
+        goal_difference,
+        points
+    ).outerjoin(sides, sides.c.team_id == Team.id)\
+     .filter(Team.tournament_id == tournament_id)
+
+    if team_id is not None:
+        query = query.filter(Team.id == team_id)
+
+    query = query.group_by(Team.id)\
+                 .order_by(points.desc(), goal_difference.desc(), columns['goals_for'].desc(), Team.name)
+
+    return [
+        StandingRow(
+            team=team,
+            played=played,
+            won=won,
+            drawn=drawn,
+            lost=lost,
+            goals_for=gf,
+            goals_against=ga,
+            goal_difference=gd,
+            points=pts
+        )
+        for team, played, won, drawn, lost, gf, ga, gd, pts in query.all()
+    ]
+
+
+def compute_standings(tournament_id, team_id=None):
+    """Read the table of a tournament from TeamStanding.
+
+    Teams without a TeamStanding row (no match completed yet) are included
+    with zeros. Rows are sorted by points, then goal difference, then goals
+    scored.
+    """
+    goals_for = func.coalesce(TeamStanding.goals_for, 0)
+    goal_difference = goals_for - func.coalesce(TeamStanding.goals_against, 0)
+
+    query = db.session.query(Team, TeamStanding)\
+        .outerjoin(TeamStanding, and_(TeamStanding.team_id == Team.id,
+                                      TeamStanding.tournament_id == Team.tournament_id))\
+        .filter(Team.tournament_id == tournament_id)
+
+    if team_id is not None:
+        query = query.filter(Team.id == team_id)
+
+    query = query.order_by(func.coalesce(TeamStanding.points, 0).desc(), goal_difference.desc(),
+                           goals_for.desc(), Team.name)
+
+    rows = []
+    for team, standing in query.all():
+        if standing is None:
+            rows.append(StandingRow(team=team))
+            continue
+        rows.append(StandingRow(
+            team=team,
+            played=standing.played,
+            won=standing.won,
+            drawn=standing.drawn,
+            lost=standing.lost,
+            goals_for=standing.goals_for,
+            goals_against=standing.goals_against,
+            goal_difference=standing.goals_for - standing.goals_against,
+            points=standing.points
+        ))
+    return rows
+
+
+def rebuild_standings(tournament_id=None):
+    """Recompute TeamStanding from Match, for one tournament or all of them.
+
+    Does not commit, so it can share the caller's transaction.
+    """
+    if tournament_id is None:
+        tournament_ids = [row[0] for row in db.session.query(Team.tournament_id).distinct()]
+    else:
+        tournament_ids = [tournament_id]
+
+    for tid in tournament_ids:
+        sides = _match_sides(tid)
+        columns = _aggregate_columns(sides)
+        aggregate = select(Team.tournament_id, Team.id, *columns.values())\
+            .select_from(Team)\
+            .outerjoin(sides, sides.c.team_id == Team.id)\
+            .where(Team.tournament_id == tid)\
+            .group_by(Team.id)
+
+        TeamStanding.query.filter_by(tournament_id=tid).delete(synchronize_session=False)
+        db.session.execute(
+            insert(TeamStanding).from_select(['tournament_id', 'team_id', *columns.keys()], aggregate)
+        )
+    return tournament_ids
+
+
+def _result_deltas(goals_for, goals_against, sign):
+    goals_for = goals_for or 0
+    goals_against = goals_against or 0
+    won = int(goals_for > goals_against)
+    drawn = int(goals_for == goals_against)
+    return {
+        TeamStanding.played: TeamStanding.played + sign,
+        TeamStanding.won: TeamStanding.won + sign * won,
+        TeamStanding.drawn: TeamStanding.drawn + sign * drawn,
+        TeamStanding.lost: TeamStanding.lost + sign * (1 - won - drawn),
+        TeamStanding.goals_for: TeamStanding.goals_for + sign * goals_for,
+        TeamStanding.goals_against: TeamStanding.goals_against + sign * goals_against,
+        TeamStanding.points: TeamStanding.points + sign * (3 * won + drawn)
+    }
+
+
+def _apply_result(match, home_score, away_score, sign):
+    """Add (sign=1) or remove (sign=-1) one result; False if a row is missing"""
+    sides = (
+        (match.home_team_id, home_score, away_score),
+        (match.away_team_id, away_score, home_score)
+    )
+    for team_id, goals_for, goals_against in sides:
+        updated = TeamStanding.query.filter_by(tournament_id=match.tournament_id, team_id=team_id)\
+            .update(_result_deltas(goals_for, goals_against, sign), synchronize_session=False)
+        if not updated:
+            return False
+    return True
+
+
+def record_result_change(match, previous_status, previous_home_score=None, previous_away_score=None):
+    """Keep TeamStanding in sync after a match changed status or score.
+
+    Call it once the new status and score are set on ``match``, before the
+    commit. If the table has drifted (missing rows), the tournament is
+    rebuilt from Match instead, which already includes the new result.
+    """
+    was_completed = previous_status == 'completed'
+    is_completed = match.status == 'completed'
+    if not was_completed and not is_completed:
+        return
+
+    db.session.flush()
+    if was_completed and not _apply_result(match, previous_home_score, previous_away_score, -1):
+        rebuild_standings(match.tournament_id)
+        return
+    if is_completed and not _apply_result(match, match.home_score, match.away_score, 1):
+        rebuild_standings(match.tournament_id)
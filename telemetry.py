@@ -0,0 +1,200 @@
+"""Per-request SQL telemetry and N+1 detection.
+
+A sampled request (TELEMETRY_SAMPLE_RATE; all of them in debug) records every
+statement sent by the engines: count, database time, rows, and how often the
+same SQL text came back with other parameters. A statement repeated
+TELEMETRY_REPEAT_THRESHOLD times or more in one request is flagged as an
+N+1 pattern (a lazy load or a per-row query in a loop) and logged.
+
+The figures are sent back in a Server-Timing header, visible in the browser
+devtools, and aggregated per endpoint behind /_metrics, which answers only
+with the X-Metrics-Token header matching TELEMETRY_METRICS_TOKEN (closed
+when none is set). Requests that are not sampled only pay a lookup on
+flask.g per statement.
+
+Rows are the ORM objects loaded plus the rows changed by INSERT, UPDATE and
+DELETE statements; the DBAPI does not report the rows fetched by a SELECT.
+"""
+import hmac
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import g, has_app_context, jsonify, request, abort
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+# Listes IN (?, ?, ...) de longueurs différentes : même requête
+_IN_LIST = re.compile(r'\((?:\s*(?:\?|%\(\w+\)s|:\w+)\s*,)+\s*(?:\?|%\(\w+\)s|:\w+)\s*\)')
+
+
+def normalize(statement):
+    return _IN_LIST.sub('(...)', ' '.join(statement.split()))
+
+
+class RequestTelemetry:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.statements = Counter()
+        self.statement_time = defaultdict(float)
+
+    def record(self, statement, elapsed, rowcount):
+        self.queries += 1
+        self.db_time += elapsed
+        if rowcount > 0:
+            self.rows += rowcount
+        key = normalize(statement)
+        self.statements[key] += 1
+        self.statement_time[key] += elapsed
+
+    def repeated(self, threshold):
+        """(statement, count, seconds) run at least ``threshold`` times"""
+        return [(statement, count, self.statement_time[statement])
+                for statement, count in self.statements.most_common() if count >= threshold]
+
+
+class Telemetry:
+
+    def __init__(self):
+        self.sample_rate = 0.0
+        self.repeat_threshold = 5
+        self.metrics_token = None
+        self._endpoints = {}
+        self._repeated = {}
+        self._lock = threading.Lock()
+        self._installed = False
+
+    def init_app(self, app):
+        self.sample_rate = 1.0 if app.debug else app.config.get('TELEMETRY_SAMPLE_RATE', self.sample_rate)
+        self.repeat_threshold = app.config.get('TELEMETRY_REPEAT_THRESHOLD', self.repeat_threshold)
+        self.metrics_token = app.config.get('TELEMETRY_METRICS_TOKEN')
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/_metrics', 'telemetry_metrics', self.metrics_view)
+        if not self._installed:
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(db.Model, 'load', _on_load, propagate=True)
+            self._installed = True
+        app.extensions['telemetry'] = self
+
+    # Requêtes HTTP
+
+    def _before_request(self):
+        if self.sample_rate >= 1.0 or (self.sample_rate > 0 and random.random() < self.sample_rate):
+            g.telemetry = RequestTelemetry()
+
+    def _after_request(self, response):
+        current = g.pop('telemetry', None)
+        if current is None or request.endpoint == 'telemetry_metrics':
+            return response
+        total = time.perf_counter() - current.started
+        repeated = current.repeated(self.repeat_threshold)
+
+        timings = [f'db;dur={current.db_time * 1000:.1f};desc="{current.queries} queries, {current.rows} rows"',
+                   f'app;dur={(total - current.db_time) * 1000:.1f}']
+        if repeated:
+            timings.append(f'n1;desc="{len(repeated)} repeated statement(s), worst x{repeated[0][1]}"')
+        response.headers.add('Server-Timing', ', '.join(timings))
+
+        endpoint = request.endpoint or request.path
+        for statement, count, seconds in repeated:
+            logger.warning('N+1 on %s: %d x %s', endpoint, count, statement[:200])
+        self._aggregate(endpoint, current, total, repeated)
+        return response
+
+    def _aggregate(self, endpoint, current, total, repeated):
+        with self._lock:
+            entry = self._endpoints.setdefault(endpoint, {
+                'requests': 0, 'time': 0.0, 'db_time': 0.0, 'queries': 0, 'rows': 0,
+                'max_queries': 0, 'n_plus_one_requests': 0
+            })
+            entry['requests'] += 1
+            entry['time'] += total
+            entry['db_time'] += current.db_time
+            entry['queries'] += current.queries
+            entry['rows'] += current.rows
+            entry['max_queries'] = max(entry['max_queries'], current.queries)
+            entry['n_plus_one_requests'] += bool(repeated)
+            for statement, count, seconds in repeated:
+                worst = self._repeated.setdefault((endpoint, statement), {'requests': 0, 'max_count': 0, 'time': 0.0})
+                worst['requests'] += 1
+                worst['max_count'] = max(worst['max_count'], count)
+                worst['time'] += seconds
+
+    # Métriques
+
+    def snapshot(self):
+        """Aggregated figures per endpoint, slowest (by total time) first"""
+        with self._lock:
+            endpoints = []
+            for endpoint, entry in self._endpoints.items():
+                requests = entry['requests']
+                endpoints.append({
+                    'endpoint': endpoint,
+                    'sampled_requests': requests,
+                    'mean_ms': entry['time'] / requests * 1000,
+                    'mean_db_ms': entry['db_time'] / requests * 1000,
+                    'mean_queries': entry['queries'] / requests,
+                    'max_queries': entry['max_queries'],
+                    'mean_rows': entry['rows'] / requests,
+                    'n_plus_one_requests': entry['n_plus_one_requests'],
+                    'total_ms': entry['time'] * 1000
+                })
+            repeated = [{'endpoint': endpoint, 'statement': statement, **figures}
+                        for (endpoint, statement), figures in self._repeated.items()]
+        endpoints.sort(key=lambda entry: entry['total_ms'], reverse=True)
+        repeated.sort(key=lambda entry: entry['time'], reverse=True)
+        return {'sample_rate': self.sample_rate, 'endpoints': endpoints, 'repeated_statements': repeated}
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self._repeated.clear()
+
+    def metrics_view(self):
+        # Fermé sans jeton : derrière un proxy local, remote_addr est toujours 127.0.0.1
+        token = request.headers.get('X-Metrics-Token', '')
+        if not self.metrics_token or not hmac.compare_digest(token.encode(), self.metrics_token.encode()):
+            abort(403)
+        return jsonify(self.snapshot())
+
+
+def _current():
+    return g.get('telemetry') if has_app_context() else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current() is not None:
+        conn.info.setdefault('telemetry_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    current = _current()
+    started = conn.info.get('telemetry_started')
+    if current is None or not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    # Pour un SELECT, les objets chargés sont comptés par _on_load
+    dml = context is not None and (context.isinsert or context.isupdate or context.isdelete)
+    current.record(statement, elapsed, cursor.rowcount if dml else 0)
+
+
+def _on_load(target, context):
+    current = _current()
+    if current is not None:
+        current.rows += 1
+
+
+telemetry = Telemetry()
@@ -0,0 +1,9 @@
+import pytest
+
+from bench.common import load_app
+
+
+@pytest.fixture(scope='session')
+def app():
+    """The full application with the API routes, on a throwaway SQLite file"""
+    return load_app()
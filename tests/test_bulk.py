@@ -0,0 +1,52 @@
+"""Write helpers of bulk.py, with and without ON CONFLICT"""
+import pytest
+
+import bulk
+import data_transfer
+from bench.common import seed_league
+from bulk import upsert, upsert_increment, upsert_returning, insert_ignore
+from extensions import db
+from models import Match, MatchStats
+
+
+@pytest.fixture(params=[True, False], ids=['on_conflict', 'update_or_insert'])
+def on_conflict(request, monkeypatch):
+    # Sans ON CONFLICT : chemin des dialectes autres que Postgres et SQLite
+    monkeypatch.setattr(bulk, 'on_conflict_supported', lambda: request.param)
+    monkeypatch.setattr(data_transfer, 'on_conflict_supported', lambda: request.param)
+    return request.param
+
+
+def test_helpers_insert_then_update(app, on_conflict):
+    with app.app_context():
+        tournament = seed_league(3, completed=False)
+        first, second = [match.id for match in Match.query.filter_by(tournament_id=tournament.id).order_by(Match.id)
+                                                      .limit(2)]
+
+        insert_ignore(MatchStats, ['match_id'], [{'match_id': first, 'home_shots': 1}])
+        insert_ignore(MatchStats, ['match_id'], [{'match_id': first, 'home_shots': 7}])
+        upsert_increment(MatchStats, ['match_id'], [{'match_id': first, 'home_shots': 2},
+                                                    {'match_id': second, 'home_shots': 3}], ['home_shots'])
+        upsert(MatchStats, ['match_id'], [{'match_id': second, 'home_corners': 4}], ['home_corners'])
+        written = upsert_returning(MatchStats, ['match_id'], {'match_id': second, 'away_fouls': 1},
+                                   {'away_fouls': MatchStats.__table__.c.away_fouls + 1},
+                                   [MatchStats.home_shots, MatchStats.home_corners, MatchStats.away_fouls])
+        db.session.commit()
+
+        assert dict(written) == {'home_shots': 3, 'home_corners': 4, 'away_fouls': 1}
+        assert db.session.execute(db.select(MatchStats.home_shots).where(MatchStats.match_id == first)).scalar() == 3
+        assert MatchStats.query.filter(MatchStats.match_id.in_([first, second])).count() == 2
+
+
+def test_import_without_on_conflict(app, on_conflict, tmp_path):
+    with app.app_context():
+        tournament = seed_league(3, completed=False)
+        match = Match.query.filter_by(tournament_id=tournament.id).order_by(Match.id).first()
+        path = tmp_path / 'matches.csv'
+        path.write_text('id,tournament_id,home_team_id,away_team_id,match_date,home_score,away_score,status\n'
+                        f'{match.id},{tournament.id},{match.home_team_id},{match.away_team_id},'
+                        f'2024-09-01T18:00:00,2,1,completed\n')
+        report = data_transfer.import_dataset('matches', str(path))
+        assert (report.inserted, report.updated) == (0, 1)
+        assert (match.id, 2, 1) == db.session.execute(
+            db.select(Match.id, Match.home_score, Match.away_score).where(Match.id == match.id)).one()
@@ -0,0 +1,10 @@
+"""The hot queries are served by an index (see migrations.explain_hot_queries)"""
+from migrations import explain_hot_queries
+
+
+def test_hot_queries_use_an_index(app):
+    with app.app_context():
+        results = explain_hot_queries()
+    assert results
+    scans = {name: plan for name, plan, uses_index in results if not uses_index}
+    assert scans == {}
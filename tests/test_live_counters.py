@@ -0,0 +1,17 @@
+"""Concurrent live writes lose no update (see bench/live_counters.py)"""
+import pytest
+
+from bench.live_counters import run
+from live_stats import stats_buffer
+
+
+@pytest.mark.parametrize('buffer', [False, True], ids=['direct', 'buffered'])
+def test_concurrent_goals_and_cards(app, buffer):
+    try:
+        mismatches, errors = run(app, goals=60, cards=30, concurrency=8, buffer=buffer)
+    finally:
+        # L'application est partagée par toute la session : tampon coupé pour les tests suivants
+        app.config['LIVE_STATS_BUFFER'] = False
+        stats_buffer.init_app(app)
+    assert errors == 0
+    assert mismatches == []
@@ -0,0 +1,30 @@
+"""ETag and snapshot cache of the live polling endpoint"""
+from bench.common import QueryCounter
+from bench.routes import prepare
+from extensions import db
+from live_feed import LiveSnapshotCache
+import routes
+
+
+def test_etag_is_shared_by_workers_and_changes_with_the_match(app, monkeypatch):
+    match_id = prepare(app)['match_id']
+    client = app.test_client()
+    etag = client.get(f'/api/matches/{match_id}/live').headers['ETag']
+
+    # Autre worker : cache vide, même version lue en base
+    monkeypatch.setattr(routes, 'live_snapshots', LiveSnapshotCache())
+    with app.app_context():
+        engine = db.engine
+    with QueryCounter(engine) as counter:
+        response = client.get(f'/api/matches/{match_id}/live', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert counter.count == 1
+
+    client.post(f'/api/matches/{match_id}/score', json={'team': 'away'})
+    response = client.get(f'/api/matches/{match_id}/live', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_unknown_match(app):
+    assert app.test_client().get('/api/matches/999999/live').status_code == 404
@@ -0,0 +1,78 @@
+"""Replay of the match event log, and import of events (see match_events.py)"""
+import pytest
+
+import match_events
+from bench.common import seed_league
+from data_transfer import import_dataset, DataTransferError
+from extensions import db
+from match_events import record_event, replay
+from models import Match, MatchUpdate, Player, PlayerMatchPerformance
+
+
+@pytest.fixture(scope='module')
+def league(app):
+    """Three matches with events (goals, cards, a substitution) and a substitute without any"""
+    with app.app_context():
+        tournament = seed_league(4, completed=False, seed=23)
+        matches = Match.query.filter_by(tournament_id=tournament.id).order_by(Match.id).limit(3).all()
+        players = {}
+        for match in matches:
+            for team_id in (match.home_team_id, match.away_team_id):
+                if team_id not in players:
+                    players[team_id] = [Player(name=f'{team_id} #{n}', jersey_number=n, team_id=team_id)
+                                        for n in (1, 2, 3)]
+                    db.session.add_all(players[team_id])
+        db.session.flush()
+        for match in matches:
+            home, away = players[match.home_team_id], players[match.away_team_id]
+            db.session.add(PlayerMatchPerformance(match_id=match.id, player_id=home[2].id, is_selected=True))
+            record_event(match, 'kickoff')
+            record_event(match, 'goal', team_id=match.home_team_id, player_id=home[0].id,
+                         related_player_id=home[1].id)
+            record_event(match, 'card', team_id=match.away_team_id, player_id=away[0].id, detail='yellow')
+            record_event(match, 'substitution', team_id=match.away_team_id, player_id=away[1].id,
+                         related_player_id=away[0].id)
+        db.session.commit()
+        return {'tournament_id': tournament.id, 'match_ids': [match.id for match in matches]}
+
+
+def _performances(match_ids):
+    return {(p.match_id, p.player_id): (p.goals, p.assists, p.yellow_cards, p.is_playing)
+            for p in PlayerMatchPerformance.query.filter(PlayerMatchPerformance.match_id.in_(match_ids))}
+
+
+def test_replay_by_pages_gives_the_live_projections(app, league, monkeypatch):
+    monkeypatch.setattr(match_events, 'REPLAY_MATCHES_PER_WRITE', 2)
+    with app.app_context():
+        match_ids = league['match_ids']
+        live = _performances(match_ids)
+        scores = {m.id: (m.home_score, m.away_score, m.status) for m in Match.query.filter(Match.id.in_(match_ids))}
+        # Projections faussées, que le rejeu doit corriger
+        PlayerMatchPerformance.query.filter(PlayerMatchPerformance.match_id.in_(match_ids))\
+            .update({'goals': 5, 'is_playing': True}, synchronize_session=False)
+        db.session.commit()
+
+        assert replay(tournament_id=league['tournament_id']) == {'matches': 3, 'events': 12}
+        db.session.commit()
+        assert _performances(match_ids) == live
+        assert {m.id: (m.home_score, m.away_score, m.status)
+                for m in Match.query.filter(Match.id.in_(match_ids))} == scores
+        # Remplaçant sans événement et joueur sorti : pas sur le terrain
+        benched = sorted(values for values in live.values() if not values[3])
+        assert benched == [(0, 0, 0, False)] * 3 + [(0, 0, 1, False)] * 3
+
+
+@pytest.mark.parametrize('update_type, detail', [('penalty', None), ('card', 'green'), ('card', None)])
+def test_import_refuses_invalid_events(app, league, tmp_path, update_type, detail):
+    with app.app_context():
+        match = db.session.get(Match, league['match_ids'][0])
+        player = Player.query.filter_by(team_id=match.home_team_id).first()
+        count = MatchUpdate.query.count()
+    path = tmp_path / 'match_updates.csv'
+    path.write_text('match_id,update_type,team_id,player_id,detail,minute\n'
+                    f"{match.id},{update_type},{match.home_team_id},{player.id},{detail or ''},12\n")
+    with app.app_context():
+        with pytest.raises(DataTransferError) as error:
+            import_dataset('match_updates', str(path))
+        assert len(error.value.errors) == 1
+        assert MatchUpdate.query.count() == count
@@ -0,0 +1,33 @@
+"""Keyset pagination of the list pages (see pagination.py)"""
+from datetime import date, datetime
+
+from sqlalchemy import func
+
+import routes
+from extensions import db
+from models import Tournament
+
+
+def test_tournaments_without_creation_date_are_paged(app, monkeypatch):
+    with app.app_context():
+        db.session.add_all([Tournament(name=f'Undated {i}', start_date=date(2024, 9, 1)) for i in range(3)])
+        db.session.flush()
+        Tournament.query.filter(Tournament.name.like('Undated %')).update({'created_at': None})
+        db.session.commit()
+        expected = [tournament.id for tournament in Tournament.query.order_by(
+            func.coalesce(Tournament.created_at, datetime.min).desc(), Tournament.id.desc())]
+
+    # Pas de gabarits dans les tests : la page rendue est le contexte du listing
+    monkeypatch.setattr(routes, 'render_template', lambda template, **context: {
+        'ids': [tournament.id for tournament in context['tournaments']], 'next': context['page'].next_cursor
+    })
+    client = app.test_client()
+    ids, after = [], None
+    while True:
+        response = client.get('/tournaments', query_string={'per_page': 2, 'after': after or ''})
+        assert response.status_code == 200
+        ids += response.json['ids']
+        after = response.json['next']
+        if after is None:
+            break
+    assert ids == expected
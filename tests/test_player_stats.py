@@ -0,0 +1,41 @@
+"""Rebuilding the rolled-up PlayerStats keeps the columns it does not derive"""
+from bench.common import seed_league
+from data_transfer import import_dataset
+from extensions import db
+from models import Match, Player, PlayerStats
+
+
+def _write_csv(path, header, rows):
+    path.write_text('\n'.join([','.join(header)] + [','.join(map(str, row)) for row in rows]) + '\n')
+    return str(path)
+
+
+def test_importing_performances_keeps_imported_player_stats(app, tmp_path):
+    with app.app_context():
+        tournament = seed_league(4, completed=True, seed=20)
+        match = Match.query.filter_by(tournament_id=tournament.id).order_by(Match.id).first()
+        scorer = Player(name='Scorer', jersey_number=9, team_id=match.home_team_id)
+        keeper = Player(name='Keeper', jersey_number=1, team_id=match.away_team_id)
+        db.session.add_all([scorer, keeper])
+        db.session.commit()
+        scorer_id, keeper_id, match_id = scorer.id, keeper.id, match.id
+
+        header = ['player_id', 'goals', 'shots', 'passes', 'pass_accuracy', 'tackles', 'saves', 'clean_sheets']
+        import_dataset('player_stats', _write_csv(tmp_path / 'player_stats.csv', header, [
+            (scorer_id, 7, 30, 400, 81.5, 12, 0, 0),
+            (keeper_id, 0, 0, 250, 70.0, 2, 55, 6),
+        ]))
+        import_dataset('performances', _write_csv(
+            tmp_path / 'performances.csv', ['match_id', 'player_id', 'goals', 'minutes_played'],
+            [(match_id, scorer_id, 2, 90), (match_id, keeper_id, 0, 90)]
+        ))
+
+    with app.app_context():
+        scorer, keeper = (PlayerStats.query.filter_by(player_id=player_id).one()
+                          for player_id in (scorer_id, keeper_id))
+        # Colonnes recalculées depuis les performances
+        assert (scorer.goals, scorer.matches_played, scorer.minutes_played) == (2, 1, 90)
+        assert (keeper.goals, keeper.matches_played, keeper.minutes_played) == (0, 1, 90)
+        # Colonnes importées, gardées
+        assert (scorer.shots, scorer.passes, scorer.pass_accuracy, scorer.tackles) == (30, 400, 81.5, 12)
+        assert (keeper.passes, keeper.pass_accuracy, keeper.saves, keeper.clean_sheets) == (250, 70.0, 55, 6)
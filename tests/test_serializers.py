@@ -0,0 +1,20 @@
+"""Serializing a list costs a bounded number of queries (see bench/serializers.py)"""
+import pytest
+
+from bench.common import seed_league
+from bench.serializers import seed_rows, count_queries
+from models import MatchUpdate, PlayerMatchPerformance
+
+
+@pytest.fixture(scope='module')
+def rows(app):
+    with app.app_context():
+        seed_rows(seed_league(12, completed=False).id, 200)
+    return app
+
+
+@pytest.mark.parametrize('model', [MatchUpdate, PlayerMatchPerformance], ids=['updates', 'performances'])
+@pytest.mark.parametrize('size', [10, 200])
+def test_to_dict_of_eager_query_is_one_query(rows, model, size):
+    with rows.app_context():
+        assert count_queries(model.with_related().order_by(model.id), size) == 1
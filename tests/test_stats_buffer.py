@@ -0,0 +1,91 @@
+"""Write-behind buffer of the live stats (live_stats.StatsBuffer)"""
+import time
+
+import pytest
+
+from bench.routes import prepare
+from extensions import db
+from live_stats import stats_buffer
+from models import Match, MatchStats
+
+
+@pytest.fixture
+def buffered(app):
+    """A live match, with the buffer on: long interval, flush every 3 updates"""
+    app.config.update(LIVE_STATS_BUFFER=True, LIVE_STATS_FLUSH_INTERVAL_MS=60000, LIVE_STATS_FLUSH_EVENTS=3)
+    stats_buffer.init_app(app)
+    yield prepare(app)['match_id']
+    stats_buffer.shutdown()
+    stats_buffer._stopping = False
+    app.config['LIVE_STATS_BUFFER'] = False
+    stats_buffer.init_app(app)
+
+
+def _stats(app, match_id):
+    # Nouveau contexte, nouvelle session : valeurs lues en base
+    with app.app_context():
+        stats = MatchStats.query.filter_by(match_id=match_id).one()
+        return stats.home_shots or 0, stats.home_possession
+
+
+def _wait_for_flush(match_id):
+    for _ in range(100):
+        if stats_buffer.pending(match_id) == 0:
+            break
+        time.sleep(0.02)
+    # Les deltas sortent du tampon avant d'être écrits : attendre la fin du flush en cours
+    with stats_buffer._flush_lock:
+        pass
+
+
+def test_updates_are_merged_and_flushed_by_count(app, buffered):
+    before, possession = _stats(app, buffered)
+    stats_buffer.add(buffered, {'home_shots': 1}, possession=2)
+    stats_buffer.add(buffered, {'home_shots': 2}, possession=2)
+    assert stats_buffer.pending(buffered) == 2
+    assert _stats(app, buffered)[0] == before
+
+    stats_buffer.add(buffered, {'home_shots': 1}, possession=2)
+    _wait_for_flush(buffered)
+    assert _stats(app, buffered) == (before + 4, min(100, possession + 6))
+
+
+def test_flushed_by_the_timer(app, buffered):
+    app.config['LIVE_STATS_FLUSH_INTERVAL_MS'] = 50
+    stats_buffer.init_app(app)
+    before = _stats(app, buffered)[0]
+    stats_buffer.add(buffered, {'home_shots': 1})
+    _wait_for_flush(buffered)
+    assert stats_buffer.pending(buffered) == 0
+    assert _stats(app, buffered)[0] == before + 1
+
+
+def test_goal_is_buffered_and_flushed_before_the_final_whistle(app, buffered):
+    client = app.test_client()
+    before = _stats(app, buffered)[0]
+    response = client.post(f'/api/matches/{buffered}/score', json={'team': 'home'})
+    assert response.status_code == 200 and response.json['stats'] is None
+    assert stats_buffer.pending(buffered) == 1
+
+    assert client.post(f'/api/matches/{buffered}/end').status_code == 200
+    assert stats_buffer.pending(buffered) == 0
+    assert _stats(app, buffered)[0] > before
+    with app.app_context():
+        assert db.session.get(Match, buffered).status == 'completed'
+
+
+def test_shutdown_flushes_and_later_updates_are_written_directly(app, buffered):
+    before = _stats(app, buffered)[0]
+    stats_buffer.add(buffered, {'home_shots': 1})
+    stats_buffer.shutdown()
+    assert stats_buffer.pending(buffered) == 0
+    assert _stats(app, buffered)[0] == before + 1
+
+    stats_buffer.add(buffered, {'home_shots': 1})
+    assert stats_buffer.pending(buffered) == 0
+    assert _stats(app, buffered)[0] == before + 2
+
+
+def test_unknown_counter_is_refused(buffered):
+    with pytest.raises(ValueError):
+        stats_buffer.add(buffered, {'bogus': 1})